@@ -22,6 +22,11 @@ The functions do not return a value, instead they modify the image itself.
 import abc
 import collections
 import functools
+# OpenCV is only needed by the fast drawing path.
+try:
+  import cv2  # pylint: disable=g-import-not-at-top
+except ImportError:
+  cv2 = None
 # Set headless-friendly backend.
 import matplotlib; matplotlib.use('Agg')  # pylint: disable=multiple-statements
 import matplotlib.pyplot as plt  # pylint: disable=g-import-not-at-top
@@ -38,6 +43,10 @@ from object_detection.utils import shape_utils
 
 _TITLE_LEFT_MARGIN = 10
 _TITLE_TOP_MARGIN = 10
+# Caches of visualize_boxes_and_labels_on_image_array_cv2, colors keyed by
+# (color name, bgr) and label sizes keyed by (string, font scale, thickness).
+_CV2_COLOR_CACHE = {}
+_CV2_TEXT_SIZE_CACHE = {}
 STANDARD_COLORS = [
     'AliceBlue', 'Chartreuse', 'Aqua', 'Aquamarine', 'Azure', 'Beige', 'Bisque',
     'BlanchedAlmond', 'BlueViolet', 'BurlyWood', 'CadetBlue', 'AntiqueWhite',
@@ -753,6 +762,145 @@ def visualize_boxes_and_labels_on_image_array(
   return image
 
 
+def _cv2_color(color, bgr):
+  """Returns a color name as a cached OpenCV (B, G, R) or (R, G, B) tuple."""
+  key = (color, bgr)
+  if key not in _CV2_COLOR_CACHE:
+    rgb = ImageColor.getrgb(color)[:3]
+    _CV2_COLOR_CACHE[key] = tuple(reversed(rgb)) if bgr else tuple(rgb)
+  return _CV2_COLOR_CACHE[key]
+
+
+def _cv2_text_size(display_str, font_scale, font_thickness):
+  """Returns the cached ((width, height), baseline) of a label."""
+  key = (display_str, font_scale, font_thickness)
+  if key not in _CV2_TEXT_SIZE_CACHE:
+    _CV2_TEXT_SIZE_CACHE[key] = cv2.getTextSize(
+        display_str, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)
+  return _CV2_TEXT_SIZE_CACHE[key]
+
+
+def visualize_boxes_and_labels_on_image_array_cv2(
+    image,
+    boxes,
+    classes,
+    scores,
+    category_index,
+    use_normalized_coordinates=False,
+    max_boxes_to_draw=20,
+    min_score_thresh=.5,
+    agnostic_mode=False,
+    line_thickness=4,
+    skip_scores=False,
+    skip_labels=False,
+    bgr=False,
+    font_scale=0.5,
+    font_thickness=1):
+  """Fast version of visualize_boxes_and_labels_on_image_array for live display.
+
+  Boxes are thresholded with NumPy and drawn with OpenCV directly into the
+  image, without the PIL round trip of the original, and colors and label
+  sizes are cached between calls. Labels use the OpenCV Hershey font instead
+  of arial.ttf and boxes at the same location are not merged into one box with
+  several labels. Masks and keypoints are not supported.
+
+  Args:
+    image: uint8 numpy array with shape (img_height, img_width, 3), modified
+      in place.
+    boxes: a numpy array of shape [N, 4].
+    classes: a numpy array of shape [N]. Note that class indices are 1-based,
+      and match the keys in the label map.
+    scores: a numpy array of shape [N] or None.  If scores=None, then
+      this function assumes that the boxes to be plotted are groundtruth
+      boxes and plot all boxes as black with no classes or scores.
+    category_index: a dict containing category dictionaries (each holding
+      category index `id` and category name `name`) keyed by category indices.
+    use_normalized_coordinates: whether boxes is to be interpreted as
+      normalized coordinates or not.
+    max_boxes_to_draw: maximum number of boxes to visualize.  If None, draw
+      all boxes.
+    min_score_thresh: minimum score threshold for a box to be visualized
+    agnostic_mode: boolean (default: False) controlling whether to evaluate in
+      class-agnostic mode or not.  This mode will display scores but ignore
+      classes.
+    line_thickness: integer (default: 4) controlling line width of the boxes.
+    skip_scores: whether to skip score when drawing a single detection
+    skip_labels: whether to skip label when drawing a single detection
+    bgr: whether image is in BGR order (as read and shown by OpenCV) instead
+      of RGB.
+    font_scale: scale of the OpenCV label font.
+    font_thickness: line width of the label font.
+
+  Returns:
+    uint8 numpy array with shape (img_height, img_width, 3) with overlaid boxes,
+    the same array as image.
+
+  Raises:
+    ImportError: if OpenCV is not installed.
+  """
+  if cv2 is None:
+    raise ImportError('visualize_boxes_and_labels_on_image_array_cv2 needs '
+                      'OpenCV (cv2).')
+  num_boxes = boxes.shape[0]
+  if max_boxes_to_draw:
+    num_boxes = min(max_boxes_to_draw, num_boxes)
+  if scores is None:
+    keep = np.arange(num_boxes)
+  else:
+    keep = np.flatnonzero(scores[:num_boxes] > min_score_thresh)
+  if not keep.size:
+    return image
+  corners = boxes[keep].astype(np.float32)
+  if use_normalized_coordinates:
+    height, width = image.shape[:2]
+    corners *= np.array([height, width, height, width], dtype=np.float32)
+  corners = np.round(corners).astype(np.int32).tolist()
+
+  for i, (ymin, xmin, ymax, xmax) in zip(keep.tolist(), corners):
+    if scores is None:
+      cv2.rectangle(image, (xmin, ymin), (xmax, ymax), (0, 0, 0),
+                    line_thickness)
+      continue
+    class_id = int(classes[i])
+    if agnostic_mode:
+      color = _cv2_color('DarkOrange', bgr)
+    else:
+      color = _cv2_color(STANDARD_COLORS[class_id % len(STANDARD_COLORS)],
+                         bgr)
+    cv2.rectangle(image, (xmin, ymin), (xmax, ymax), color, line_thickness)
+
+    display_str = ''
+    if not skip_labels and not agnostic_mode:
+      if class_id in category_index:
+        display_str = str(category_index[class_id]['name'])
+      else:
+        display_str = 'N/A'
+    if not skip_scores:
+      if not display_str:
+        display_str = '{}%'.format(int(100 * scores[i]))
+      else:
+        display_str = '{}: {}%'.format(display_str, int(100 * scores[i]))
+    if not display_str:
+      continue
+    (text_width, text_height), baseline = _cv2_text_size(
+        display_str, font_scale, font_thickness)
+    label_height = text_height + baseline + 2 * font_thickness
+    # Above the box, or below it when the box touches the top of the image.
+    if ymin > label_height:
+      label_bottom = ymin
+    else:
+      label_bottom = ymax + label_height
+    cv2.rectangle(image, (xmin, label_bottom - label_height),
+                  (xmin + text_width + 2 * font_thickness, label_bottom),
+                  color, cv2.FILLED)
+    cv2.putText(image, display_str,
+                (xmin + font_thickness, label_bottom - baseline - font_thickness),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0),
+                font_thickness, cv2.LINE_AA)
+
+  return image
+
+
 def add_cdf_image_summary(values, name):
   """Adds a tf.summary.image for a CDF plot of the values.
 
@@ -115,6 +115,42 @@ class VisualizationUtilsTest(tf.test.TestCase):
     self.assertEqual(width_original, width_final)
     self.assertEqual(height_original, height_final)
 
+  def test_visualize_boxes_and_labels_on_image_array_cv2(self):
+    if visualization_utils.cv2 is None:
+      self.skipTest('OpenCV is not installed.')
+    category_index = {1: {'id': 1, 'name': 'dog'}, 2: {'id': 2, 'name': 'cat'}}
+    test_image = np.zeros([100, 200, 3], dtype=np.uint8)
+    boxes = np.array([[0.1, 0.1, 0.5, 0.5], [0.6, 0.6, 0.9, 0.9]])
+    classes = np.array([1, 2])
+    scores = np.array([0.9, 0.2])
+
+    result = visualization_utils.visualize_boxes_and_labels_on_image_array_cv2(
+        test_image, boxes, classes, scores, category_index,
+        use_normalized_coordinates=True, line_thickness=2, skip_scores=True,
+        skip_labels=True, bgr=True)
+
+    # Drawn in place, in the BGR Chartreuse of class 1, and the box below the
+    # score threshold is left out.
+    self.assertIs(result, test_image)
+    self.assertAllEqual(test_image[30, 20], [0, 255, 127])
+    self.assertAllEqual(test_image[30, 60], [0, 0, 0])
+    self.assertAllEqual(test_image[80, 150], [0, 0, 0])
+
+  def test_visualize_boxes_and_labels_on_image_array_cv2_draws_label(self):
+    if visualization_utils.cv2 is None:
+      self.skipTest('OpenCV is not installed.')
+    category_index = {1: {'id': 1, 'name': 'dog'}}
+    test_image = np.zeros([100, 200, 3], dtype=np.uint8)
+
+    visualization_utils.visualize_boxes_and_labels_on_image_array_cv2(
+        test_image, np.array([[0.5, 0.1, 0.9, 0.5]]), np.array([1]),
+        np.array([0.9]), category_index, use_normalized_coordinates=True,
+        line_thickness=2)
+
+    # The label sits on a filled rectangle right above the box.
+    self.assertAllEqual(test_image[48, 21], [127, 255, 0])
+    self.assertAllEqual(test_image[10, 21], [0, 0, 0])
+
   def test_draw_bounding_boxes_on_image_tensors(self):
     """Tests that bounding box utility produces reasonable results."""
     category_index = {1: {'id': 1, 'name': 'dog'}, 2: {'id': 2, 'name': 'cat'}}
@@ -15,6 +15,7 @@
 #
 
 from NanoLambdaNSP32 import *
+from NSP32Client import NSP32Client
 
 """A clean and simple example for beginners to start with NSP32."""
 
@@ -57,16 +58,14 @@ print('first element of wavelength = ', infoW.Wavelength[0])
 # TODO: get more information you need from infoW
 
 # =============== spectrum acquisition ===============
-nsp32.AcqSpectrum(0, 32, 3, False)	# integration time = 32; frame avg num = 3; disable AE
-
 # "AcqSpectrum" command takes longer time to execute, the return packet is not immediately available
-# when the acquisition is done, a "ready trigger" will fire, and nsp32.GetReturnPacketSize() will be > 0	
-while nsp32.GetReturnPacketSize() <= 0 :
-	# TODO: can go to sleep or do other tasks here
-	
-	nsp32.UpdateStatus()	# call UpdateStatus() to check async result
+# the client returns a future that is resolved when the "ready trigger" fires, so nothing has to poll UpdateStatus()
+client = NSP32Client(nsp32)
+future = client.AcqSpectrum(0, 32, 3, False)	# integration time = 32; frame avg num = 3; disable AE
+
+# TODO: can do other tasks here
 
-infoS = nsp32.GetReturnPacket().ExtractSpectrumInfo()
+infoS = future.result()		# block until the acquisition is done (pass a timeout in seconds to give up earlier)
 print('first element of spectrum = ', infoS.Spectrum[0])
 # TODO: get more information you need from infoS
 
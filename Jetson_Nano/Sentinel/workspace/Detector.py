@@ -0,0 +1,183 @@
+# Object detector with interchangeable inference backends. Every backend takes
+# a batch of RGB uint8 images at the model resolution and returns the same
+# outputs as the TF1 object detection frozen graph:
+#   boxes   [N, K, 4] float32 normalized ymin, xmin, ymax, xmax
+#   scores  [N, K]    float32
+#   classes [N, K]    float32, label map ids (starting at 1)
+#   num     [N]       float32 number of valid detections per image
+# so scan code can switch engines without changes. Each backend imports its
+# runtime only when it is created, a TFLite or ONNX model never pays for
+# importing and starting TensorFlow.
+#   TFGraphDetector   frozen_inference_graph.pb run in a tf.Session
+#   TFLiteDetector    .tflite (tflite_runtime or tf.lite), XNNPACK and num_threads
+#   ONNXDetector      .onnx run with ONNX Runtime on the CPU
+#   RemoteDetector    model loaded once by DetectorServer, reached over its .sock
+# Load_Detector picks the backend from the file extension.
+
+import os
+import time
+import numpy as np
+
+OUTPUT_NAMES = ('detection_boxes', 'detection_scores', 'detection_classes', 'num_detections')
+
+
+class Detector:
+    # common interface, load_time is the seconds the model took to load
+
+    backend = None
+
+    def __init__(self, path, input_size=(300, 300)):
+        self.path = path
+        self.input_size = input_size # (height, width)
+        self.load_time = 0.0
+
+    def Detect(self, images):
+        # images: [N, height, width, 3] uint8 RGB, returns (boxes, scores, classes, num)
+        raise NotImplementedError
+
+    def Close(self):
+        pass
+
+
+class TFGraphDetector(Detector):
+
+    backend = 'tf'
+
+    def __init__(self, path, input_size=(300, 300), num_threads=0, allow_growth=True):
+        Detector.__init__(self, path, input_size)
+        start = time.time()
+        import tensorflow as tf
+        if hasattr(tf, 'compat') and hasattr(tf.compat, 'v1'):
+            tf = tf.compat.v1
+        config = tf.ConfigProto(intra_op_parallelism_threads=num_threads, inter_op_parallelism_threads=num_threads)
+        config.gpu_options.allow_growth = allow_growth
+        graph = tf.Graph()
+        with graph.as_default():
+            graph_def = tf.GraphDef()
+            with tf.gfile.GFile(path, 'rb') as fid:
+                graph_def.ParseFromString(fid.read())
+            tf.import_graph_def(graph_def, name='')
+        self.session = tf.Session(graph=graph, config=config)
+        self.image_tensor = graph.get_tensor_by_name('image_tensor:0')
+        self.outputs = [graph.get_tensor_by_name(name + ':0') for name in OUTPUT_NAMES]
+        self.load_time = time.time() - start
+
+    def Detect(self, images):
+        boxes, scores, classes, num = self.session.run(self.outputs, feed_dict={self.image_tensor: images})
+        return boxes, scores, classes, num
+
+    def Close(self):
+        self.session.close()
+
+
+class TFLiteDetector(Detector):
+    # SSD models exported with export_tflite_ssd_graph end in
+    # TFLite_Detection_PostProcess, which only takes one image at a time, so a
+    # batch is run image by image. XNNPACK is the default CPU delegate of the
+    # TFLite runtime from 2.3 on, num_threads is shared with it.
+
+    backend = 'tflite'
+
+    def __init__(self, path, input_size=None, num_threads=4):
+        start = time.time()
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        height, width = int(self.input['shape'][1]), int(self.input['shape'][2])
+        Detector.__init__(self, path, input_size or (height, width))
+        # post process outputs are boxes, classes, scores, num
+        self.output_index = [detail['index'] for detail in self.interpreter.get_output_details()]
+        self.load_time = time.time() - start
+
+    def _Input(self, image):
+        dtype = self.input['dtype']
+        if dtype == np.uint8:
+            return image[np.newaxis]
+        # float SSD MobileNet inputs are scaled to [-1, 1]
+        normalized = (image.astype(np.float32) - 127.5) / 127.5
+        if dtype == np.int8:
+            # int8 models take the normalized image quantized with the input parameters
+            scale, zero_point = self.input['quantization']
+            return np.clip(np.round(normalized / scale + zero_point), -128, 127).astype(np.int8)[np.newaxis]
+        return normalized[np.newaxis]
+
+    def Detect(self, images):
+        results = []
+        for image in images:
+            self.interpreter.set_tensor(self.input['index'], self._Input(image))
+            self.interpreter.invoke()
+            boxes, classes, scores, num = [self.interpreter.get_tensor(index) for index in self.output_index]
+            results.append((boxes[0], scores[0], classes[0], num[0]))
+        boxes = np.stack([r[0] for r in results]).astype(np.float32)
+        scores = np.stack([r[1] for r in results]).astype(np.float32)
+        # TFLite class ids start at 0, the label map at 1
+        classes = np.stack([r[2] for r in results]).astype(np.float32) + 1
+        num = np.array([r[3] for r in results], dtype=np.float32).reshape(len(results))
+        return boxes, scores, classes, num
+
+
+class ONNXDetector(Detector):
+    # model converted from the frozen graph with tf2onnx, which keeps the
+    # image_tensor input and the detection_* output names
+
+    backend = 'onnx'
+
+    def __init__(self, path, input_size=(300, 300), num_threads=4):
+        Detector.__init__(self, path, input_size)
+        start = time.time()
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        names = [output.name for output in self.session.get_outputs()]
+        self.output_names = []
+        for wanted in OUTPUT_NAMES:
+            matches = [name for name in names if name.split(':')[0] == wanted]
+            if not matches:
+                raise ValueError('%s has no %s output' % (path, wanted))
+            self.output_names.append(matches[0])
+        self.load_time = time.time() - start
+
+    def Detect(self, images):
+        boxes, scores, classes, num = self.session.run(self.output_names, {self.input_name: images})
+        return (boxes.astype(np.float32), scores.astype(np.float32),
+                classes.astype(np.float32), num.astype(np.float32))
+
+
+def _Remote_Detector(path, **kwargs):
+    # model held by a running DetectorServer, path is its socket
+    import DetectorServer
+    return DetectorServer.RemoteDetector(path, **kwargs)
+
+
+BACKENDS = {
+    'tf': TFGraphDetector,
+    'tflite': TFLiteDetector,
+    'onnx': ONNXDetector,
+    'remote': _Remote_Detector,
+}
+EXTENSIONS = {
+    '.pb': 'tf',
+    '.tflite': 'tflite',
+    '.onnx': 'onnx',
+    '.sock': 'remote',
+}
+
+
+def Load_Detector(path, backend=None, **kwargs):
+    # backend defaults to the one matching the file extension, kwargs go to the backend (num_threads, ...)
+    if backend is None:
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in EXTENSIONS:
+            raise ValueError('No detector backend for %s files, use one of %s' % (extension, ', '.join(EXTENSIONS)))
+        backend = EXTENSIONS[extension]
+    if backend not in BACKENDS:
+        raise ValueError('Unknown detector backend %s, use one of %s' % (backend, ', '.join(BACKENDS)))
+    return BACKENDS[backend](path, **kwargs)
@@ -0,0 +1,318 @@
+# Detector daemon that keeps a model loaded between script runs. Parsing the
+# frozen graph and starting a tf.Session takes 30+ seconds on the Nano, so the
+# server does it once per boot and scripts connect to it instead:
+#   python3 DetectorServer.py -md Models/ssd_mobilenet_v2_graph/frozen_inference_graph.pb &
+# (or start it from an @reboot crontab entry).
+# Clients talk to it over a Unix socket. Each client maps a file in /dev/shm big
+# enough for a batch of frames, writes its frames there and only sends a small
+# request on the socket, the frames themselves are never copied through it.
+# Requests of different clients that arrive close together are run as one
+# batch. The detections (a few KB) come back on the socket.
+# RemoteDetector is the client, it is a Detector like the local backends so
+# scripts use it unchanged, and Connect() falls back to loading the model in
+# the script when no server is running.
+# Messages are a '!II' header (JSON length, payload length), the JSON and the payload.
+
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import struct
+import tempfile
+import threading
+import time
+import numpy as np
+import Detector
+
+SOCKET_PATH = '/tmp/sentinel_detector.sock'
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+MAX_BATCH = 8 # frames run as one batch at most
+BATCH_WINDOW = 0.005 # seconds a request waits for others to batch with, only when several clients are connected
+_HEADER = struct.Struct('!II')
+
+
+def _Recv_Exact(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            return None
+        received += count
+    return data
+
+
+def Send_Message(sock, header, payload=b''):
+    encoded = json.dumps(header).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(encoded), len(payload)) + encoded + payload)
+
+
+def Recv_Message(sock):
+    # (header, payload), (None, None) once the other end closed the socket
+    sizes = _Recv_Exact(sock, _HEADER.size)
+    if sizes is None:
+        return None, None
+    header_size, payload_size = _HEADER.unpack(bytes(sizes))
+    header = _Recv_Exact(sock, header_size)
+    payload = _Recv_Exact(sock, payload_size) if payload_size else bytearray()
+    if header is None or payload is None:
+        return None, None
+    return json.loads(header.decode('utf-8')), payload
+
+
+def Pack_Outputs(boxes, scores, classes, num):
+    outputs = [np.ascontiguousarray(output, dtype=np.float32) for output in (boxes, scores, classes, num)]
+    header = {'shapes': [list(output.shape) for output in outputs]}
+    return header, b''.join(output.tobytes() for output in outputs)
+
+
+def Unpack_Outputs(header, payload):
+    outputs = []
+    offset = 0
+    for shape in header['shapes']:
+        size = int(np.prod(shape)) * 4
+        outputs.append(np.frombuffer(payload, dtype=np.float32, count=size // 4, offset=offset).reshape(shape))
+        offset += size
+    return tuple(outputs)
+
+
+class _Request:
+
+    def __init__(self, images):
+        self.images = images
+        self.done = threading.Event()
+        self.outputs = None
+        self.error = None
+
+
+class DetectorServer:
+    # one thread per client receives requests, a single inference thread runs them
+
+    def __init__(self, detector, socket_path=SOCKET_PATH, max_batch=MAX_BATCH, batch_window=BATCH_WINDOW):
+        self.detector = detector
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.requests = queue.Queue()
+        self.carry = None
+        self.clients = 0
+        self.lock = threading.Lock()
+        self.running = False
+        self.sock = None
+        self.batches = 0
+        self.frames = 0
+
+    def Serve(self):
+        # blocks until Close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path) # left over from a server that did not shut down
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.socket_path)
+        self.sock.listen(8)
+        self.running = True
+        inference = threading.Thread(target=self._Infer, daemon=True)
+        inference.start()
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._Client, args=(conn,), daemon=True).start()
+        self.requests.put(None)
+        inference.join()
+
+    def Close(self):
+        self.running = False
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def _Client(self, conn):
+        with self.lock:
+            self.clients += 1
+        buffer = None
+        try:
+            while True:
+                header, payload = Recv_Message(conn)
+                if header is None:
+                    break
+                op = header.get('op')
+                if op == 'hello':
+                    Send_Message(conn, {
+                        'model': os.path.abspath(self.detector.path),
+                        'backend': self.detector.backend,
+                        'input_size': list(self.detector.input_size),
+                        'load_time': self.detector.load_time,
+                        'max_batch': self.max_batch,
+                    })
+                elif op == 'map':
+                    # the client's frame buffer, read only on this side
+                    buffer = np.memmap(header['path'], dtype=np.uint8, mode='r', shape=tuple(header['shape']))
+                    Send_Message(conn, {'ok': True})
+                elif op == 'detect' and buffer is not None:
+                    request = _Request(np.asarray(buffer[:header['n']]))
+                    self.requests.put(request)
+                    request.done.wait()
+                    if request.error is not None:
+                        Send_Message(conn, {'error': request.error})
+                    else:
+                        Send_Message(conn, *Pack_Outputs(*request.outputs))
+                else:
+                    Send_Message(conn, {'error': 'unexpected request %s' % op})
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.clients -= 1
+            del buffer
+            conn.close()
+
+    def _Gather(self, first):
+        # first plus whatever else arrives within the batch window, up to max_batch frames
+        pending = [first]
+        count = len(first.images)
+        deadline = time.time() + (self.batch_window if self.clients > 1 else 0.0)
+        while count < self.max_batch:
+            remaining = deadline - time.time()
+            try:
+                request = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self.requests.put(None)
+                break
+            if count + len(request.images) > self.max_batch:
+                # does not fit, it starts the next batch
+                self.carry = request
+                break
+            pending.append(request)
+            count += len(request.images)
+        return pending
+
+    def _Infer(self):
+        while True:
+            first, self.carry = self.carry, None
+            if first is None:
+                first = self.requests.get()
+            if first is None:
+                break
+            pending = self._Gather(first)
+            try:
+                if len(pending) == 1:
+                    images = first.images
+                else:
+                    images = np.concatenate([request.images for request in pending])
+                boxes, scores, classes, num = self.detector.Detect(images)
+                self.batches += 1
+                self.frames += len(images)
+                offset = 0
+                for request in pending:
+                    end = offset + len(request.images)
+                    request.outputs = (boxes[offset:end], scores[offset:end], classes[offset:end], num[offset:end])
+                    offset = end
+            except Exception as e:
+                for request in pending:
+                    request.error = '%s: %s' % (type(e).__name__, e)
+            for request in pending:
+                request.done.set()
+
+
+class RemoteDetector(Detector.Detector):
+    # Detector served by a DetectorServer, path is the server's socket
+
+    backend = 'remote'
+
+    def __init__(self, path=SOCKET_PATH, input_size=None, max_batch=MAX_BATCH, num_threads=None):
+        # num_threads is the server's business, it is only accepted to match the other backends
+        start = time.time()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.buffer = None
+        self.shm_path = None
+        info = self._Call({'op': 'hello'})[0]
+        Detector.Detector.__init__(self, path, input_size or tuple(info['input_size']))
+        self.model = info['model']
+        self.server_backend = info['backend']
+        self.server_load_time = info['load_time']
+        shape = (max_batch, self.input_size[0], self.input_size[1], 3)
+        self.shm_path = os.path.join(SHM_DIR, 'sentinel_detector_%d_%d' % (os.getpid(), id(self)))
+        self.buffer = np.memmap(self.shm_path, dtype=np.uint8, mode='w+', shape=shape)
+        self._Call({'op': 'map', 'path': self.shm_path, 'shape': list(shape)})
+        self.load_time = time.time() - start
+
+    def _Call(self, header):
+        Send_Message(self.sock, header)
+        reply, payload = Recv_Message(self.sock)
+        if reply is None:
+            raise ConnectionError('Detector server closed the connection')
+        if 'error' in reply:
+            raise RuntimeError('Detector server: %s' % reply['error'])
+        return reply, payload
+
+    def Detect(self, images):
+        images = np.asarray(images)
+        if images.shape[1:] != self.buffer.shape[1:]:
+            raise ValueError('Images of shape %s, the server model takes %s' % (images.shape[1:], self.buffer.shape[1:]))
+        results = []
+        # batches bigger than the buffer go in pieces
+        for i in range(0, len(images), len(self.buffer)):
+            chunk = images[i:i + len(self.buffer)]
+            self.buffer[:len(chunk)] = chunk
+            results.append(Unpack_Outputs(*self._Call({'op': 'detect', 'n': len(chunk)})))
+        if len(results) == 1:
+            return results[0]
+        return tuple(np.concatenate([result[i] for result in results]) for i in range(4))
+
+    def Close(self):
+        self.sock.close()
+        self.buffer = None
+        if self.shm_path is not None and os.path.exists(self.shm_path):
+            os.unlink(self.shm_path)
+
+
+def Connect(model_path, backend=None, socket_path=SOCKET_PATH, **kwargs):
+    # the running server if it serves model_path, otherwise the model loaded here
+    if os.path.exists(socket_path):
+        try:
+            detector = RemoteDetector(socket_path)
+            if detector.model == os.path.abspath(model_path):
+                return detector
+            print('Detector server runs %s, loading %s here' % (detector.model, model_path))
+            detector.Close()
+        except OSError as e:
+            print('Detector server not reachable (%s), loading the model here' % e)
+    return Detector.Load_Detector(model_path, backend, **kwargs)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-md', '--model', type = str, required = True, help = 'model to serve (.pb, .tflite or .onnx)')
+    ap.add_argument('-bk', '--backend', type = str, choices = sorted(Detector.BACKENDS), help = 'detector backend, picked from the model extension by default')
+    ap.add_argument('-nt', '--num_threads', type = int, default = 4, help = 'CPU threads the detector runs on')
+    ap.add_argument('-sk', '--socket', type = str, default = SOCKET_PATH, help = 'Unix socket to listen on')
+    ap.add_argument('-mb', '--max_batch', type = int, default = MAX_BATCH, help = 'most frames run as one batch')
+    ap.add_argument('-bw', '--batch_window', type = float, default = BATCH_WINDOW, help = 'seconds to wait for requests to batch together')
+    args = ap.parse_args()
+
+    detector = Detector.Load_Detector(args.model, args.backend, num_threads=args.num_threads)
+    # the first run builds the kernels, pay for it now instead of in the first client's request
+    detector.Detect(np.zeros((1, detector.input_size[0], detector.input_size[1], 3), dtype=np.uint8))
+    print('Loaded %s model in %.1f s, serving on %s' % (detector.backend, detector.load_time, args.socket))
+    server = DetectorServer(detector, args.socket, args.max_batch, args.batch_window)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.Close())
+    try:
+        server.Serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.Close()
+        detector.Close()
+        print('Served %d frames in %d batches' % (server.frames, server.batches))
@@ -1,12 +1,21 @@
+import argparse
+import os
 import cv2
-import Jetson.GPIO as GPIO
+import numpy as np
 import time
+from Pi_Camera import FrameGrabber
+import DetectorServer
+from Tracker import Tracker
+import PanTilt
 #********************************************************************
 #----------------------------Constants-------------------------------
 #********************************************************************
 PWM_MAX = 10
 PWM_MIN = 5
-DC_STEP = 0.025
+PIXEL_FILE = 'pixel_model.json' # calibrated pixel to duty cycle model of the mount, see Scan_Demo -cp
+FACE_MODEL = None # face detection model (.pb, .tflite or .onnx), None uses the Haar cascade
+FACE_THRESH = 0.5 # minimum score of a face from FACE_MODEL
+DETECT_EVERY = 5 # frames per face detection, optical flow moves the faces in between (1 detects every frame)
 #********************************************************************
 #----------------------------Functions-------------------------------
 #********************************************************************
@@ -38,80 +47,83 @@ def gstreamer_pipeline(
         )
     )
 
+def Detect_Faces(frame):
+    # (x, y, w, h) of every face in the BGR frame
+    if face_model is None:
+        gray = cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
+        return face_cascade.detectMultiScale(gray,1.1,4)
+    height,width = face_model.input_size
+    rgb = cv2.cvtColor(cv2.resize(frame,(width,height),interpolation=cv2.INTER_AREA),cv2.COLOR_BGR2RGB)
+    boxes,scores,classes,num = face_model.Detect(rgb[np.newaxis])
+    faces = []
+    for box,score in zip(boxes[0][:int(num[0])],scores[0][:int(num[0])]):
+        if score >= FACE_THRESH:
+            ymin,xmin,ymax,xmax = box
+            faces.append((int(xmin*frame.shape[1]),int(ymin*frame.shape[0]),
+                          int((xmax-xmin)*frame.shape[1]),int((ymax-ymin)*frame.shape[0])))
+    return np.array(faces,dtype=int).reshape(-1,4)
+
 #********************************************************************
 #----------------------------Main------------------------------------
 #********************************************************************
-# initialize PWM and mount to the middle
-GPIO.setmode(GPIO.BOARD)
-
-GPIO.setup(33, GPIO.OUT)
-GPIO.setup(32, GPIO.OUT)
-
-pwm_vert = GPIO.PWM(33, 50)
-pwm_horz = GPIO.PWM(32, 50)
+ap = argparse.ArgumentParser()
+ap.add_argument('-md', '--model', type = str, help = 'face detection model, served by DetectorServer when it is running')
+ap.add_argument('-de', '--detect_every', type = int, help = 'run the face detector every this many frames')
+args = ap.parse_args()
+if args.model:
+    FACE_MODEL = args.model
+if args.detect_every:
+    DETECT_EVERY = args.detect_every
 
-vert_dc = 7.5
-horz_dc = 7.5
-pwm_vert.start(vert_dc)
-pwm_horz.start(horz_dc)
+# initialize the mount in the middle, the controller steers it towards the
+# followed face every frame instead of nudging it by a fixed step
+mount = PanTilt.PT_Mount(PWM_MAX=PWM_MAX,PWM_MIN=PWM_MIN)
+pixel_model = None
+if os.path.exists(PIXEL_FILE):
+    pixel_model = PanTilt.Pixel_Model.Load(PIXEL_FILE)
+controller = None
 
 # initialize camera stream
-cap = cv2.VideoCapture(gstreamer_pipeline(), cv2.CAP_GSTREAMER)
+# grabbed on a background thread, read() returns the newest frame instead of
+# one that queued up while the servos moved
+cap = FrameGrabber(gstreamer_pipeline())
 
 # initialize facial recognition
 face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
+face_model = None
+if FACE_MODEL:
+    # near instant when DetectorServer already holds the model
+    face_model = DetectorServer.Connect(FACE_MODEL)
+# faces keep their id between detections, so the mount follows one face
+# even when the detector lists them in a different order
+tracker = Tracker(Detect_Faces,detect_every=DETECT_EVERY)
 
 # implement tracking
 cv2.namedWindow("Face Detect", cv2.WINDOW_AUTOSIZE)
 while cap.isOpened():
     ret,frame = cap.read()
     frame = cv2.resize(frame,None, fx=0.5,fy=0.5, interpolation=cv2.INTER_AREA)
-    gray = cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray,1.1,4)
-    for (x,y,w,h) in faces:
+    tracks = tracker.Update(frame)
+    for track in tracks:
+        (x,y,w,h) = track.box.astype(int)
         cv2.rectangle(frame,(x,y),(x+w,y+h),(255,0,0),2)
-    if faces.__len__() > 0:
-        if faces.__len__() > 1:
-            face1 = faces[0]
-            face2 = faces[1]
-            if face1[0] > face2[0]:
-                print('first face x is bigger')
-            else:
-                print('second face x is bigger')
-            if face1[1] > face2[1]:
-                print('first face y is bigger')
-            else:
-                print('second face y is bigger')
-        # check if the first face is in the center
-        if faces[0][0]+faces[0][2]*.5 < (frame.shape[1]/2 - 20):
-            print('move right')
-            if horz_dc < (PWM_MAX-DC_STEP):
-                horz_dc += DC_STEP
-                pwm_horz.ChangeDutyCycle(horz_dc)
-        elif faces[0][0]+faces[0][2]*.5 > (frame.shape[1]/2 + 20):
-            print('move left')
-            if horz_dc > (PWM_MIN+DC_STEP):
-                horz_dc -= DC_STEP
-                pwm_horz.ChangeDutyCycle(horz_dc)
-        else:
-            print('x centered')
-        if faces[0][1]+faces[0][3]*.5 < (frame.shape[0]/2-20):
-            print('move up')
-            if vert_dc > (PWM_MIN+DC_STEP):
-                vert_dc -= DC_STEP
-                pwm_vert.ChangeDutyCycle(vert_dc)
-        elif faces[0][1]+faces[0][3]*.5 > (frame.shape[0]/2+20):
-            print('move down')
-            if vert_dc < (PWM_MAX-DC_STEP):
-                vert_dc += DC_STEP
-                pwm_vert.ChangeDutyCycle(vert_dc)
-        else:
-            print('y centered')
-    print('vert_dc: ',vert_dc)
-    print('horz_dc: ',horz_dc)        
+        cv2.putText(frame,str(track.id),(x,y-4),cv2.FONT_HERSHEY_SIMPLEX,0.5,(255,0,0),1)
+    target = tracker.Target()
+    if controller is None:
+        # the pixel model follows the frame size, a rough one from the camera's field of view until calibrated
+        controller = PanTilt.Center_Controller(mount,pixel_model or PanTilt.Pixel_Model.From_FOV(frame.shape[1],frame.shape[0]))
+    if target is not None:
+        (x,y) = target.Center()
+        (dx,dy) = controller.Update(x,y,frame.shape[1],frame.shape[0])
+        print('face %d off center by %d, %d px' % (target.id,dx,dy))
+    else:
+        controller.Reset()
     cv2.imshow("Face Detect", frame)
     keyCode = cv2.waitKey(5) &  0xFFF
     if keyCode == 27:
         break
+print('%d face detections in %d frames' % (tracker.detections,tracker.frames))
 cap.release()
+if face_model is not None:
+    face_model.Close()
 cv2.destroyAllWindows()
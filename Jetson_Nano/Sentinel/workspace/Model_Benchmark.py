@@ -0,0 +1,238 @@
+# Benchmark for exported detection models, replacing the time.time() pairs in
+# Object_Detection_Test1 and Model_Test_Image. Runs a model through Detector
+# (so .pb, .tflite and .onnx all work) over a fixed set of images and sweeps
+# thread counts and batch sizes. For every combination it reports the model
+# load time, p50/p95/p99 batch latency, per image latency, throughput and
+# the peak RSS during its run, and writes everything as JSON. Passing an earlier result with
+# --baseline fails the run when a combination got slower, so a model export
+# that regresses is caught before it goes on the Nano.
+# Only needs numpy and the runtime of the backend (plus OpenCV or Pillow to read
+# images, TensorFlow to read a TFRecord), so it runs on a plain Linux CPU box.
+# Usage:
+#   python Model_Benchmark.py -md Models/ssd_mobilenet_v2_graph/frozen_inference_graph.pb \
+#       -im images -bs 1,4 -nt 1,2,4 -o benchmark.json
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+import numpy as np
+import Detector
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def Decode_Image(data, size):
+    # encoded image bytes -> RGB uint8 array resized to size (height, width)
+    try:
+        import cv2
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        image = cv2.resize(image, (size[1], size[0]), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    except ImportError:
+        import io
+        from PIL import Image
+        image = Image.open(io.BytesIO(data)).convert('RGB').resize((size[1], size[0]), Image.BILINEAR)
+        return np.asarray(image, dtype=np.uint8)
+
+
+def Load_Images(path, size, max_images=None):
+    # images of a folder or the image/encoded feature of a TFRecord, as one [N, height, width, 3] array
+    encoded = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                with open(os.path.join(path, name), 'rb') as f:
+                    encoded.append(f.read())
+            if max_images and len(encoded) >= max_images:
+                break
+    else:
+        import tensorflow as tf
+        tf = tf.compat.v1 if hasattr(tf, 'compat') else tf
+        for record in tf.io.tf_record_iterator(path):
+            example = tf.train.Example.FromString(record)
+            encoded.append(example.features.feature['image/encoded'].bytes_list.value[0])
+            if max_images and len(encoded) >= max_images:
+                break
+    if not encoded:
+        raise ValueError('No images found in %s' % path)
+    return np.stack([Decode_Image(data, size) for data in encoded])
+
+
+def Current_RSS_MB():
+    # resident set size right now from /proc/self/statm, None where there is no /proc
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (IOError, OSError):
+        return None
+    return pages * resource.getpagesize() / (1024.0 * 1024.0)
+
+
+class RSS_Sampler:
+    # Highest RSS seen while the with block runs, sampled on a background thread.
+    # ru_maxrss is the peak of the whole process, so across a sweep every
+    # configuration after the heaviest one would report that one's peak.
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _Sample(self):
+        rss = Current_RSS_MB()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _Run(self):
+        while not self._stop.wait(self.interval):
+            self._Sample()
+
+    def __enter__(self):
+        self._Sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._Run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._Sample()
+        return False
+
+
+def Percentiles(latencies):
+    ms = 1000.0 * np.asarray(latencies, dtype=np.float64)
+    return {
+        'mean_ms': float(ms.mean()),
+        'std_ms': float(ms.std()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+    }
+
+
+def Run_Config(detector, images, batch_size, warmup, iterations):
+    # time every batch over the image set, iterations passes after warmup batches
+    batches = [images[i:i + batch_size] for i in range(0, len(images) - batch_size + 1, batch_size)]
+    if not batches:
+        raise ValueError('Batch size %d is larger than the %d images' % (batch_size, len(images)))
+    for i in range(warmup):
+        detector.Detect(batches[i % len(batches)])
+    latencies = []
+    start = time.time()
+    for iteration in range(iterations):
+        for batch in batches:
+            batch_start = time.time()
+            detector.Detect(batch)
+            latencies.append(time.time() - batch_start)
+    wall_time = time.time() - start
+    result = Percentiles(latencies)
+    result['per_image_ms'] = result['mean_ms'] / batch_size
+    result['throughput_ips'] = len(latencies) * batch_size / wall_time
+    result['batches'] = len(latencies)
+    return result
+
+
+def Benchmark(model_path, images_path, backend=None, batch_sizes=(1,), threads=(1,), warmup=5,
+              iterations=3, max_images=None):
+    results = []
+    images = None
+    for num_threads in threads:
+        # a fresh load per thread count, so every entry has its own load time
+        rss_before = Current_RSS_MB()
+        detector = Detector.Load_Detector(model_path, backend, num_threads=num_threads)
+        if images is None:
+            images = Load_Images(images_path, detector.input_size, max_images)
+        for batch_size in batch_sizes:
+            # peak of this configuration only, relative to before its model was loaded
+            with RSS_Sampler() as rss:
+                result = Run_Config(detector, images, batch_size, warmup, iterations)
+            result.update({
+                'backend': detector.backend,
+                'threads': num_threads,
+                'batch_size': batch_size,
+                'load_time_s': detector.load_time,
+                'peak_rss_mb': rss.peak,
+                'rss_before_load_mb': rss_before,
+                'rss_delta_mb': None if rss.peak is None or rss_before is None else rss.peak - rss_before,
+            })
+            results.append(result)
+            print('threads %2d  batch %2d  p50 %8.2f ms  p95 %8.2f ms  p99 %8.2f ms  %7.2f img/s  load %.2f s  rss %s MB (+%s MB)' % (
+                num_threads, batch_size, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                result['throughput_ips'], result['load_time_s'],
+                '?' if rss.peak is None else '%.0f' % rss.peak,
+                '?' if result['rss_delta_mb'] is None else '%.0f' % result['rss_delta_mb']))
+        detector.Close()
+    return {
+        'model': model_path,
+        'model_size_bytes': os.path.getsize(model_path),
+        'images': images_path,
+        'num_images': 0 if images is None else len(images),
+        'warmup': warmup,
+        'iterations': iterations,
+        'host': {
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+        },
+        'time': time.time(),
+        'results': results,
+    }
+
+
+def Compare(report, baseline, tolerance):
+    # entries of report whose p50 latency got worse than baseline by more than tolerance
+    old = {(r['backend'], r['threads'], r['batch_size']): r for r in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        key = (result['backend'], result['threads'], result['batch_size'])
+        if key in old and result['p50_ms'] > old[key]['p50_ms'] * (1 + tolerance):
+            regressions.append({
+                'backend': key[0], 'threads': key[1], 'batch_size': key[2],
+                'p50_ms': result['p50_ms'], 'baseline_p50_ms': old[key]['p50_ms'],
+            })
+    return regressions
+
+
+def Int_List(text):
+    return [int(value) for value in text.split(',') if value]
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-md', '--model', type = str, required = True, help = 'model to benchmark (.pb, .tflite or .onnx)')
+    ap.add_argument('-bk', '--backend', type = str, choices = sorted(Detector.BACKENDS), help = 'detector backend, picked from the model extension by default')
+    ap.add_argument('-im', '--images', type = str, default = 'images', help = 'image folder or TFRecord to run the model on')
+    ap.add_argument('-ni', '--num_images', type = int, help = 'use at most this many images')
+    ap.add_argument('-bs', '--batch_sizes', type = Int_List, default = [1], help = 'comma separated batch sizes')
+    ap.add_argument('-nt', '--num_threads', type = Int_List, default = [1], help = 'comma separated thread counts')
+    ap.add_argument('-wu', '--warmup', type = int, default = 5, help = 'untimed batches before timing')
+    ap.add_argument('-it', '--iterations', type = int, default = 3, help = 'timed passes over the images')
+    ap.add_argument('-o', '--output', type = str, help = 'JSON file to write the results to')
+    ap.add_argument('-bl', '--baseline', type = str, help = 'earlier JSON result to check for regressions')
+    ap.add_argument('-tl', '--tolerance', type = float, default = 0.1, help = 'allowed p50 slowdown against the baseline (0.1 = 10%%)')
+    args = ap.parse_args()
+
+    report = Benchmark(args.model, args.images, args.backend, args.batch_sizes, args.num_threads,
+                       args.warmup, args.iterations, args.num_images)
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['regressions'] = Compare(report, json.load(f), args.tolerance)
+        for regression in report['regressions']:
+            print('REGRESSION threads %d batch %d: p50 %.2f ms, baseline %.2f ms' % (
+                regression['threads'], regression['batch_size'], regression['p50_ms'], regression['baseline_p50_ms']))
+        status = 1 if report['regressions'] else 0
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(status)
@@ -0,0 +1,566 @@
+import asyncio
+import collections
+import concurrent.futures
+import json
+import queue
+import threading
+import time
+import numpy as np
+from NanoLambdaNSP32 import *
+
+"""
+.. module:: NSP32Client
+   :synopsis: event driven NSP32 client (acquisitions return futures instead of being polled with UpdateStatus())
+"""
+
+class AcqFuture(concurrent.futures.Future):
+	"""future of a single NSP32 acquisition
+
+	Unlike a plain Future, cancel() also aborts an acquisition that is already running.
+	In that case cancel() still returns False (the future has left the pending state),
+	but result() raises concurrent.futures.CancelledError as soon as the worker notices.
+
+	"""
+
+	def __init__(self):
+		"""__init__ method"""
+
+		super().__init__()
+		self._abortEvent = threading.Event()
+
+	def cancel(self):
+		"""cancel the acquisition
+
+		Returns:
+			bool: True if the acquisition was cancelled before it started
+
+		"""
+
+		self._abortEvent.set()
+		return super().cancel()
+
+
+class NSP32Client:
+	"""event driven NSP32 client
+
+	A single worker thread owns the NSP32 and runs the queued acquisitions one after another.
+	While an acquisition is in progress the worker sleeps on the ready pin event, so waiting
+	for a spectrum costs no CPU (the old "while GetReturnPacketSize() <= 0: UpdateStatus()"
+	loop kept a whole core busy).
+
+	"""
+
+	__AbortPollS = 0.05		# how often a waiting worker checks for cancellation
+
+	def __init__(self, nsp32):
+		"""__init__ method
+
+		Args:
+			nsp32(NSP32): initialized NSP32 (only use it through this client from now on)
+
+		"""
+
+		self._nsp32 = nsp32
+		self._requests = queue.Queue()
+		self._needsReset = False		# set after an aborted or timed out acquisition
+
+		self._worker = threading.Thread(target = self._Run)
+		self._worker.daemon = True
+		self._worker.start()
+
+	def AcqSpectrum(self, userCode, integrationTime, frameAvgNum, enableAE, timeout = None):
+		"""queue a spectrum acquisition
+
+		Args:
+			userCode(int): user code
+
+			integrationTime(int): integration time
+
+			frameAvgNum(int): frame average num
+
+			enableAE(bool): True to enable AE; False to disable AE
+
+			timeout(float): max. seconds the acquisition may take once started (None to wait forever)
+
+		Returns:
+			AcqFuture: future resolving to a SpectrumInfo
+
+		"""
+
+		return self._Submit(self._nsp32.AcqSpectrum, (userCode, integrationTime, frameAvgNum, enableAE), ReturnPacket.ExtractSpectrumInfo, timeout)
+
+	def AcqXYZ(self, userCode, integrationTime, frameAvgNum, enableAE, timeout = None):
+		"""queue an XYZ acquisition (same arguments as AcqSpectrum())
+
+		Returns:
+			AcqFuture: future resolving to an XYZInfo
+
+		"""
+
+		return self._Submit(self._nsp32.AcqXYZ, (userCode, integrationTime, frameAvgNum, enableAE), ReturnPacket.ExtractXYZInfo, timeout)
+
+	def AcqSpectrumAsync(self, userCode, integrationTime, frameAvgNum, enableAE, timeout = None, loop = None):
+		"""asyncio version of AcqSpectrum() (cancelling the awaitable cancels the acquisition)
+
+		Returns:
+			asyncio.Future: awaitable resolving to a SpectrumInfo
+
+		"""
+
+		return asyncio.wrap_future(self.AcqSpectrum(userCode, integrationTime, frameAvgNum, enableAE, timeout), loop = loop)
+
+	def AcqXYZAsync(self, userCode, integrationTime, frameAvgNum, enableAE, timeout = None, loop = None):
+		"""asyncio version of AcqXYZ() (cancelling the awaitable cancels the acquisition)
+
+		Returns:
+			asyncio.Future: awaitable resolving to an XYZInfo
+
+		"""
+
+		return asyncio.wrap_future(self.AcqXYZ(userCode, integrationTime, frameAvgNum, enableAE, timeout), loop = loop)
+
+	def Close(self):
+		"""finish the queued acquisitions and stop the worker thread"""
+
+		self._requests.put(None)
+		self._worker.join()
+
+	def _Submit(self, start, args, extract, timeout):
+		"""queue a request for the worker thread"""
+
+		future = AcqFuture()
+		self._requests.put((future, start, args, extract, timeout))
+		return future
+
+	def _Run(self):
+		"""worker thread"""
+
+		while True :
+			request = self._requests.get()
+
+			if request is None :
+				return
+
+			future, start, args, extract, timeout = request
+
+			# skip requests cancelled while they were queued
+			if not future.set_running_or_notify_cancel() :
+				continue
+
+			try :
+				future.set_result(self._Acquire(future, start, args, extract, timeout))
+			except BaseException as e :
+				future.set_exception(e)
+
+	def _Acquire(self, future, start, args, extract, timeout):
+		"""run one acquisition on the worker thread
+
+		Returns:
+			SpectrumInfo or XYZInfo: extracted result
+
+		"""
+
+		deadline = None if timeout is None else time.time() + timeout
+
+		# an aborted acquisition may still be running on the sensor, reset it first
+		# (the reset counts against the timeout, so a dead sensor fails the request instead of blocking the worker)
+		if self._needsReset :
+			if not self._nsp32.Wakeup(None if deadline is None else max(0, deadline - time.time())) :
+				raise concurrent.futures.TimeoutError('NSP32 did not respond to a reset within %.3f s' % timeout)
+
+			self._needsReset = False
+
+		start(*args)
+
+		# sleep until the ready trigger fires, waking up now and then to check for cancellation
+		while True :
+			if future._abortEvent.is_set() :
+				self._Abort()
+				raise concurrent.futures.CancelledError()
+
+			if self._nsp32.WaitReadyTrigger(NSP32Client.__AbortPollS) :
+				break
+
+			if deadline is not None and time.time() > deadline :
+				self._Abort()
+				raise concurrent.futures.TimeoutError('NSP32 acquisition did not finish within %.3f s' % timeout)
+
+		if future._abortEvent.is_set() :
+			self._nsp32.CancelAsyncCmd()		# the sensor is done, so no reset is needed
+			raise concurrent.futures.CancelledError()
+
+		# the acquisition is done, UpdateStatus() retrieves the data
+		self._nsp32.UpdateStatus()
+		return extract(self._nsp32.GetReturnPacket())
+
+	def _Abort(self):
+		"""forget the pending async command"""
+
+		self._nsp32.CancelAsyncCmd()
+		self._nsp32.ClearReturnPacket()
+		self._needsReset = True
+
+
+# a batch of spectra read from a SpectrumStream (arrays ordered oldest first)
+SpectrumSamples = collections.namedtuple('SpectrumSamples', ['spectra', 'timestamps', 'integrationTimes', 'saturated', 'xyz'])
+
+
+class SpectrumStream:
+	"""continuous spectrum acquisition into a preallocated ring buffer
+
+	A background thread keeps the sensor acquiring back-to-back through an NSP32Client and
+	copies every spectrum into fixed-size NumPy arrays, together with the time its acquisition
+	started, its integration time, saturation flag and XYZ. Consumers (the SpectrumMeter plot,
+	the scanner) read the latest spectra with Latest() without blocking the acquisition, or
+	block with WaitNewerThan() when they need a spectrum taken after a certain moment (e.g.
+	after the mount stopped). All of them share the one stream, so only the client's worker
+	ever talks to the serial port.
+
+	"""
+
+	def __init__(self, client, numOfPoints, capacity = 64, timeout = 5):
+		"""__init__ method
+
+		Args:
+			client(NSP32Client): client to acquire through
+
+			numOfPoints(int): num of points per spectrum (WavelengthInfo.NumOfPoints)
+
+			capacity(int): num of spectra kept in the ring buffer
+
+			timeout(float): max. seconds a single acquisition may take
+
+		"""
+
+		self._client = client
+		self._capacity = capacity
+		self._timeout = timeout
+
+		self._spectra = np.zeros((capacity, numOfPoints), dtype = np.float32)
+		self._timestamps = np.zeros(capacity, dtype = np.float64)
+		self._integrationTimes = np.zeros(capacity, dtype = np.uint16)
+		self._saturated = np.zeros(capacity, dtype = np.bool_)
+		self._xyz = np.zeros((capacity, 3), dtype = np.float32)
+		self._count = 0					# num of spectra written since the stream was created
+
+		self._lock = threading.Lock()
+		self._newSpectrum = threading.Condition(self._lock)
+		self._settings = (32, 3, False)		# integration time, frame avg num, AE
+		self._stopEvent = threading.Event()
+		self._future = None
+		self._thread = None
+
+	@property
+	def Count(self):
+		"""int: num of spectra acquired so far"""
+
+		return self._count
+
+	def IsRunning(self):
+		"""check if the stream is acquiring
+
+		Returns:
+			bool: True while acquiring
+
+		"""
+
+		return self._thread is not None and self._thread.is_alive()
+
+	def SetSettings(self, integrationTime, frameAvgNum, enableAE):
+		"""change the acquisition settings (applied from the next acquisition on)
+
+		Args:
+			integrationTime(int): integration time
+
+			frameAvgNum(int): frame average num
+
+			enableAE(bool): True to enable AE; False to disable AE
+
+		"""
+
+		self._settings = (integrationTime, frameAvgNum, enableAE)
+
+	def Start(self, integrationTime = 32, frameAvgNum = 3, enableAE = False):
+		"""start acquiring (same arguments as SetSettings())"""
+
+		self.SetSettings(integrationTime, frameAvgNum, enableAE)
+
+		if self.IsRunning() :
+			return
+
+		self._stopEvent.clear()
+		self._thread = threading.Thread(target = self._Run)
+		self._thread.daemon = True
+		self._thread.start()
+
+	def Stop(self):
+		"""stop acquiring (the spectra in the ring buffer stay readable)"""
+
+		self._stopEvent.set()
+
+		future = self._future
+		if future is not None :
+			future.cancel()
+
+		if self._thread is not None :
+			self._thread.join()
+			self._thread = None
+
+	def Latest(self, n = 1):
+		"""read the latest spectra without blocking
+
+		Args:
+			n(int): max. num of spectra to read (at most the ring buffer capacity)
+
+		Returns:
+			SpectrumSamples: copies of the latest spectra, oldest first (empty arrays before the first spectrum)
+
+		"""
+
+		with self._lock :
+			return self._Read(n)
+
+	def WaitNewerThan(self, timestamp, timeout = None):
+		"""block until a spectrum whose acquisition started after the given time is available
+
+		Args:
+			timestamp(float): time.time() value the acquisition must have started after
+
+			timeout(float): max. seconds to wait (None to wait forever)
+
+		Returns:
+			SpectrumSamples: the latest spectrum (None on timeout)
+
+		"""
+
+		with self._lock :
+			isNewer = lambda : self._count > 0 and self._timestamps[(self._count - 1) % self._capacity] > timestamp
+
+			if not self._newSpectrum.wait_for(isNewer, timeout) :
+				return None
+
+			return self._Read(1)
+
+	def _Read(self, n):
+		"""copy the latest n spectra out of the ring buffer (call with the lock held)"""
+
+		n = min(n, self._count, self._capacity)
+		slots = np.arange(self._count - n, self._count) % self._capacity
+
+		return SpectrumSamples(self._spectra[slots], self._timestamps[slots], self._integrationTimes[slots], self._saturated[slots], self._xyz[slots])
+
+	def _Run(self):
+		"""acquisition thread"""
+
+		while not self._stopEvent.is_set() :
+			startTime = time.time()
+			self._future = self._client.AcqSpectrum(0, *self._settings, timeout = self._timeout)
+
+			try :
+				info = self._future.result()
+			except concurrent.futures.CancelledError :
+				break
+			except concurrent.futures.TimeoutError :
+				continue
+
+			with self._lock :
+				slot = self._count % self._capacity
+				self._spectra[slot] = info.Spectrum
+				self._timestamps[slot] = startTime
+				self._integrationTimes[slot] = info.IntegrationTime
+				self._saturated[slot] = info.IsSaturated
+				self._xyz[slot] = (info.X, info.Y, info.Z)
+				self._count += 1
+				self._newSpectrum.notify_all()
+
+		self._future = None
+
+
+class ReplayAdaptor:
+	"""fake MCU adaptor that replays recorded return packets (lets NSP32 run without the sensor)
+
+	Pass it to NSP32 with functools.partial, e.g.
+
+		NSP32(13, 15, DataChannelEnum.Uart, mcuAdaptorType = functools.partial(ReplayAdaptor, packets = LoadRecording('nsp32.json')))
+
+	"""
+
+	def __init__(self, gpioPinRst, gpioPinReady, readyTriggeredDelegate, channelType, spiBus, spiDevice, uartPotName, packets = None, acqDelay = 0.05):
+		"""__init__ method
+
+		Args:
+			gpioPinRst ... uartPotName: same as _RPiAdaptor (only gpioPinReady and readyTriggeredDelegate are used)
+
+			packets(dict): recorded return packets by command code (needed for every "Get" command used)
+
+			acqDelay(float): seconds an AcqSpectrum/AcqXYZ takes before the ready trigger fires
+
+		"""
+
+		self._gpioPinReady = gpioPinReady
+		self._onPinReadyTriggeredDelegate = readyTriggeredDelegate
+		self._packets = packets if packets is not None else {}
+		self._acqDelay = acqDelay
+
+		self._rxBuf = bytearray()		# bytes waiting to be read back by NSP32
+		self._rxLock = threading.Lock()
+		self._startMillis = 0
+
+	def Init(self):
+		"""initialize adaptor"""
+
+		pass
+
+	def DelayMicros(self, us):
+		"""delay microseconds"""
+
+		time.sleep(us * 0.000001)
+
+	def DelayMillis(self, ms):
+		"""delay milliseconds"""
+
+		time.sleep(ms * 0.001)
+
+	def PinRstOutputLow(self):
+		"""hold the sensor in reset"""
+
+		pass
+
+	def PinRstHighInput(self):
+		"""release the reset (the 'rebooted' sensor fires the ready trigger shortly after)"""
+
+		self._FireReadyTrigger(0.001)
+
+	def SpiSend(self, buf):
+		"""send through SPI"""
+
+		self._Receive(buf)
+
+	def SpiReceive(self, length):
+		"""receive from SPI"""
+
+		with self._rxLock :
+			data = self._rxBuf[0 : length]
+			del self._rxBuf[0 : length]
+
+		return list(data) + [0] * (length - len(data))
+
+	def StartMillis(self):
+		"""start to count milliseconds"""
+
+		self._startMillis = time.time() * 1000
+
+	def GetMillisPassed(self):
+		"""get milliseconds passed since last call to StartMillis()"""
+
+		return time.time() * 1000 - self._startMillis
+
+	def UartBytesAvailable(self):
+		"""see if any bytes available for reading"""
+
+		return len(self._rxBuf) > 0
+
+	def UartReadByte(self):
+		"""read a single byte"""
+
+		with self._rxLock :
+			b = self._rxBuf[0]
+			del self._rxBuf[0]
+
+		return b
+
+	def UartClearInput(self):
+		"""discard all bytes waiting to be read"""
+
+		with self._rxLock :
+			del self._rxBuf[:]
+
+	def UartReadInto(self, buf, timeoutMs):
+		"""read until the buffer is full or the timeout expires
+
+		Returns:
+			int: num of bytes read
+
+		"""
+
+		deadline = time.time() + timeoutMs * 0.001
+		readIdx = 0
+
+		while True :
+			with self._rxLock :
+				n = min(len(buf) - readIdx, len(self._rxBuf))
+				buf[readIdx : readIdx + n] = self._rxBuf[0 : n]
+				del self._rxBuf[0 : n]
+
+			readIdx += n
+
+			if readIdx >= len(buf) or time.time() > deadline :
+				return readIdx
+
+			time.sleep(0.001)
+
+	def UartSend(self, buf):
+		"""send through UART"""
+
+		self._Receive(buf)
+
+	def _Receive(self, cmd):
+		"""queue the recorded answer to a command sent by NSP32"""
+
+		cmdCode = cmd[2]
+		userCode = cmd[3]
+
+		if cmdCode in self._packets :
+			packet = bytearray(self._packets[cmdCode])
+		elif cmdCode in (CmdCodeEnum.Hello, CmdCodeEnum.Standby, CmdCodeEnum.AcqSpectrum, CmdCodeEnum.AcqXYZ) :
+			packet = bytearray(5)		# these commands only return an acknowledgement
+		else :
+			return		# nothing recorded, NSP32 sees a timeout
+
+		# answer with the user code of this command
+		packet[0] = CmdCodeEnum.Prefix0
+		packet[1] = CmdCodeEnum.Prefix1
+		packet[2] = cmdCode
+		packet[3] = userCode
+		packet[-1] = ((~sum(packet[0 : -1])) + 1) & 0xFF
+
+		with self._rxLock :
+			self._rxBuf += packet
+
+		if cmdCode in (CmdCodeEnum.AcqSpectrum, CmdCodeEnum.AcqXYZ) :
+			self._FireReadyTrigger(self._acqDelay)
+
+	def _FireReadyTrigger(self, delay):
+		"""fire the ready trigger from another thread, like the GPIO edge event does"""
+
+		timer = threading.Timer(delay, self._onPinReadyTriggeredDelegate, [self._gpioPinReady])
+		timer.daemon = True
+		timer.start()
+
+
+def LoadRecording(path):
+	"""load return packets saved with SaveRecording()
+
+	Args:
+		path(str): recording file
+
+	Returns:
+		dict: return packets by command code
+
+	"""
+
+	with open(path) as f :
+		return { int(cmdCode) : bytes.fromhex(packet) for cmdCode, packet in json.load(f).items() }
+
+def SaveRecording(path, packets):
+	"""save return packets for ReplayAdaptor
+
+	Args:
+		path(str): recording file
+
+		packets(dict): return packets (bytes) by command code, e.g. { CmdCodeEnum.GetSpectrum : returnPacket.PacketBytes }
+
+	"""
+
+	with open(path, 'w') as f :
+		json.dump({ str(int(cmdCode)) : bytes(packet).hex() for cmdCode, packet in packets.items() }, f, indent = 1)
@@ -0,0 +1,111 @@
+# Tests for NSP32Client, run through ReplayAdaptor so no sensor is needed
+#	python -m unittest NSP32Client_test
+import concurrent.futures
+import functools
+import struct
+import time
+import unittest
+
+from NanoLambdaNSP32 import *
+from NSP32Client import NSP32Client, ReplayAdaptor
+
+# GetXYZ return packet: integration time 32, not saturated, X, Y, Z = 1.5, 2.5, 3.5
+# (prefix, codes and checksum are filled in by ReplayAdaptor)
+XYZ_PACKET = bytes(4) + struct.pack('<HBx', 32, 0) + struct.pack('<fff', 1.5, 2.5, 3.5) + bytes(1)
+
+
+class TestAdaptor(ReplayAdaptor):
+	"""ReplayAdaptor that counts the resets and can play a dead sensor"""
+
+	def __init__(self, *args, **kwargs):
+		"""__init__ method"""
+
+		super().__init__(*args, **kwargs)
+		self.resets = 0
+		self.dead = False		# True: neither a reset nor an acquisition fires the ready trigger
+
+	def PinRstHighInput(self):
+		"""release the reset"""
+
+		self.resets += 1
+		if not self.dead :
+			super().PinRstHighInput()
+
+	def _FireReadyTrigger(self, delay):
+		"""fire the ready trigger unless the sensor is dead"""
+
+		if not self.dead :
+			super()._FireReadyTrigger(delay)
+
+
+class NSP32ClientTest(unittest.TestCase):
+
+	def setUp(self):
+		self.nsp32 = NSP32(13, 15, DataChannelEnum.Uart, mcuAdaptorType = functools.partial(TestAdaptor, packets = { CmdCodeEnum.GetXYZ : XYZ_PACKET }, acqDelay = 0.02))
+		self.nsp32.Init()
+		self.adaptor = self.nsp32._mcuAdaptor
+		self.client = NSP32Client(self.nsp32)
+
+	def tearDown(self):
+		self.adaptor.dead = False
+		self.client.Close()
+
+	def test_acquisition(self):
+		info = self.client.AcqXYZ(0, 32, 1, False, timeout = 1).result(2)
+		self.assertEqual(32, info.IntegrationTime)
+		self.assertFalse(info.IsSaturated)
+		self.assertEqual((1.5, 2.5, 3.5), (info.X, info.Y, info.Z))
+
+	def test_timeout(self):
+		self.adaptor._acqDelay = 1.0
+		start = time.time()
+		with self.assertRaises(concurrent.futures.TimeoutError):
+			self.client.AcqXYZ(0, 32, 1, False, timeout = 0.1).result(2)
+		self.assertLess(time.time() - start, 0.5)
+
+	def test_cancel_running_acquisition(self):
+		self.adaptor._acqDelay = 1.0
+		future = self.client.AcqXYZ(0, 32, 1, False)
+		while not future.running() :
+			time.sleep(0.005)
+		self.assertFalse(future.cancel())
+		with self.assertRaises(concurrent.futures.CancelledError):
+			future.result(0.5)
+
+	def test_acquisition_after_reset(self):
+		self.adaptor._acqDelay = 1.0
+		with self.assertRaises(concurrent.futures.TimeoutError):
+			self.client.AcqXYZ(0, 32, 1, False, timeout = 0.1).result(2)
+		resets = self.adaptor.resets
+		self.adaptor._acqDelay = 0.02
+		info = self.client.AcqXYZ(0, 32, 1, False, timeout = 1).result(2)
+		self.assertEqual(resets + 1, self.adaptor.resets)
+		self.assertEqual(1.5, info.X)
+
+	def test_acquisition_after_cancel_resets(self):
+		self.adaptor._acqDelay = 1.0
+		future = self.client.AcqXYZ(0, 32, 1, False)
+		while not future.running() :
+			time.sleep(0.005)
+		future.cancel()
+		resets = self.adaptor.resets
+		self.adaptor._acqDelay = 0.02
+		self.assertEqual(2.5, self.client.AcqXYZ(0, 32, 1, False, timeout = 1).result(2).Y)
+		self.assertEqual(resets + 1, self.adaptor.resets)
+
+	def test_dead_sensor_fails_within_timeout(self):
+		self.adaptor.dead = True
+		with self.assertRaises(concurrent.futures.TimeoutError):
+			self.client.AcqXYZ(0, 32, 1, False, timeout = 0.1).result(2)
+		# the reset after the timeout gets the request's time, not forever
+		start = time.time()
+		with self.assertRaises(concurrent.futures.TimeoutError):
+			self.client.AcqXYZ(0, 32, 1, False, timeout = 0.2).result(2)
+		self.assertLess(time.time() - start, 1.0)
+		# the worker is still serving requests once the sensor is back
+		self.adaptor.dead = False
+		self.assertEqual(3.5, self.client.AcqXYZ(0, 32, 1, False, timeout = 1).result(2).Z)
+
+
+if __name__ == '__main__':
+	unittest.main()
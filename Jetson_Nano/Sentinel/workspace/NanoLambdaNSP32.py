@@ -17,9 +17,16 @@
 import enum
 import struct
 import time
-import Jetson.GPIO as GPIO
-import spidev
-import serial
+import threading
+import numpy as np
+
+try :
+	import Jetson.GPIO as GPIO
+	import spidev
+	import serial
+except ImportError :
+	# only available on the Nano, adaptors that replay recorded packets (see NSP32Client.ReplayAdaptor) do not need them
+	GPIO = spidev = serial = None
 
 """
 .. module:: NanoLambdaNSP32
@@ -65,6 +72,10 @@ class WavelengthInfo:
 		self._packetBytes = packetBytes
 		self._numOfPoints = struct.unpack('<I', self._packetBytes[4:8])[0]		# num of points
 
+		# view the received bytes as short data (no copy, no per-access unpacking)
+		self._wavelength = np.frombuffer(self._packetBytes, dtype = '<u2', count = self._numOfPoints, offset = 8)
+		self._wavelength.flags.writeable = False
+
 	@property
 	def NumOfPoints(self):
 		"""int: num of points"""
@@ -73,10 +84,19 @@ class WavelengthInfo:
 
 	@property
 	def Wavelength(self):
-		"""tuple: wavelength data"""
+		"""numpy.ndarray: wavelength data (read-only view over the packet bytes)"""
 		
-		# convert received bytes to short data
-		return struct.unpack('<' + 'H' * self._numOfPoints, self._packetBytes[8 : 8 + self._numOfPoints * 2])
+		return self._wavelength
+
+	def CopyWavelength(self):
+		"""copy the wavelength data out of the packet bytes (use when the packet buffer is going to be reused)
+
+		Returns:
+			numpy.ndarray: wavelength data
+
+		"""
+
+		return self._wavelength.copy()
 
 
 class SpectrumInfo:
@@ -93,6 +113,10 @@ class SpectrumInfo:
 		self._packetBytes = packetBytes
 		self._numOfPoints = struct.unpack('<I', self._packetBytes[8:12])[0]	# num of points
 
+		# view the received bytes as float data (no copy, no per-access unpacking)
+		self._spectrum = np.frombuffer(self._packetBytes, dtype = '<f4', count = self._numOfPoints, offset = 12)
+		self._spectrum.flags.writeable = False
+
 	@property
 	def NumOfPoints(self):
 		"""int: num of points"""
@@ -113,10 +137,19 @@ class SpectrumInfo:
 
 	@property
 	def Spectrum(self):
-		"""tuple: spectrum data"""
+		"""numpy.ndarray: spectrum data (read-only view over the packet bytes)"""
 		
-		# convert received bytes to float data
-		return struct.unpack('<' + 'f' * self._numOfPoints, self._packetBytes[12 : 12 + self._numOfPoints * 4])
+		return self._spectrum
+
+	def CopySpectrum(self):
+		"""copy the spectrum data out of the packet bytes (use when the packet buffer is going to be reused)
+
+		Returns:
+			numpy.ndarray: spectrum data
+
+		"""
+
+		return self._spectrum.copy()
 
 	@property
 	def X(self):
@@ -323,7 +356,7 @@ class NSP32:
 	__UartLowestBaudRate	= 9600			# lowest UART baud rate option = 9600 bps
 	__UartTimeoutMs			= 2 * (__RetBufSize * 8 * 1000 / __UartLowestBaudRate)	# UART trnamission timeout = 941ms (double transmission time for the largest return packet with the lowest UART baud rate)
 
-	def __init__(self, gpioPinRst, gpioPinReady, channelType, spiBus = 0, spiDevice = 0, uartPotName = '/dev/ttyS0'):
+	def __init__(self, gpioPinRst, gpioPinReady, channelType, spiBus = 0, spiDevice = 0, uartPotName = '/dev/ttyS0', mcuAdaptorType = None):
 		"""__init__ method
 
 		Args:
@@ -339,10 +372,15 @@ class NSP32:
 
 			uartPortName(str): UART port name
 
+			mcuAdaptorType(type): adaptor class taking the same arguments as _RPiAdaptor (None to use _RPiAdaptor)
+
 		"""
 
 		# RPi adaptor
-		self._mcuAdaptor = _RPiAdaptor(gpioPinRst, gpioPinReady, self._OnPinReadyTriggered, channelType, spiBus, spiDevice, uartPotName)
+		if mcuAdaptorType is None :
+			mcuAdaptorType = _RPiAdaptor
+
+		self._mcuAdaptor = mcuAdaptorType(gpioPinRst, gpioPinReady, self._OnPinReadyTriggered, channelType, spiBus, spiDevice, uartPotName)
 
 		self._channelType = channelType					# data channel type (SPI or UART)
 
@@ -350,6 +388,7 @@ class NSP32:
 		self._userCode = 0								# command user code
 		self._asyncCmdCode = CmdCodeEnum.Unknown		# asynchronous command code (command waiting for async result)
 		self._isPinReadyTriggered = False				# "is ready pin triggered" flag
+		self._pinReadyEvent = threading.Event()			# set together with the flag, lets other threads block on the ready trigger
 		self._cmdBuf = bytearray(NSP32.__CmdBufSize)	# command buffer
 
 		self._retPacketSize = 0							# return packet size
@@ -379,8 +418,18 @@ class NSP32:
 
 		return self._isActive
 
-	def Wakeup(self):
-		"""	wakeup/reset NSP32"""
+	def Wakeup(self, timeout = None):
+		"""	wakeup/reset NSP32
+
+		Args:
+			timeout(float): max. seconds to keep resetting (None to retry forever)
+
+		Returns:
+			bool: True if NSP32 is active; False if it did not respond within the timeout
+
+		"""
+
+		deadline = None if timeout is None else time.time() + timeout
 
 		# continuously reset NSP32 until the functionality check passes
 		while True:
@@ -389,21 +438,26 @@ class NSP32:
 			self._mcuAdaptor.DelayMicros(NSP32.__WakeupPulseHoldUs)	# hold the signal low for a period of time
 		
 			self._isPinReadyTriggered = False		# clear the flag, so that we can detect the "ready trigger" later on
+			self._pinReadyEvent.clear()
 		
 			self._mcuAdaptor.PinRstHighInput()
 		
 			# wait until the reboot procedure is done (the "ready trigger" is fired)
-			while not self._isPinReadyTriggered :
-				pass
+			if not self._pinReadyEvent.wait(None if deadline is None else max(0, deadline - time.time())) :
+				return False
 	
 			# test if the SPI/UART communication is well established
 			# send "HELLO" command and check the return packet
 			# if the return packet is incorrect, reset again
 			if self._SendCmd(CmdCodeEnum.Hello, 0, True, False, False) :
 				break
+
+			if deadline is not None and time.time() > deadline :
+				return False
 	
 		# record that NSP32 is active now
 		self._isActive = True
+		return True
 	
 	def Hello(self, userCode):
 		"""say hello to NSP32
@@ -537,6 +591,25 @@ class NSP32:
 		"""
 
 		self._isPinReadyTriggered = True
+		self._pinReadyEvent.set()
+
+	def WaitReadyTrigger(self, timeout = None):
+		"""block until the "ready trigger" fires (instead of polling UpdateStatus())
+		
+		Args:
+			timeout(float): max. seconds to wait (None to wait forever)
+
+		Returns:
+			bool: True if the ready trigger fired; False on timeout
+
+		"""
+
+		return self._pinReadyEvent.wait(timeout)
+
+	def CancelAsyncCmd(self):
+		"""stop waiting for the result of the pending async command (a late "ready trigger" is then ignored by UpdateStatus())"""
+
+		self._asyncCmdCode = CmdCodeEnum.Unknown
 
 	def UpdateStatus(self):
 		"""update status (including checking async results, and processing forward commands)"""
@@ -648,6 +721,7 @@ class NSP32:
 		self._asyncCmdCode = cmdCode if waitReadyTrigger else CmdCodeEnum.Unknown
 		self._userCode = userCode
 		self._isPinReadyTriggered = False
+		self._pinReadyEvent.clear()
 
 		while True :
 			isTimeout = False
@@ -657,26 +731,14 @@ class NSP32:
 				self._mcuAdaptor.DelayMillis(NSP32.__CmdProcessTimeMs)			# wait for a short processing time
 				self._retBuf[0 : retLen] = self._mcuAdaptor.SpiReceive(retLen)	# get the return packet					
 			elif self._channelType == DataChannelEnum.Uart :
-				# clear UART TX buffer (by reading out all remaining bytes in the buffer)
-				while self._mcuAdaptor.UartBytesAvailable() :
-					self._mcuAdaptor.UartReadByte()
+				# clear UART TX buffer (discard all remaining bytes in the buffer)
+				self._mcuAdaptor.UartClearInput()
 				
 				self._mcuAdaptor.UartSend(list(self._cmdBuf[0 : cmdLen]))		# send the command to NSP32 (through UART)
-				self._mcuAdaptor.StartMillis()									# start to count milliseconds (for timeout detection)
 				
-				# read expected length of bytes (return packet) from UART
-				writeIdx = 0
-				
-				while writeIdx < retLen :
-					# if we can't receive the expected length of bytes within a period of time, timeout occurs
-					if self._mcuAdaptor.GetMillisPassed() > NSP32.__UartTimeoutMs :
-						isTimeout = True
-						break
-
-					# read bytes from UART
-					while self._mcuAdaptor.UartBytesAvailable() and writeIdx < retLen :
-						self._retBuf[writeIdx] = self._mcuAdaptor.UartReadByte()
-						writeIdx += 1
+				# read expected length of bytes (return packet) from UART straight into the return packet buffer
+				# if we can't receive the expected length of bytes within a period of time, timeout occurs
+				isTimeout = self._mcuAdaptor.UartReadInto(memoryview(self._retBuf)[0 : retLen], NSP32.__UartTimeoutMs) < retLen
 	
 			if not isTimeout :
 				# check if the return packet is valid		
@@ -707,8 +769,8 @@ class NSP32:
 
 		"""
 
-		# sum all bytes
-		s = sum(buf[0 : len])
+		# sum all bytes (through a memoryview, so the buffer is not copied)
+		s = sum(memoryview(buf)[0 : len])
 		
 		# take two's complement, and append the checksum to the end
 		buf[len] = ((~s) + 1) & 0xFF
@@ -726,9 +788,9 @@ class NSP32:
 
 		"""
 
-		# sum all bytes (including the checksum byte)
+		# sum all bytes (including the checksum byte) through a memoryview, so the buffer is not copied
 		# if the summation equals 0, the checksum is valid
-		return (sum(buf[0 : len]) & 0xFF) == 0
+		return (sum(memoryview(buf)[0 : len]) & 0xFF) == 0
 
 	def ClearReturnPacket(self):
 		"""clear return package"""
@@ -745,15 +807,23 @@ class NSP32:
 
 		return self._retPacketSize
 	
-	def GetReturnPacket(self):
+	def GetReturnPacket(self, copyBytes = True):
 		"""get the return packet
 		
+		Args:
+			copyBytes(bool): True to copy the packet bytes; False to return a view over the return packet buffer,
+				which is overwritten by the next command (copy what you keep, e.g. with SpectrumInfo.CopySpectrum())
+
 		Returns:
 			ReturnPacket: return packet (return None if the return packet is not yet available or is cleared)
 
 		"""
 
-		return None if self._retPacketSize <= 0 else ReturnPacket(self._retBuf[2], self._retBuf[3], True, self._retBuf[0 : self._retPacketSize])
+		if self._retPacketSize <= 0 :
+			return None
+
+		packetBytes = self._retBuf[0 : self._retPacketSize] if copyBytes else memoryview(self._retBuf)[0 : self._retPacketSize]
+		return ReturnPacket(self._retBuf[2], self._retBuf[3], True, packetBytes)
 
 
 class _RPiAdaptor:
@@ -915,6 +985,39 @@ class _RPiAdaptor:
 
 		return self._serialControl.read()[0]
 	
+	def UartClearInput(self):
+		"""discard all bytes waiting in the UART receive buffer (only used when data channel is UART)"""
+
+		self._serialControl.reset_input_buffer()
+
+	def UartReadInto(self, buf, timeoutMs):
+		"""read from UART until the buffer is full or the timeout expires (only used when data channel is UART)
+
+		Args:
+			buf(memoryview): writable buffer to fill
+
+			timeoutMs(float): max. milliseconds to wait for the whole buffer
+
+		Returns:
+			int: num of bytes read (less than len(buf) on timeout)
+
+		"""
+
+		deadline = time.time() + timeoutMs * 0.001
+		readIdx = 0
+
+		while readIdx < len(buf) :
+			remaining = deadline - time.time()
+
+			if remaining <= 0 :
+				break
+
+			# block in the driver for the rest of the packet instead of polling byte by byte
+			self._serialControl.timeout = remaining
+			readIdx += self._serialControl.readinto(buf[readIdx :]) or 0
+
+		return readIdx
+
 	def UartSend(self, buf):
 		"""send through UART (only used when data channel is UART)
 
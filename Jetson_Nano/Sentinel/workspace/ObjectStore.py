@@ -0,0 +1,162 @@
+# Persistent map of the objects Scan_Demo has found, kept in a SQLite file so
+# it survives between runs. Objects are keyed by the pan-tilt position they were
+# found at; a detection within match_radius of a known object is the same object
+# seen again, so its spectrum is appended to that object's time series instead
+# of creating a duplicate.
+# Matching uses a grid hash with cells match_radius wide held in memory, so a
+# lookup only has to check the 3x3 cells around the detection no matter how many
+# objects the map holds.
+
+import sqlite3
+import threading
+import time
+import numpy as np
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS objects (
+    id INTEGER PRIMARY KEY,
+    vert REAL NOT NULL,
+    horz REAL NOT NULL,
+    label TEXT,
+    sightings INTEGER NOT NULL DEFAULT 1,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    image TEXT
+);
+CREATE TABLE IF NOT EXISTS spectra (
+    id INTEGER PRIMARY KEY,
+    object_id INTEGER NOT NULL REFERENCES objects(id),
+    timestamp REAL NOT NULL,
+    integration_time INTEGER,
+    spectrum BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS spectra_object ON spectra(object_id, timestamp);
+CREATE TABLE IF NOT EXISTS info (
+    key TEXT PRIMARY KEY,
+    value BLOB
+);
+'''
+
+
+class ObjectStore:
+
+    def __init__(self, path, match_radius=0.03):
+        # path: SQLite file, created if it does not exist
+        # match_radius: largest pan-tilt distance (position units, per axis)
+        #   between two detections of the same object
+        self.path = path
+        self.match_radius = match_radius
+        # the scan engine saves detections from its spectrum thread
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+        self._grid = {} # (row, col) -> set of object ids
+        self._positions = {} # object id -> (vert, horz)
+        for object_id, vert, horz in self._db.execute('SELECT id, vert, horz FROM objects'):
+            self._Index(object_id, vert, horz)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def Close(self):
+        with self._lock:
+            self._db.close()
+
+    #--- spatial index ---#
+    def _Key(self, vert, horz):
+        return (int(vert // self.match_radius), int(horz // self.match_radius))
+
+    def _Index(self, object_id, vert, horz):
+        self._grid.setdefault(self._Key(vert, horz), set()).add(object_id)
+        self._positions[object_id] = (vert, horz)
+
+    def _Unindex(self, object_id):
+        vert, horz = self._positions.pop(object_id)
+        bucket = self._grid[self._Key(vert, horz)]
+        bucket.discard(object_id)
+        if not bucket:
+            del self._grid[self._Key(vert, horz)]
+
+    def Match(self, vert, horz):
+        # id of the closest known object within match_radius, None if there is none
+        row, col = self._Key(vert, horz)
+        best, best_dist = None, None
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                for object_id in self._grid.get((row + dr, col + dc), ()):
+                    v, h = self._positions[object_id]
+                    dist = max(abs(v - vert), abs(h - horz))
+                    if dist <= self.match_radius and (best_dist is None or dist < best_dist):
+                        best, best_dist = object_id, dist
+        return best
+
+    #--- detections ---#
+    def Add_Detection(self, vert, horz, spectrum, integration_time=None, image=None, label=None, timestamp=None):
+        # Store a detection, returns (object id, True if it is a new object).
+        # The position of a known object is refined to the mean of its sightings.
+        if timestamp is None:
+            timestamp = time.time()
+        blob = np.ascontiguousarray(spectrum, dtype=np.float32).tobytes()
+        with self._lock:
+            object_id = self.Match(vert, horz)
+            is_new = object_id is None
+            if is_new:
+                cursor = self._db.execute(
+                    'INSERT INTO objects (vert, horz, label, first_seen, last_seen, image) VALUES (?, ?, ?, ?, ?, ?)',
+                    (vert, horz, label, timestamp, timestamp, image))
+                object_id = cursor.lastrowid
+            else:
+                old_vert, old_horz, sightings = self._db.execute(
+                    'SELECT vert, horz, sightings FROM objects WHERE id = ?', (object_id,)).fetchone()
+                vert = (old_vert * sightings + vert) / (sightings + 1)
+                horz = (old_horz * sightings + horz) / (sightings + 1)
+                self._db.execute(
+                    'UPDATE objects SET vert = ?, horz = ?, sightings = ?, last_seen = ?, '
+                    'image = COALESCE(?, image), label = COALESCE(?, label) WHERE id = ?',
+                    (vert, horz, sightings + 1, timestamp, image, label, object_id))
+                self._Unindex(object_id)
+            self._Index(object_id, vert, horz)
+            self._db.execute(
+                'INSERT INTO spectra (object_id, timestamp, integration_time, spectrum) VALUES (?, ?, ?, ?)',
+                (object_id, timestamp, integration_time, blob))
+            self._db.commit()
+        return object_id, is_new
+
+    def Objects(self):
+        # list of (id, vert, horz, label, sightings, first_seen, last_seen, image)
+        with self._lock:
+            return self._db.execute(
+                'SELECT id, vert, horz, label, sightings, first_seen, last_seen, image FROM objects ORDER BY id').fetchall()
+
+    def Image(self, object_id):
+        with self._lock:
+            row = self._db.execute('SELECT image FROM objects WHERE id = ?', (object_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def Spectra(self, object_id):
+        # spectrum time series of an object: (timestamps, integration times, spectra [T, N])
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT timestamp, integration_time, spectrum FROM spectra WHERE object_id = ? ORDER BY timestamp',
+                (object_id,)).fetchall()
+        if not rows:
+            return np.empty(0), np.empty(0), np.empty((0, 0), dtype=np.float32)
+        timestamps = np.array([row[0] for row in rows])
+        integration_times = np.array([row[1] if row[1] is not None else 0 for row in rows])
+        spectra = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        return timestamps, integration_times, spectra
+
+    #--- wavelengths ---#
+    def Set_Wavelengths(self, wavelengths):
+        # wavelengths the stored spectra are sampled at (same for every spectrum of one sensor)
+        blob = np.ascontiguousarray(wavelengths, dtype=np.float32).tobytes()
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)', ('wavelengths', blob))
+            self._db.commit()
+
+    def Wavelengths(self):
+        with self._lock:
+            row = self._db.execute('SELECT value FROM info WHERE key = ?', ('wavelengths',)).fetchone()
+        return None if row is None else np.frombuffer(row[0], dtype=np.float32)
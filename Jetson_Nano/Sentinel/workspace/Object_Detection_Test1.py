@@ -4,10 +4,10 @@ import object_detection
 from object_detection.utils import label_map_util
 from object_detection.utils import visualization_utils as vis_util
 import numpy as np
-import tensorflow as tf
+import Detector
 import time
+from Pi_Camera import FrameGrabber
 
-print(tf.__version__)
 def gstreamer_pipeline(
     capture_width = 600,
     capture_height=600,
@@ -61,36 +61,13 @@ label_map = label_map_util.load_labelmap(LABEL_FILENAME)
 categories = label_map_util.convert_label_map_to_categories(label_map,max_num_classes=NUM_CLASSES,use_display_name = True)
 category_index = label_map_util.create_category_index(categories)
 
-config = tf.ConfigProto()
-config.gpu_options.allow_growth = True
+# the same outputs whichever backend runs the model, see Detector
+detector = Detector.Load_Detector(MODEL_FILENAME)
+print('Loaded %s model in %.1f s' % (detector.backend, detector.load_time))
 
-
-detection_graph = tf.Graph()
-with detection_graph.as_default():
-    od_graph_def = tf.GraphDef()
-    with tf.gfile.GFile(MODEL_FILENAME,'rb') as fid:
-        serialized_graph = fid.read()
-        od_graph_def.ParseFromString(serialized_graph)
-        tf.import_graph_def(od_graph_def, name='')
-    
-    sess = tf.Session(graph=detection_graph, config=config)
-
-# Input tensor is the image
-image_tensor = detection_graph.get_tensor_by_name('image_tensor:0')
-
-# Output tensors are the detection boxes, scores, and classes
-# Each box represents a part of the image where a particular object was detected
-detection_boxes = detection_graph.get_tensor_by_name('detection_boxes:0')
-
-# Each score represents level of confidence for each of the objects.
-# The score is shown on the result image, together with the class label.
-detection_scores = detection_graph.get_tensor_by_name('detection_scores:0')
-detection_classes = detection_graph.get_tensor_by_name('detection_classes:0')
-
-# Number of objects detected
-num_detections = detection_graph.get_tensor_by_name('num_detections:0')
-
-cap = cv2.VideoCapture(gstreamer_pipeline(), cv2.CAP_GSTREAMER)
+# grabbed on a background thread, read() returns the newest frame instead of
+# one that queued up during inference
+cap = FrameGrabber(gstreamer_pipeline())
 dur = []
 k = 1
 while cap.isOpened():
@@ -100,9 +77,7 @@ while cap.isOpened():
     frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     frame_expanded = np.expand_dims(frame_rgb,axis=0)
     start_time = time.time()
-    (boxes, scores, classes, num) = sess.run(
-         [detection_boxes, detection_scores, detection_classes, num_detections],
-         feed_dict={image_tensor: frame_expanded})
+    (boxes, scores, classes, num) = detector.Detect(frame_expanded)
     end_time = time.time()
     if k == 0:
         dur.append(end_time-start_time)
@@ -110,7 +85,7 @@ while cap.isOpened():
         print("standard deviation: ", np.std(dur)/np.sqrt(len(dur)))
         print("N: ", len(dur))
     k = 0
-    vis_util.visualize_boxes_and_labels_on_image_array(
+    vis_util.visualize_boxes_and_labels_on_image_array_cv2(
         frame,
         np.squeeze(boxes),
         np.squeeze(classes).astype(np.int32),
@@ -118,7 +93,8 @@ while cap.isOpened():
         category_index,
         use_normalized_coordinates=True,
         line_thickness=8,
-        min_score_thresh=0.85)
+        min_score_thresh=0.85,
+        bgr=True)
     cv2.imshow("Object Detect", frame)
     keyCode = cv2.waitKey(5) &  0xFFF
     if keyCode == 27:
@@ -4,19 +4,117 @@
 # the servo motors using PWM on the Jetson Nano
 
 import Jetson.GPIO as GPIO
+import json
+import math
+import time
 # PWM_MAX = 10
 # PWM_MIN = 2.5
 # DC_STEP = 0.025
+SERVO_PERIOD = 0.02 # the servos pick up a new duty cycle once per 50 Hz PWM period
+
+
+class Settle_Model:
+    # Time the mount needs to stop shaking after a move, modelled as
+    # base + per_unit * distance where distance is the larger of the two axis
+    # moves in position units (both servos move at the same time). The defaults
+    # are conservative, Calibrate_Settle fits them to the actual mount.
+
+    def __init__(self, base=0.05, per_unit=0.4, min_time=0.0, max_time=0.5):
+        self.base = base
+        self.per_unit = per_unit
+        self.min_time = min_time
+        self.max_time = max_time
+
+    def Settle_Time(self, distance):
+        if distance <= 0:
+            return 0.0
+        return min(self.max_time, max(self.min_time, self.base + self.per_unit * distance))
+
+    def Fit(self, distances, times):
+        # least squares line through the measured (distance, settle time) pairs
+        n = len(distances)
+        if n < 2:
+            return self
+        mean_d = sum(distances) / n
+        mean_t = sum(times) / n
+        var_d = sum((d - mean_d) ** 2 for d in distances)
+        if var_d == 0:
+            self.base, self.per_unit = mean_t, 0.0
+            return self
+        cov = sum((d - mean_d) * (t - mean_t) for d, t in zip(distances, times))
+        self.per_unit = max(0.0, cov / var_d)
+        self.base = max(0.0, mean_t - self.per_unit * mean_d)
+        # never settle for less than the slowest measured move needed
+        self.max_time = max(self.max_time, max(times))
+        return self
+
+    def Save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.__dict__, f)
+
+    @classmethod
+    def Load(cls, path):
+        with open(path) as f:
+            return cls(**json.load(f))
+
+
+class Pixel_Model:
+    # Duty cycle change that moves the view by one pixel, for each axis, at a
+    # frame size of width x height. The signs are such that adding
+    # per_px * (target - center) to an axis brings a target at that pixel
+    # offset to the center. From_FOV gives a rough model from the Pi Camera V2
+    # field of view and a 180 degree servo, Calibrate_Pixels measures it.
+
+    def __init__(self, horz_per_px, vert_per_px, width, height):
+        self.horz_per_px = horz_per_px
+        self.vert_per_px = vert_per_px
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def From_FOV(cls, width, height, hfov=62.2, vfov=48.8, deg_per_dc=18.0):
+        # a target right of center needs a lower horizontal duty cycle, one
+        # below center a higher vertical one (as Facial_Tracking steered)
+        return cls(-hfov/width/deg_per_dc, vfov/height/deg_per_dc, width, height)
+
+    def Correction(self, dx, dy, width, height):
+        # (vertical, horizontal) duty cycle change centering a target dx, dy px
+        # off center in a width x height frame
+        return (dy*self.vert_per_px*self.height/height, dx*self.horz_per_px*self.width/width)
+
+    def Fit(self, horz_dc, horz_px, vert_dc, vert_px):
+        # least squares gains through the origin from duty cycle steps and the
+        # pixel offsets they center, an axis without measurements keeps its gain
+        if horz_px and any(horz_px):
+            self.horz_per_px = sum(d*p for d, p in zip(horz_dc, horz_px))/sum(p*p for p in horz_px)
+        if vert_px and any(vert_px):
+            self.vert_per_px = sum(d*p for d, p in zip(vert_dc, vert_px))/sum(p*p for p in vert_px)
+        return self
+
+    def Save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.__dict__, f)
+
+    @classmethod
+    def Load(cls, path):
+        with open(path) as f:
+            return cls(**json.load(f))
+
 
 class PT_Mount:
     
-    def __init__(self, vert_start = 0.5, horz_start = 0.5, PWM_MAX = 12, PWM_MIN = 3, DC_STEP = 0.25):
+    def __init__(self, vert_start = 0.5, horz_start = 0.5, PWM_MAX = 12, PWM_MIN = 3, DC_STEP = 0.25,
+                 DC_RATE = 25, settle_model = None):
         # vert_start and horz_start are in 
         # Define class constants
         self.PWM_MAX = PWM_MAX
         self.PWM_MIN = PWM_MIN
         self.DC_STEP = DC_STEP
         self.PWM_RANGE = PWM_MAX-PWM_MIN
+        # fastest duty cycle change (per second) RAMP2D drives the servos with,
+        # jumping straight to the target makes the mount overshoot and ring
+        self.DC_RATE = DC_RATE
+        self.settle_model = settle_model if settle_model is not None else Settle_Model()
 
         # set up GPIO
         GPIO.setmode(GPIO.BOARD)
@@ -72,4 +170,284 @@ class PT_Mount:
         self.pwm_vert.ChangeDutyCycle(self.vert_dc)
         self.pwm_horz.ChangeDutyCycle(self.horz_dc)
         self.vert_pos = vert_position
-        self.horz_pos = horz_position
\ No newline at end of file
+        self.horz_pos = horz_position
+
+    def Distance(self, vert_position, horz_position):
+        # how far a move from the current position is, in position units
+        return max(abs(vert_position-self.vert_pos), abs(horz_position-self.horz_pos))
+
+    def RAMP2D(self, vert_position, horz_position):
+        # same as MOVE2D but the duty cycles are stepped towards the target at
+        # DC_RATE so the mount does not overshoot, returns the distance moved
+        if vert_position<0 or vert_position>1:
+            print('Vertical position must be between 0 and 1')
+            return -1
+        if horz_position<0 or horz_position>1:
+            print('Horizontal position must be between 0 and 1')
+            return -1
+        distance = self.Distance(vert_position, horz_position)
+        vert_target = self.PWM_MIN+vert_position*self.PWM_RANGE
+        horz_target = self.PWM_MIN+horz_position*self.PWM_RANGE
+        vert_start = self.vert_dc
+        horz_start = self.horz_dc
+        max_change = self.DC_RATE*SERVO_PERIOD
+        steps = max(1, int(math.ceil(max(abs(vert_target-vert_start), abs(horz_target-horz_start))/max_change)))
+        for i in range(1, steps+1):
+            self.vert_dc = vert_start+(vert_target-vert_start)*i/steps
+            self.horz_dc = horz_start+(horz_target-horz_start)*i/steps
+            self.pwm_vert.ChangeDutyCycle(self.vert_dc)
+            self.pwm_horz.ChangeDutyCycle(self.horz_dc)
+            if i < steps:
+                time.sleep(SERVO_PERIOD)
+        self.vert_pos = vert_position
+        self.horz_pos = horz_position
+        return distance
+
+    def MOVE_SETTLED(self, vert_position, horz_position):
+        # ramp to the position and wait only as long as the settle model says
+        # this move needs, returns the time spent
+        start = time.time()
+        distance = self.RAMP2D(vert_position, horz_position)
+        if distance < 0:
+            return -1
+        time.sleep(self.settle_model.Settle_Time(distance))
+        return time.time()-start
+
+    def NUDGE2D(self, vert_change, horz_change):
+        # change the duty cycles right away, clipped to the PWM range, returns
+        # the (vertical, horizontal) change actually made
+        vert_dc = min(self.PWM_MAX, max(self.PWM_MIN, self.vert_dc+vert_change))
+        horz_dc = min(self.PWM_MAX, max(self.PWM_MIN, self.horz_dc+horz_change))
+        vert_change, horz_change = vert_dc-self.vert_dc, horz_dc-self.horz_dc
+        if vert_change:
+            self.vert_dc = vert_dc
+            self.vert_pos = (vert_dc-self.PWM_MIN)/self.PWM_RANGE
+            self.pwm_vert.ChangeDutyCycle(vert_dc)
+        if horz_change:
+            self.horz_dc = horz_dc
+            self.horz_pos = (horz_dc-self.PWM_MIN)/self.PWM_RANGE
+            self.pwm_horz.ChangeDutyCycle(horz_dc)
+        return vert_change, horz_change
+
+
+def Move_Time(mount, distance):
+    # estimated ramp plus settle time of a move of the given distance
+    ramp = distance*mount.PWM_RANGE/mount.DC_RATE
+    return ramp + mount.settle_model.Settle_Time(distance)
+
+
+def Path_Time(mount, cells, start):
+    total = 0.0
+    position = start
+    for cell in cells:
+        total += Move_Time(mount, max(abs(cell[0]-position[0]), abs(cell[1]-position[1])))
+        position = cell
+    return total
+
+
+PLAN_MAX_CELLS = 100 # most cells 'auto' runs the O(n^2) per pass 2-opt on
+
+
+def Plan_Visits(mount, cells, start=None, order='auto'):
+    # Order a list of (vert_pos, horz_pos) cells for visiting.
+    #   serpentine: column by column, alternating up and down
+    #   nearest: greedy nearest neighbour followed by 2-opt clean up
+    #   auto: serpentine for complete rectangular grids (it is already as
+    #       short as nearest there) and for more than PLAN_MAX_CELLS cells,
+    #       otherwise whichever of the two has the shorter estimated move time
+    cells = list(cells)
+    if start is None:
+        start = (mount.vert_pos, mount.horz_pos)
+    if order == 'serpentine':
+        return _Serpentine(cells)
+    if order == 'nearest':
+        return _Nearest(mount, cells, start)
+    serpentine = _Serpentine(cells)
+    if len(cells) > PLAN_MAX_CELLS or _Is_Full_Grid(cells):
+        return serpentine
+    nearest = _Nearest(mount, cells, start)
+    if Path_Time(mount, nearest, start) < Path_Time(mount, serpentine, start):
+        return nearest
+    return serpentine
+
+
+def _Is_Full_Grid(cells):
+    # every column holds the same rows, as the cells of Raster_Cells do
+    verts = set(round(cell[0], 6) for cell in cells)
+    horzs = set(round(cell[1], 6) for cell in cells)
+    return len(set((round(v, 6), round(h, 6)) for v, h in cells)) == len(verts) * len(horzs)
+
+
+def _Serpentine(cells):
+    columns = {}
+    for cell in cells:
+        columns.setdefault(round(cell[1], 6), []).append(cell)
+    ordered = []
+    for i, horz in enumerate(sorted(columns)):
+        ordered.extend(sorted(columns[horz], reverse=(i % 2 == 1)))
+    return ordered
+
+
+def _Nearest(mount, cells, start):
+    def cost(a, b):
+        return Move_Time(mount, max(abs(a[0]-b[0]), abs(a[1]-b[1])))
+    remaining = list(cells)
+    path = []
+    position = start
+    while remaining:
+        nearest = min(remaining, key=lambda cell: cost(position, cell))
+        remaining.remove(nearest)
+        path.append(nearest)
+        position = nearest
+    # 2-opt: reverse segments of the path while that makes it cheaper
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(path)-1):
+            before = path[i-1] if i > 0 else start
+            for j in range(i+1, len(path)):
+                after = path[j+1] if j+1 < len(path) else None
+                old = cost(before, path[i]) + (cost(path[j], after) if after is not None else 0)
+                new = cost(before, path[j]) + (cost(path[i], after) if after is not None else 0)
+                if new < old - 1e-9:
+                    path[i:j+1] = path[i:j+1][::-1]
+                    improved = True
+    return path
+
+
+def Calibrate_Settle(mount, is_still, distances=(0.05, 0.1, 0.2, 0.4), repeats=2, timeout=1.0):
+    # Measure how long the mount takes to settle after horizontal moves of the
+    # given distances and fit mount.settle_model to the results. is_still() is
+    # polled after each move and should return True once the camera image has
+    # stopped moving.
+    measured_d = []
+    measured_t = []
+    for distance in distances:
+        for r in range(repeats):
+            mount.RAMP2D(mount.vert_pos, 0.5-distance/2)
+            time.sleep(timeout)
+            mount.RAMP2D(mount.vert_pos, 0.5+distance/2)
+            start = time.time()
+            while not is_still() and time.time()-start < timeout:
+                pass
+            measured_d.append(distance)
+            measured_t.append(time.time()-start)
+    mount.settle_model.Fit(measured_d, measured_t)
+    return mount.settle_model
+
+
+class PID:
+    # textbook PID on one axis, the integral is clamped to i_limit against wind up
+
+    def __init__(self, kp, ki=0.0, kd=0.0, i_limit=None):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.i_limit = i_limit
+        self.Reset()
+
+    def Reset(self):
+        self.integral = 0.0
+        self.last_error = None
+
+    def Update(self, error, dt):
+        self.integral += error*dt
+        if self.i_limit is not None:
+            self.integral = min(self.i_limit, max(-self.i_limit, self.integral))
+        derivative = 0.0
+        if self.last_error is not None and dt > 0:
+            derivative = (error-self.last_error)/dt
+        self.last_error = error
+        return self.kp*error + self.ki*self.integral + self.kd*derivative
+
+
+class Center_Controller:
+    # Closed loop centering of a target seen by the camera, replacing the
+    # fixed DC_STEP nudges. The pixel offset of the target goes through the
+    # pixel model into the duty cycle error of each axis, a PID per axis turns
+    # that into a duty cycle change and the change is limited to max_rate
+    # (duty cycle per second) so the mount does not ring. The frame a target is
+    # found in was taken before the last latency_frames changes took effect,
+    # those changes are taken off the error so they are not made twice, which
+    # lets kp stay near 1 and center a target in a few frames.
+
+    def __init__(self, mount, pixel_model, kp=0.8, ki=0.0, kd=0.0, max_rate=None, dead_band=2, latency_frames=1):
+        self.mount = mount
+        self.pixel_model = pixel_model
+        self.max_rate = max_rate if max_rate is not None else mount.DC_RATE
+        self.dead_band = dead_band # pixels off center that count as centered
+        self.vert = PID(kp, ki, kd, i_limit=1.0)
+        self.horz = PID(kp, ki, kd, i_limit=1.0)
+        self.latency_frames = latency_frames
+        self.Reset()
+
+    def Reset(self):
+        self.vert.Reset()
+        self.horz.Reset()
+        self.last_time = None
+        self.pending = []
+
+    def Update(self, x, y, width, height):
+        # one control step for a target at pixel (x, y) of a width x height
+        # frame, returns its (dx, dy) offset from the center
+        now = time.time()
+        # time since the last frame, one frame at 30 fps for the first one
+        dt = now-self.last_time if self.last_time is not None else 1/30.0
+        dt = min(dt, 0.5)
+        self.last_time = now
+        dx, dy = x-width/2.0, y-height/2.0
+        if abs(dx) <= self.dead_band:
+            dx = 0.0
+        if abs(dy) <= self.dead_band:
+            dy = 0.0
+        vert_error, horz_error = self.pixel_model.Correction(dx, dy, width, height)
+        vert_error -= sum(change[0] for change in self.pending)
+        horz_error -= sum(change[1] for change in self.pending)
+        max_change = self.max_rate*max(dt, SERVO_PERIOD)
+        vert_change = min(max_change, max(-max_change, self.vert.Update(vert_error, dt)))
+        horz_change = min(max_change, max(-max_change, self.horz.Update(horz_error, dt)))
+        if self.latency_frames:
+            self.pending = (self.pending + [self.mount.NUDGE2D(vert_change, horz_change)])[-self.latency_frames:]
+        else:
+            self.mount.NUDGE2D(vert_change, horz_change)
+        return dx, dy
+
+    def Center(self, locate, width, height, tolerance=10, max_frames=15):
+        # Step until the target is within tolerance px of the center.
+        # locate() returns the target's pixel (x, y) in a new frame, None when
+        # it is not in view. Returns True when the target got centered.
+        self.Reset()
+        for i in range(max_frames):
+            target = locate()
+            if target is None:
+                return False
+            if abs(target[0]-width/2.0) <= tolerance and abs(target[1]-height/2.0) <= tolerance:
+                return True
+            self.Update(target[0], target[1], width, height)
+        return False
+
+
+def Calibrate_Pixels(mount, grab, shift, dc_steps=(0.1, 0.2), pixel_model=None):
+    # Fit a Pixel_Model by stepping each axis by the given duty cycles and
+    # measuring how far the image moves. grab() returns a frame once the mount
+    # is still, shift(before, after) the (dx, dy) pixels the image content
+    # moved between two frames (phase correlation for example).
+    measured = {'horz': ([], []), 'vert': ([], [])}
+    width = height = None
+    for step in dc_steps:
+        for axis in ('horz', 'vert'):
+            for sign in (1, -1):
+                before = grab()
+                height, width = before.shape[:2]
+                vert_change, horz_change = mount.NUDGE2D(sign*step if axis == 'vert' else 0,
+                                                         sign*step if axis == 'horz' else 0)
+                time.sleep(mount.settle_model.Settle_Time(abs(sign*step)/mount.PWM_RANGE))
+                dx, dy = shift(before, grab())
+                # content moving by d px centers a target that was -d px off center
+                dcs, pixels = measured[axis]
+                dcs.append(horz_change if axis == 'horz' else vert_change)
+                pixels.append(-dx if axis == 'horz' else -dy)
+    if pixel_model is None:
+        pixel_model = Pixel_Model.From_FOV(width, height)
+    pixel_model.width, pixel_model.height = width, height
+    return pixel_model.Fit(measured['horz'][0], measured['horz'][1], measured['vert'][0], measured['vert'][1])
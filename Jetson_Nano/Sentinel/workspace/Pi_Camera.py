@@ -1,5 +1,15 @@
 # include file for ease of use with the raspberry pi camv2
 import cv2
+import threading
+import time
+import numpy as np
+try:
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst
+except (ImportError, ValueError):
+    # only GstCapture needs the GStreamer bindings (python3-gi on the Nano)
+    Gst = None
 def gstreamer_pipeline(
     capture_width = 3280,
     capture_height=2464,
@@ -28,6 +38,221 @@ def gstreamer_pipeline(
     )
 
 
+def inference_pipeline(
+    capture_width=1200,
+    capture_height=1200,
+    model_width=300,
+    model_height=300,
+    framerate=21,
+    flip_method=0,
+    still=True,
+):
+    # Pipeline for GstCapture. The frames branch is scaled by the hardware
+    # converter straight to the model resolution and handed out as RGB, so it
+    # is inference ready. The still branch encodes full resolution JPEGs with
+    # the hardware encoder, its valve only lets a frame through when a still
+    # is asked for.
+    pipeline = (
+        "nvarguscamerasrc ! "
+        "video/x-raw(memory:NVMM), "
+        "width=(int)%d, height=(int)%d, "
+        "format=(string)NV12, framerate=(fraction)%d/1 ! "
+        "nvvidconv flip-method=%d ! "
+        "video/x-raw(memory:NVMM), format=(string)NV12 ! tee name=t "
+        "t. ! queue max-size-buffers=1 leaky=downstream ! nvvidconv ! "
+        "video/x-raw, width=(int)%d, height=(int)%d, format=(string)RGBA ! "
+        "videoconvert ! video/x-raw, format=(string)RGB ! "
+        "appsink name=frames max-buffers=1 drop=true sync=false "
+        % (
+            capture_width,
+            capture_height,
+            framerate,
+            flip_method,
+            model_width,
+            model_height,
+        )
+    )
+    if still:
+        pipeline += (
+            "t. ! queue max-size-buffers=1 leaky=downstream ! "
+            "valve name=still_valve drop=true ! nvjpegenc ! "
+            "appsink name=still max-buffers=1 drop=true sync=false"
+        )
+    return pipeline
+
+
+class GstCapture:
+    # Stand-in for cv2.VideoCapture on an inference_pipeline. OpenCV only hands
+    # out BGR and copies every frame into a new array; this copies each frame
+    # once, straight from the GStreamer buffer into the array retrieve is given.
+    # still() returns a full resolution JPEG from the still branch.
+
+    def __init__(self, pipeline=None, width=300, height=300, channels=3):
+        if Gst is None:
+            raise ImportError('GstCapture needs the GStreamer python bindings (python3-gi)')
+        Gst.init(None)
+        self.shape = (height, width, channels)
+        self.pipeline = Gst.parse_launch(pipeline if pipeline is not None else inference_pipeline(model_width=width, model_height=height))
+        self._frames = self.pipeline.get_by_name('frames')
+        self._still = self.pipeline.get_by_name('still')
+        self._valve = self.pipeline.get_by_name('still_valve')
+        self._sample = None
+        self._opened = self.pipeline.set_state(Gst.State.PLAYING) != Gst.StateChangeReturn.FAILURE
+
+    def isOpened(self):
+        return self._opened
+
+    def grab(self):
+        # blocks until the next frame, returns False once the pipeline stopped
+        self._sample = self._frames.emit('pull-sample')
+        if self._sample is None:
+            self._opened = False
+        return self._sample is not None
+
+    def retrieve(self, image=None):
+        if self._sample is None:
+            return False, image
+        if image is None or image.shape != self.shape:
+            image = np.empty(self.shape, dtype=np.uint8)
+        buf = self._sample.get_buffer()
+        ok, info = buf.map(Gst.MapFlags.READ)
+        if not ok:
+            return False, image
+        try:
+            # rows can be padded to a 4 byte stride
+            rows = self.shape[0]
+            stride = info.size // rows
+            data = np.frombuffer(info.data, dtype=np.uint8, count=stride * rows).reshape(rows, stride)
+            np.copyto(image.reshape(rows, -1), data[:, :self.shape[1] * self.shape[2]])
+        finally:
+            buf.unmap(info)
+        return True, image
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def still(self, timeout=1.0):
+        # full resolution JPEG (bytes) of the next frame, None on timeout or
+        # when the pipeline has no still branch
+        if self._still is None:
+            return None
+        # drop a still that made it through after the valve was last closed
+        while self._still.emit('try-pull-sample', 0) is not None:
+            pass
+        self._valve.set_property('drop', False)
+        try:
+            sample = self._still.emit('try-pull-sample', int(timeout * Gst.SECOND))
+        finally:
+            self._valve.set_property('drop', True)
+        if sample is None:
+            return None
+        buf = sample.get_buffer()
+        return buf.extract_dup(0, buf.get_size())
+
+    def release(self):
+        self.pipeline.set_state(Gst.State.NULL)
+        self._opened = False
+
+
+class FrameGrabber:
+    # Reads the camera on a background thread so the appsink never backs up.
+    # Reading the capture directly after a slow step (inference, a servo move)
+    # returns frames that sat in the pipeline while the step ran, the grabber
+    # always has the newest one instead. Frames are retrieved into two
+    # preallocated buffers: the thread fills the back buffer and swaps it to the
+    # front when it is complete, readers copy out of the front buffer.
+    # Works as a drop in replacement for cv2.VideoCapture: isOpened(), read()
+    # and release().
+
+    def __init__(self, pipeline=None, cap=None):
+        if cap is None:
+            cap = cv2.VideoCapture(pipeline if pipeline is not None else gstreamer_pipeline(), cv2.CAP_GSTREAMER)
+        self.cap = cap
+        self._buffers = [None, None]
+        self._front = 0
+        self._timestamp = 0.0 # time the front frame was delivered
+        self._last_read = 0.0 # timestamp of the last frame read() returned
+        self._running = cap.isOpened()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._Run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _Run(self):
+        while self._running:
+            back = 1 - self._front
+            if not self.cap.grab():
+                break
+            timestamp = time.time()
+            ret, frame = self.cap.retrieve(self._buffers[back])
+            if not ret:
+                break
+            # retrieve only reuses the buffer when the frame size matches it
+            self._buffers[back] = frame
+            with self._cond:
+                self._front = back
+                self._timestamp = timestamp
+                self._cond.notify_all()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def isOpened(self):
+        return self._running
+
+    def _Copy(self, out):
+        frame = self._buffers[self._front]
+        if out is None:
+            return frame.copy()
+        np.copyto(out, frame)
+        return out
+
+    def latest(self, out=None):
+        # (frame, timestamp) of the newest frame, (None, 0) before the first one.
+        # The frame is copied into out when it is given, a new array otherwise
+        with self._cond:
+            if self._buffers[self._front] is None:
+                return None, 0.0
+            return self._Copy(out), self._timestamp
+
+    def wait_newer_than(self, timestamp, timeout=None, out=None):
+        # (frame, timestamp) of the first frame delivered after timestamp,
+        # (None, 0) on timeout or when the camera stopped
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._timestamp <= timestamp:
+                if not self._running:
+                    return None, 0.0
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None, 0.0
+                self._cond.wait(remaining)
+            return self._Copy(out), self._timestamp
+
+    def read(self):
+        # like cv2.VideoCapture.read() but returns the newest frame, never one
+        # that was already returned
+        frame, timestamp = self.wait_newer_than(self._last_read)
+        if frame is None:
+            return False, None
+        self._last_read = timestamp
+        return True, frame
+
+    def still(self, timeout=1.0):
+        # full resolution JPEG when the capture has a still branch (GstCapture), None otherwise
+        if not hasattr(self.cap, 'still'):
+            return None
+        return self.cap.still(timeout)
+
+    def release(self):
+        self._running = False
+        self._thread.join()
+        self.cap.release()
+
+
 def init(Win_Name):
-    cap = cv2.VideoCapture(gstreamer_pipeline(),cv2.CAP_GSTREAMER)
-    cv2.namedWindow(Win_Name, cv2.WINDOW_AUTOSIZE)
\ No newline at end of file
+    cap = FrameGrabber(gstreamer_pipeline())
+    cv2.namedWindow(Win_Name, cv2.WINDOW_AUTOSIZE)
+    return cap
@@ -0,0 +1,255 @@
+# Append-only archive of Scan_Demo results. Every detection of every scan is
+# one row; each column lives in its own flat binary file so a column can be
+# memory mapped and read in one go:
+#
+#   archive/
+#     header.json          format version, spectrum length, wavelengths
+#     sessions.json        names of the scans, a row's session column indexes this list
+#     timestamp.bin        float64
+#     session.bin          int32
+#     object_id.bin        int32 (ObjectStore id, -1 if unknown)
+#     vert.bin, horz.bin   float32 pan-tilt position
+#     score.bin            float32 detection score
+#     integration_time.bin int32
+#     image_offset.bin     int64 offset of the JPEG in images.bin
+#     image_size.bin       int32 (0 if no image)
+#     spectrum.bin         float32 [rows, num_points]
+#     images.bin           JPEG blobs back to back
+#
+# Rows are only ever appended and spectrum.bin is written last, so the number of
+# complete rows is the length of spectrum.bin; anything past that in the other
+# files is a torn append and is cut off when the archive is opened.
+# Usage:
+#   python ScanArchive.py <archive dir> <old scan dir> [<old scan dir> ...]
+# imports scans saved in the old one csv/jpg per detection format.
+
+import json
+import os
+import sys
+import time
+import numpy as np
+
+FORMAT_VERSION = 1
+COLUMNS = [
+    ('timestamp', '<f8'),
+    ('session', '<i4'),
+    ('object_id', '<i4'),
+    ('vert', '<f4'),
+    ('horz', '<f4'),
+    ('score', '<f4'),
+    ('integration_time', '<i4'),
+    ('image_offset', '<i8'),
+    ('image_size', '<i4'),
+]
+
+
+class ScanArchive:
+
+    def __init__(self, path, num_points=None, wavelengths=None):
+        # path: archive directory, created if it does not exist. num_points (or
+        # wavelengths) is needed to create a new archive
+        self.path = path
+        header_path = os.path.join(path, 'header.json')
+        if os.path.exists(header_path):
+            with open(header_path) as f:
+                header = json.load(f)
+            if header['version'] != FORMAT_VERSION:
+                raise ValueError('Unsupported scan archive version %d' % header['version'])
+            self.num_points = header['num_points']
+            self.wavelengths = np.array(header['wavelengths'], dtype=np.float32) if header['wavelengths'] else None
+        else:
+            if num_points is None and wavelengths is None:
+                raise ValueError('num_points or wavelengths is needed to create a scan archive')
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self.num_points = int(num_points if num_points is not None else len(wavelengths))
+            self.wavelengths = None if wavelengths is None else np.array(wavelengths, dtype=np.float32)
+            self._Write_Json('header.json', {
+                'version': FORMAT_VERSION,
+                'num_points': self.num_points,
+                'wavelengths': None if wavelengths is None else [float(w) for w in wavelengths],
+            })
+            self._Write_Json('sessions.json', [])
+        with open(os.path.join(path, 'sessions.json')) as f:
+            self.sessions = json.load(f)
+        self.dtypes = dict(COLUMNS)
+        self.dtypes['spectrum'] = '<f4'
+        self.count = self._Repair()
+        self.session = None
+        self._files = {name: open(self._File(name), 'ab') for name in self.dtypes}
+        self._images = open(self._File('images'), 'ab')
+        self._maps = {}
+        self._mapped_count = -1
+
+    def __len__(self):
+        return self.count
+
+    def _File(self, name):
+        return os.path.join(self.path, name + '.bin')
+
+    def _Write_Json(self, name, data):
+        # write to a temporary file and rename, so a crash never leaves half a file
+        tmp = os.path.join(self.path, name + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, os.path.join(self.path, name))
+
+    def _Row_Size(self, name):
+        size = np.dtype(self.dtypes[name]).itemsize
+        return size * self.num_points if name == 'spectrum' else size
+
+    def _Repair(self):
+        # number of complete rows, cutting off any torn append
+        sizes = {}
+        for name in self.dtypes:
+            path = self._File(name)
+            sizes[name] = os.path.getsize(path) if os.path.exists(path) else 0
+        count = min(sizes[name] // self._Row_Size(name) for name in self.dtypes)
+        for name in self.dtypes:
+            if sizes[name] != count * self._Row_Size(name):
+                with open(self._File(name), 'ab') as f:
+                    f.truncate(count * self._Row_Size(name))
+        images_end = 0
+        if count > 0:
+            offsets = np.fromfile(self._File('image_offset'), dtype='<i8', count=count)
+            sizes_img = np.fromfile(self._File('image_size'), dtype='<i4', count=count)
+            images_end = int((offsets + sizes_img).max())
+        with open(self._File('images'), 'ab') as f:
+            f.truncate(images_end)
+        return count
+
+    #--- writing ---#
+    def Begin_Session(self, name):
+        # following appends belong to this scan, reusing a name continues that scan
+        if name not in self.sessions:
+            self.sessions.append(name)
+            self._Write_Json('sessions.json', self.sessions)
+        self.session = self.sessions.index(name)
+        return self.session
+
+    def Append(self, spectrum, vert, horz, score=float('nan'), integration_time=0, object_id=-1,
+               jpeg=None, timestamp=None):
+        # append one detection, jpeg is the encoded image (bytes), returns its row
+        if self.session is None:
+            raise RuntimeError('Begin_Session has to be called before appending')
+        spectrum = np.ascontiguousarray(spectrum, dtype='<f4')
+        if spectrum.shape != (self.num_points,):
+            raise ValueError('Spectrum has %d points, the archive stores %d' % (spectrum.size, self.num_points))
+        if timestamp is None:
+            timestamp = time.time()
+        image_offset = self._images.tell()
+        image_size = 0
+        if jpeg is not None:
+            image_size = len(jpeg)
+            self._images.write(jpeg)
+            self._images.flush()
+        values = {
+            'timestamp': timestamp,
+            'session': self.session,
+            'object_id': object_id,
+            'vert': vert,
+            'horz': horz,
+            'score': score,
+            'integration_time': integration_time,
+            'image_offset': image_offset,
+            'image_size': image_size,
+        }
+        for name, dtype in COLUMNS:
+            self._files[name].write(np.array(values[name], dtype=dtype).tobytes())
+            self._files[name].flush()
+        # the spectrum completes the row
+        self._files['spectrum'].write(spectrum.tobytes())
+        self._files['spectrum'].flush()
+        self.count += 1
+        return self.count - 1
+
+    def Close(self):
+        for f in self._files.values():
+            f.close()
+        self._images.close()
+        self._maps = {}
+
+    #--- reading ---#
+    def Column(self, name):
+        # read-only memory map of a column over all complete rows
+        if self._mapped_count != self.count:
+            self._maps = {}
+            self._mapped_count = self.count
+        if name not in self._maps:
+            shape = (self.count, self.num_points) if name == 'spectrum' else (self.count,)
+            if self.count == 0:
+                self._maps[name] = np.empty(shape, dtype=self.dtypes[name])
+            else:
+                self._maps[name] = np.memmap(self._File(name), dtype=self.dtypes[name], mode='r', shape=shape)
+        return self._maps[name]
+
+    def Spectra(self, rows=None):
+        # spectra of the given rows (slice or index array), all of them by default
+        spectra = self.Column('spectrum')
+        return spectra if rows is None else spectra[rows]
+
+    def Session_Rows(self, name):
+        # rows of a scan, a slice when they are contiguous (the usual case) so
+        # reading them stays a view of the memory map
+        if name not in self.sessions:
+            return slice(0, 0)
+        rows = np.flatnonzero(self.Column('session') == self.sessions.index(name))
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            return slice(int(rows[0]), int(rows[-1]) + 1)
+        return rows
+
+    def Object_Rows(self, object_id):
+        return np.flatnonzero(self.Column('object_id') == object_id)
+
+    def Image(self, row):
+        # encoded JPEG of a row, None if it was stored without one
+        size = int(self.Column('image_size')[row])
+        if size == 0:
+            return None
+        offset = int(self.Column('image_offset')[row])
+        with open(self._File('images'), 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+
+def Import_CSV_Scan(archive, dir_name):
+    # add a scan saved as <id>.csv (position row then spectrum row per reading)
+    # and <id>.jpg files to the archive as a session named after the folder
+    archive.Begin_Session(os.path.basename(os.path.normpath(dir_name)))
+    imported = 0
+    for name in sorted(os.listdir(dir_name), key=lambda n: (len(n), n)):
+        base, ext = os.path.splitext(name)
+        if ext != '.csv' or not base.isdigit():
+            continue
+        with open(os.path.join(dir_name, name)) as f:
+            rows = [row.strip().split(',') for row in f if row.strip()]
+        jpeg = None
+        if os.path.exists(os.path.join(dir_name, base + '.jpg')):
+            with open(os.path.join(dir_name, base + '.jpg'), 'rb') as f:
+                jpeg = f.read()
+        timestamp = os.path.getmtime(os.path.join(dir_name, name))
+        for position, spectrum in zip(rows[0::2], rows[1::2]):
+            integration_time = int(float(position[2])) if len(position) > 2 else 0
+            archive.Append(np.array(spectrum, dtype=np.float32), float(position[1]), float(position[0]),
+                           integration_time=integration_time, jpeg=jpeg, timestamp=timestamp)
+            imported += 1
+    return imported
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('Usage: python ScanArchive.py <archive dir> <old scan dir> [<old scan dir> ...]')
+        sys.exit(1)
+    archive_path = sys.argv[1]
+    archive = None
+    for dir_name in sys.argv[2:]:
+        if archive is None:
+            # the first scan folder gives the spectrum length and wavelengths
+            wavelengths = None
+            wavelength_file = os.path.join(dir_name, 'wavelengths.csv')
+            if os.path.exists(wavelength_file):
+                with open(wavelength_file) as f:
+                    wavelengths = [float(w) for w in f.readline().strip().split(',')]
+            archive = ScanArchive(archive_path, wavelengths=wavelengths)
+        print('%s: %d detections' % (dir_name, Import_CSV_Scan(archive, dir_name)))
+    archive.Close()
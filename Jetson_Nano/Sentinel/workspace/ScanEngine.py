@@ -0,0 +1,344 @@
+# Pipelined scan engine used by Scan_Demo.
+# A scan is split into four stages that each run on their own thread and hand
+# work to the next stage through small bounded queues:
+#
+#   motion planner -> capture -> inference -> spectrum
+#
+# The planner only holds the mount still for as long as the capture stage needs
+# to grab the frames for a cell, so the mount is already moving to the next grid
+# cell while the frames of the previous cell are still in inference. The
+# spectrometer looks wherever the mount points, so when inference confirms an
+# object the spectrum stage asks the planner to take the mount back to that cell
+# before the reading is taken. Hits are rare, so these revisits are cheap
+# compared to waiting on the detector at every cell. With the mount back at the
+# cell the hit can also be confirmed first, e.g. by steering the mount onto an
+# object that was seen off center and checking it again.
+
+import queue
+import threading
+import time
+
+_STOP = None # marks the end of the work passed down the pipeline
+
+
+def Raster_Cells(mount, vStart=0, hStart=0, vEnd=1, hEnd=1, v_steps=1, h_steps=3):
+    # Serpentine list of (vert_pos, horz_pos) cells matching the order the old
+    # V_STEP/H_STEP scan loop visited them in
+    v_step = v_steps * mount.DC_STEP / mount.PWM_RANGE
+    h_step = h_steps * mount.DC_STEP / mount.PWM_RANGE
+    column = _Steps(vStart, vEnd, v_step)
+    cells = []
+    for h in _Steps(hStart, hEnd, h_step):
+        cells.extend((v, h) for v in column)
+        column.reverse()
+    return cells
+
+
+def _Steps(start, end, step):
+    # start, start + step, ... up to end. Each one is computed from its index,
+    # adding the step up would drift past end (1.0000000000000002 for the top
+    # row), which the mount rejects
+    count = int((end - start) / step + 1e-9)
+    return [min(end, max(start, start + i * step)) for i in range(count + 1)]
+
+
+def Refine_Cells(mount, hits, vStart=0, hStart=0, vEnd=1, hEnd=1, v_steps=1, h_steps=3,
+                 coarse_v_steps=4, coarse_h_steps=12):
+    # Fine grid cells (same grid as Raster_Cells) whose nearest coarse cell is
+    # one of the coarse hit cells, used to refine an adaptive scan. Each fine
+    # cell belongs to one coarse cell only: the window reaches half a coarse
+    # step and a fine cell exactly in between goes to the coarse cell after it.
+    v_reach = 0.5 * coarse_v_steps * mount.DC_STEP / mount.PWM_RANGE
+    h_reach = 0.5 * coarse_h_steps * mount.DC_STEP / mount.PWM_RANGE
+    cells = []
+    for cell in Raster_Cells(mount, vStart, hStart, vEnd, hEnd, v_steps, h_steps):
+        for hit in hits:
+            if (-v_reach - 1e-9 <= cell[0] - hit[0] < v_reach - 1e-9
+                    and -h_reach - 1e-9 <= cell[1] - hit[1] < h_reach - 1e-9):
+                cells.append(cell)
+                break
+    return cells
+
+
+class StageStats:
+    # busy time, item count and failed items for a single stage of the pipeline
+
+    def __init__(self, name):
+        self.name = name
+        self.busy = 0.0
+        self.items = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def add(self, busy, items=1):
+        with self._lock:
+            self.busy += busy
+            self.items += items
+
+    def add_failure(self, busy, items=1):
+        with self._lock:
+            self.busy += busy
+            self.failed += items
+
+    def utilization(self, wall_time):
+        if wall_time <= 0:
+            return 0.0
+        return self.busy / wall_time
+
+
+class ScanEngine:
+    # Runs a scan over a list of cells with motion, capture, inference and
+    # spectrum acquisition overlapped.
+    #   mount: PanTilt.PT_Mount used by the motion planner
+    #   grab_frames(n): returns a list of n frames at the current position
+    #   detect(frames): returns (hit, frame, boxes, scores, classes, num), hit
+    #       can be anything truthy, e.g. the score of the detection
+    #   acquire(cell, frame): returns the spectrum reading at the current position,
+    #       None skips the spectrum stage and only records the hit cells
+    #   on_detection(cell, frame, spectrum, hit): stores a confirmed detection,
+    #       frame is the last frame captured at the cell
+    #   confirm(cell, frame, hit): optional, called on the spectrum stage with
+    #       the mount back at the cell before acquire. Returns the (cell, frame,
+    #       hit) to acquire and store, the cell being where the mount points
+    #       now, or None to drop the hit. With confirm, hits only lists the
+    #       confirmed cells.
+    #   settle_time: fixed wait after every move, None uses the settle time
+    #       model of the mount (PT_Mount.MOVE_SETTLED)
+
+    def __init__(self, mount, grab_frames, detect, acquire, on_detection,
+                 frames_per_cell=5, settle_time=None, queue_size=2, confirm=None):
+        self.mount = mount
+        self.grab_frames = grab_frames
+        self.detect = detect
+        self.acquire = acquire
+        self.on_detection = on_detection
+        self.confirm = confirm
+        self.frames_per_cell = frames_per_cell
+        self.settle_time = settle_time
+        self.queue_size = queue_size
+        self.stats = {}
+        self.hits = []
+        self.failures = [] # (cell, exception) of every failed spectrum reading
+        self.wall_time = 0.0
+        self._stop = threading.Event()
+        self._failed = threading.Event()
+        self._error = None
+        self._error_lock = threading.Lock()
+
+    def Stop(self):
+        # stop issuing new cells, work that is already queued is still finished
+        self._stop.set()
+
+    def Run(self, cells, on_frame=None):
+        # Scan the given cells. on_frame(frame, boxes, scores, classes, num) is
+        # called on the calling thread for every inferred cell (cv2.imshow has
+        # to stay on the main thread) and can return False to abort the scan.
+        # The first exception raised by any stage stops the others and is
+        # raised again here once they have all exited.
+        self._stop.clear()
+        self._failed.clear()
+        self._error = None
+        self.hits = []
+        self.failures = []
+        self.stats = {name: StageStats(name) for name in ('motion', 'capture', 'inference', 'spectrum')}
+        self._capture_q = queue.Queue(maxsize=1)
+        self._inference_q = queue.Queue(maxsize=self.queue_size)
+        self._spectrum_q = queue.Queue(maxsize=self.queue_size)
+        self._revisit_q = queue.Queue()
+        self._display_q = queue.Queue(maxsize=1)
+        self._captured = threading.Event()
+        self._spectrum_done = threading.Event()
+
+        start_time = time.time()
+        workers = [
+            threading.Thread(target=self._Worker, args=(self._Motion, list(cells))),
+            threading.Thread(target=self._Worker, args=(self._Capture,)),
+            threading.Thread(target=self._Worker, args=(self._Inference,)),
+            threading.Thread(target=self._Worker, args=(self._Spectrum,)),
+        ]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        while any(worker.is_alive() for worker in workers):
+            try:
+                shown = self._display_q.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if on_frame is not None and on_frame(*shown) is False:
+                self.Stop()
+        for worker in workers:
+            worker.join()
+        self.wall_time = time.time() - start_time
+        if self._error is not None:
+            raise self._error
+        return self.stats
+
+    def Report(self):
+        lines = ['scan time: %.2f s  cells hit: %d' % (self.wall_time, len(self.hits))]
+        for stage in self.stats.values():
+            lines.append('  %-9s busy %7.2f s  utilization %5.1f%%  items %d  failed %d' % (
+                stage.name, stage.busy, 100 * stage.utilization(self.wall_time), stage.items, stage.failed))
+        return '\n'.join(lines)
+
+    #--- stage plumbing ---#
+    def _Worker(self, stage, *args):
+        try:
+            stage(*args)
+        except Exception as e:
+            self._Fail(e)
+
+    def _Fail(self, error):
+        # only the first error is kept, the ones after it are usually caused by it
+        with self._error_lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+        self._failed.set()
+
+    def _Put(self, q, item):
+        # a put that gives up once a stage failed, so no stage blocks on a
+        # queue nobody drains anymore. Returns False if it gave up.
+        while not self._failed.is_set():
+            try:
+                q.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _Get(self, q):
+        # a get that returns _STOP once a stage failed
+        while not self._failed.is_set():
+            try:
+                return q.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        return _STOP
+
+    def _Wait(self, event):
+        # an event wait that gives up once a stage failed, False if it gave up
+        while not event.wait(0.05):
+            if self._failed.is_set():
+                return False
+        return True
+
+    #--- stages ---#
+    def _MoveTo(self, cell):
+        start = time.time()
+        if self.settle_time is None:
+            # ramped move that waits as long as the mount's settle model says
+            moved = self.mount.MOVE_SETTLED(cell[0], cell[1])
+        else:
+            moved = self.mount.MOVE2D(cell[0], cell[1])
+        if moved == -1:
+            # the mount stayed where it was, frames taken now would be filed under the wrong cell
+            raise ValueError('Mount rejected the move to cell %s' % (cell,))
+        if self.settle_time is not None:
+            time.sleep(self.settle_time)
+        self.stats['motion'].add(time.time() - start)
+
+    def _ServeRevisits(self, timeout=0):
+        # take the mount back to cells the spectrum stage needs a reading from
+        while True:
+            try:
+                cell, arrived, done = self._revisit_q.get(timeout=timeout)
+            except queue.Empty:
+                return
+            self._MoveTo(cell)
+            arrived.set()
+            if not self._Wait(done):
+                return
+
+    def _Motion(self, cells):
+        for cell in cells:
+            self._ServeRevisits()
+            if self._stop.is_set():
+                break
+            self._MoveTo(cell)
+            self._captured.clear()
+            if not self._Put(self._capture_q, cell) or not self._Wait(self._captured):
+                return
+        self._Put(self._capture_q, _STOP)
+        # keep serving revisits until every queued hit has its spectrum
+        while not self._spectrum_done.is_set() and not self._failed.is_set():
+            self._ServeRevisits(timeout=0.05)
+
+    def _Capture(self):
+        try:
+            while True:
+                cell = self._Get(self._capture_q)
+                if cell is _STOP:
+                    return
+                start = time.time()
+                try:
+                    frames = self.grab_frames(self.frames_per_cell)
+                finally:
+                    self._captured.set()
+                self.stats['capture'].add(time.time() - start)
+                if not self._Put(self._inference_q, (cell, frames)):
+                    return
+        finally:
+            self._Put(self._inference_q, _STOP)
+
+    def _Inference(self):
+        try:
+            while True:
+                item = self._Get(self._inference_q)
+                if item is _STOP:
+                    return
+                cell, frames = item
+                start = time.time()
+                hit, frame, boxes, scores, classes, num = self.detect(frames)
+                self.stats['inference'].add(time.time() - start)
+                if hit and (self.confirm is None or self.acquire is None):
+                    self.hits.append(cell)
+                if hit and self.acquire is not None:
+                    # keep the untouched capture for saving, the display
+                    # draws its boxes onto the frame detect returned
+                    if not self._Put(self._spectrum_q, (cell, frames[-1], hit)):
+                        return
+                # the display only ever needs the newest frame
+                try:
+                    self._display_q.get_nowait()
+                except queue.Empty:
+                    pass
+                self._display_q.put((frame, boxes, scores, classes, num))
+        finally:
+            self._Put(self._spectrum_q, _STOP)
+
+    def _Spectrum(self):
+        try:
+            while True:
+                item = self._Get(self._spectrum_q)
+                if item is _STOP:
+                    return
+                cell, frame, hit = item
+                arrived = threading.Event()
+                done = threading.Event()
+                self._revisit_q.put((cell, arrived, done))
+                if not self._Wait(arrived):
+                    return
+                start = time.time()
+                try:
+                    if self.confirm is not None:
+                        confirmed = self.confirm(cell, frame, hit)
+                        if confirmed is None:
+                            continue
+                        cell, frame, hit = confirmed
+                        self.hits.append(cell)
+                    try:
+                        spectrum = self.acquire(cell, frame)
+                    except Exception as e:
+                        # a failed reading only loses this detection, not the
+                        # scan, it is counted and kept in failures for the caller
+                        self.failures.append((cell, e))
+                        self.stats['spectrum'].add_failure(time.time() - start)
+                        continue
+                finally:
+                    done.set()
+                # an error storing the detection is raised from Run
+                self.on_detection(cell, frame, spectrum, hit)
+                self.stats['spectrum'].add(time.time() - start)
+        finally:
+            self._spectrum_done.set()
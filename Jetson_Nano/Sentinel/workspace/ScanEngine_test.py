@@ -0,0 +1,64 @@
+# Tests for the scan grids of ScanEngine, run with python -m unittest ScanEngine_test
+import unittest
+
+import ScanEngine
+
+
+class Mount:
+    # the grid settings of a default PanTilt.PT_Mount, without the servos
+    DC_STEP = 0.25
+    PWM_RANGE = 9
+
+
+class RasterCellsTest(unittest.TestCase):
+
+    def check_grid(self, cells, vStart=0, hStart=0, vEnd=1, hEnd=1):
+        for v, h in cells:
+            self.assertTrue(vStart <= v <= vEnd, (v, h))
+            self.assertTrue(hStart <= h <= hEnd, (v, h))
+        self.assertEqual(vEnd, max(v for v, h in cells))
+        self.assertEqual(hEnd, max(h for v, h in cells))
+        self.assertEqual(len(cells), len(set(cells)))
+
+    def test_fine_grid(self):
+        cells = ScanEngine.Raster_Cells(Mount(), v_steps=1, h_steps=3)
+        self.assertEqual(37 * 13, len(cells))
+        self.check_grid(cells)
+
+    def test_coarse_grid(self):
+        # Coarse_Scan with COARSE_STEP = 4
+        cells = ScanEngine.Raster_Cells(Mount(), v_steps=4, h_steps=12)
+        self.assertEqual(10 * 4, len(cells))
+        self.check_grid(cells)
+
+    def test_partial_range(self):
+        cells = ScanEngine.Raster_Cells(Mount(), 0.2, 0.1, 0.8, 0.9, v_steps=1, h_steps=3)
+        for v, h in cells:
+            self.assertTrue(0.2 <= v <= 0.8 and 0.1 <= h <= 0.9, (v, h))
+
+    def test_serpentine_order(self):
+        cells = ScanEngine.Raster_Cells(Mount(), v_steps=4, h_steps=12)
+        self.assertEqual((0, 0), cells[0])
+        self.assertEqual((1, 0), cells[9])
+        self.assertEqual(1, cells[10][0])
+
+
+class RefineCellsTest(unittest.TestCase):
+
+    def test_coarse_cells_split_the_fine_grid(self):
+        mount = Mount()
+        fine = ScanEngine.Raster_Cells(mount, v_steps=1, h_steps=3)
+        coarse = ScanEngine.Raster_Cells(mount, v_steps=4, h_steps=12)
+        owned = []
+        for cell in coarse:
+            owned.extend(ScanEngine.Refine_Cells(mount, [cell], coarse_v_steps=4, coarse_h_steps=12))
+        self.assertEqual(sorted(fine), sorted(owned))
+
+    def test_top_row_hit_refines_the_top_row(self):
+        mount = Mount()
+        cells = ScanEngine.Refine_Cells(mount, [(1, 0)], coarse_v_steps=4, coarse_h_steps=12)
+        self.assertIn((1, 0), cells)
+
+
+if __name__ == '__main__':
+    unittest.main()
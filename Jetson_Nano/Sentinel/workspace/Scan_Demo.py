@@ -8,12 +8,18 @@ from fileinput import hook_encoded
 from datetime import datetime
 import os
 import PanTilt
+from Pi_Camera import FrameGrabber, GstCapture, inference_pipeline
+import ScanEngine
 import argparse
 import cv2
 import Jetson.GPIO as GPIO
-import tensorflow as tf
+import Detector
+import DetectorServer
 from NanoLambdaNSP32 import *
-from csv import writer
+from NSP32Client import NSP32Client, SpectrumStream
+from SpectrumExposure import ExposureController
+from ObjectStore import ObjectStore
+from ScanArchive import ScanArchive, Import_CSV_Scan
 from csv import reader
 import object_detection
 from object_detection.utils import label_map_util
@@ -22,6 +28,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
 
+import threading
 import time
 
 #--- Constants ---#
@@ -33,35 +40,24 @@ V_START = 0
 V_END = 1
 H_START = 0
 H_END = 1
-# MODEL_PATH = 'Models/haarcascade_frontalface_default.xml'
-NEXT_ID = 0
-
-def gstreamer_pipeline(
-    capture_width =1200,
-    capture_height=1200,
-    display_width=300,
-    display_height=300,
-    framerate=21,
-    flip_method=0,
-):
-    return(
-        "nvarguscamerasrc ! "
-        "video/x-raw(memory:NVMM), "
-        "width=(int)%d, height=(int)%d, "
-        "format=(string)NV12, framerate=(fraction)%d/1 ! "
-        "nvvidconv flip-method=%d ! "
-        "video/x-raw, width=(int)%d, height=(int)%d, format=(string)BGRx ! "
-        "videoconvert ! "
-        "video/x-raw, format=(string)BGR ! appsink"
-        % (
-            capture_width,
-            capture_height,
-            framerate,
-            flip_method,
-            display_width,
-            display_height,
-        )
-    )
+MODEL_PATH = 'Models/ssd_mobilenet_v2_graph/frozen_inference_graph.pb' # .pb, .tflite or .onnx
+BACKEND = None # detector backend, None picks it from the model file extension
+NUM_THREADS = 4 # CPU threads the detector runs on
+NUM_FRAMES = 5 # frames checked per position to reduce false positives
+MIN_VOTES = 3 # frames the object must stay centered in, at most NUM_FRAMES
+SPECTRUM_TIMEOUT = 5 # seconds before a spectrum acquisition is given up on
+MODEL_SIZE = 300 # input resolution of the detector, the camera delivers frames at this size
+STORE_FILE = 'objects.db' # object map shared by every scan saved to the same directory
+ARCHIVE_DIR = 'scan_archive' # spectra, positions and images of every detection of every scan
+SETTLE_FILE = 'settle_model.json' # calibrated settle times of the mount
+CALIBRATE_SETTLE = False
+PIXEL_FILE = 'pixel_model.json' # calibrated duty cycle per pixel of image offset
+CALIBRATE_PIXELS = False
+CENTER_FRAMES = 10 # most frames spent centering an off center object before checking it again, 0 to not center
+CENTER_TOL = 15 # pixels off center a centered candidate may be (Vote_Centered allows 30)
+ADAPTIVE = False # coarse sweep first, then the full check only around candidates
+COARSE_STEP = 4 # coarse grid spacing in fine grid cells
+COARSE_THRESH = 0.5 # detection score that marks a coarse cell for refinement
 
 class detection:
     def __init__(self,id,x,y):
@@ -71,24 +67,36 @@ class detection:
         # when a model with multiple classes is used
         # self.label = label
     def show_image(self):
-        # load in image
+        # load in the latest image of the object
+        rows = archive.Object_Rows(self.id)
+        jpeg = archive.Image(rows[-1]) if len(rows) else None
         plt.figure()
-        plt.imshow(mpimg.imread(SAVE_DIR+'/'+str(self.id)+'.jpg'))
+        if jpeg is not None:
+            image = cv2.imdecode(np.frombuffer(jpeg,dtype=np.uint8),cv2.IMREAD_COLOR)
+            plt.imshow(cv2.cvtColor(image,cv2.COLOR_BGR2RGB))
+        else:
+            # objects imported from scans saved before the archive existed
+            plt.imshow(mpimg.imread(store.Image(self.id)))
         plt.show()
 
     def show_spectrum(self):
-        with open(SAVE_DIR+'/'+str(self.id)+".csv") as f:
-            reader_obj = reader(f)
-            rows = [row for row in reader_obj]
-            global wavelength_info
-            plt.figure()
-            plt.plot(wavelength_info.Wavelength,rows[-1])
-            plt.show()
+        # every spectrum taken of the object, one line per sighting
+        timestamps,integration_times,spectra = store.Spectra(self.id)
+        plt.figure()
+        for timestamp,spectrum in zip(timestamps,spectra):
+            plt.plot(store.Wavelengths(),spectrum,label=datetime.fromtimestamp(timestamp).strftime("%d-%m-%Y %H:%M"))
+        plt.legend()
+        plt.show()
 
     
 def Cam_init():
+    # frames are grabbed on a background thread, so the newest one is always
+    # ready and none of them sat in the pipeline during a move or inference
+    # the frames are RGB at the model resolution straight from the hardware
+    # converter, full resolution images come from cap.still() when one is saved
     global cap
-    cap = cv2.VideoCapture(gstreamer_pipeline(),cv2.CAP_GSTREAMER)
+    capture = GstCapture(inference_pipeline(1200,1200,MODEL_SIZE,MODEL_SIZE,21,0),MODEL_SIZE,MODEL_SIZE)
+    cap = FrameGrabber(cap=capture)
     return cap
 
 
@@ -116,120 +124,326 @@ def Handle_Args(args):
         H_END = args.horizontal_end
     if args.model:
         global MODEL_PATH 
-        MODEL_PATH = args.horizontal_model
+        MODEL_PATH = args.model
+    if args.backend:
+        global BACKEND
+        BACKEND = args.backend
+    if args.num_threads:
+        global NUM_THREADS
+        NUM_THREADS = args.num_threads
+    if args.num_frames:
+        global NUM_FRAMES
+        NUM_FRAMES = args.num_frames
+    if args.adaptive:
+        global ADAPTIVE
+        ADAPTIVE = True
+    if args.calibrate_settle:
+        global CALIBRATE_SETTLE
+        CALIBRATE_SETTLE = True
+    if args.calibrate_pixels:
+        global CALIBRATE_PIXELS
+        CALIBRATE_PIXELS = True
+    if args.center_frames is not None:
+        global CENTER_FRAMES
+        CENTER_FRAMES = args.center_frames
 
 def END():
     global cap
     # perform whatever clean up is necessary
     cap.release()
     cv2.destroyAllWindows()
+    archive.Close()
+    store.Close()
 
-def Check4Object():
+def Grab_Frames(num_frames):
+    # consecutive frames captured after the call, so none of them predate the last move
     global cap
-    global nsp32
-    if not(cap.isOpened()):
-        print('Camera stream is not Open!')
-        return
-    centered_obj = (0,0)
-    count = 0
-    for i in range(5): # checks the image 5 times to reduce false postives
-        ret,frame_orig = cap.read()
-        # frame = cv2.resize(frame,None, fx=0.5,fy=0.5, interpolation=cv2.INTER_AREA)
-        frame = cv2.resize(frame_orig,(300,300), interpolation=cv2.INTER_AREA)
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame_expanded = np.expand_dims(frame_rgb,axis=0)
-        global detection_scores 
-        global detection_boxes
-        global detection_classes
-        global num_detections
-        global image_tensor
-        (boxes, scores, classes, num) = model.run(
-         [detection_boxes, detection_scores, detection_classes, num_detections],
-         feed_dict={image_tensor: frame_expanded})
-        # gray = cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
-        # objects = model.detectMultiScale(gray,1.1,4)
-
-        for(x,y,w,h) in boxes[np.where(scores>0.8)]:
-            # draw rectangles
-            # cv2.rectangle(frame,(x,y),(x+w,y+h),(255,0,0),2)
-            # check if the object in centered enough
-            obj_x = x+ 0.5*w
-            obj_y = y+0.5*h
-            if obj_x < (frame.shape[1]/2+30) and obj_x > (frame.shape[1]/2-30) :
-                if obj_y < (frame.shape[0]/2+30) and obj_y > (frame.shape[0]/2-30) :
-                    # Object is Centered
-                    if centered_obj == (0,0):
-                        centered_obj = (x,y)
-                        count += 1
-                    elif x>centered_obj[0]-10 and x<centered_obj[0]+10:
-                        if y>centered_obj[1]-10 and y<centered_obj[1]+10:
-                            count += 1
-    if count >= 3:
-        # take picture and save
-        global NEXT_ID
-        # in the future I will add the label the detected object was given to this string as well
-        image_name = SAVE_DIR+'/'+str(NEXT_ID)+".jpg"
-        cv2.imwrite(image_name,frame_orig)
-        print('Image Saved!: ',image_name)
-        # read in spectroscopy data
-        nsp32.AcqSpectrum(0,int(32),3,0)
-
-        #wait for acquisition
-        while nsp32.GetReturnPacketSize() <= 0:
-            nsp32.UpdateStatus()
-        
-        spectrum_info = nsp32.GetReturnPacket().ExtractSpectrumInfo()
-        global mount
-        # write spectrum data into csv files
-        with open(SAVE_DIR+'/'+str(NEXT_ID)+".csv",'a',newline='') as f_object:
-            writer_obj = writer(f_object)
-            writer_obj.writerow([mount.horz_pos,mount.vert_pos])
-            writer_obj.writerow(spectrum_info.Spectrum)
-            f_object.close()
-        object_list.append(detection(NEXT_ID,mount.horz_pos,mount.vert_pos))
-        NEXT_ID += 1
-    return frame,boxes,scores,classes,num
+    frames = []
+    timestamp = time.time()
+    for i in range(num_frames):
+        frame_orig,frame_time = cap.wait_newer_than(timestamp,timeout=1)
+        if frame_orig is None:
+            # no frame within a second, the camera stopped or stalled
+            raise RuntimeError('No camera frame within 1 s (%d of %d frames grabbed)' % (i,num_frames))
+        timestamp = frame_time
+        frames.append(frame_orig)
+    return frames
+
+def Frame_Still(threshold=2.0):
+    # the image has stopped moving when two consecutive frames barely differ
+    global cap
+    ret,first = cap.read()
+    ret,second = cap.read()
+    return cv2.absdiff(first,second).mean() < threshold
+
+def Calibrate_Mount():
+    global mount
+    model = PanTilt.Calibrate_Settle(mount,Frame_Still)
+    model.Save(SETTLE_FILE)
+    print('Settle time: %.3f s + %.3f s per unit of travel' % (model.base,model.per_unit))
+    mount.RAMP2D(0.5,0.5)
+
+def Frame_Shift(before,after):
+    # pixels the image content moved between two frames
+    (dx,dy),response = cv2.phaseCorrelate(np.float32(cv2.cvtColor(before,cv2.COLOR_RGB2GRAY)),
+        np.float32(cv2.cvtColor(after,cv2.COLOR_RGB2GRAY)))
+    return dx,dy
+
+def Calibrate_Centering():
+    # measure the duty cycle per pixel of each axis for the centering controller
+    global controller
+    model = PanTilt.Calibrate_Pixels(mount,lambda: Grab_Frames(1)[-1],Frame_Shift)
+    model.Save(PIXEL_FILE)
+    print('Duty cycle per pixel: %.5f horizontal, %.5f vertical' % (model.horz_per_px,model.vert_per_px))
+    controller.pixel_model = model
+    mount.RAMP2D(0.5,0.5)
+
+def Locate_Candidate(min_score=0.8):
+    # pixel center of the best detection in a new frame, None if there is none
+    frame,boxes,scores,classes,num = Run_Detector(Grab_Frames(1))
+    best = int(np.argmax(scores[-1]))
+    if scores[-1][best] < min_score:
+        return None
+    ymin,xmin,ymax,xmax = boxes[-1][best]*MODEL_SIZE
+    return (xmin+xmax)/2,(ymin+ymax)/2
+
+def Vote_Centered(boxes,scores,frame_shape,min_score=0.8,center_tol=30,match_tol=10,min_votes=3):
+    # boxes [N,K,4] (normalized ymin,xmin,ymax,xmax) and scores [N,K] for a
+    # stack of N frames. An object counts as found when the same box (top left
+    # corner within match_tol px of the first centered box) is centered within
+    # center_tol px in at least min_votes of the frames. Returns the mean score
+    # of the matched boxes, 0 if nothing was found.
+    height, width = frame_shape[0], frame_shape[1]
+    px = boxes * np.array([height,width,height,width],dtype=np.float32)
+    center_y = 0.5*(px[...,0]+px[...,2])
+    center_x = 0.5*(px[...,1]+px[...,3])
+    centered = (scores > min_score) & (np.abs(center_x-width/2) < center_tol) & (np.abs(center_y-height/2) < center_tol)
+    if not centered.any():
+        return 0.0
+    # the first centered box (in frame order) is the one the others must match
+    first = np.argwhere(centered)[0]
+    anchor = px[first[0],first[1],:2]
+    matched = centered & (np.abs(px[...,:2]-anchor).max(axis=-1) < match_tol)
+    # one vote per frame
+    if int(matched.any(axis=1).sum()) < min_votes:
+        return 0.0
+    return float(scores[matched].mean())
+
+def Run_Detector(frames):
+    # the frames are already RGB at the model resolution, they only have to be
+    # stacked into the batch buffer, which is reused as long as the batch size stays
+    # the lock keeps centering on the spectrum stage from sharing the buffer and
+    # the model with the inference stage
+    global batch
+    with detector_lock:
+        if batch is None or len(batch) != len(frames):
+            batch = np.empty((len(frames),MODEL_SIZE,MODEL_SIZE,3),dtype=np.uint8)
+        for i,frame in enumerate(frames):
+            batch[i] = frame
+        (boxes, scores, classes, num) = model.Detect(batch)
+    # Show_Frame draws on its own BGR copy, the capture stays untouched
+    return frames[-1],boxes,scores,classes,num
+
+def Detect_Candidate(frames):
+    # coarse pass of an adaptive scan, anything in view scoring above the
+    # lower threshold marks the cell for the full check
+    frame,boxes,scores,classes,num = Run_Detector(frames)
+    found = bool((scores > COARSE_THRESH).any())
+    return found,frame,boxes[-1:],scores[-1:],classes[-1:],num[-1:]
+
+class Candidate(float):
+    # score of an object that was seen but not centered, Confirm_Object steers
+    # the mount onto it and checks it again before it counts as found
+    pass
+
+def Detect_Object(frames):
+    # runs the detector once on the whole stack of frames and votes on whether
+    # the same object stayed centered in enough of them to not be a false positive
+    frame,boxes,scores,classes,num = Run_Detector(frames)
+    # with fewer frames than MIN_VOTES every frame has to agree
+    found = Vote_Centered(boxes,scores,frame.shape,min_votes=min(MIN_VOTES,len(frames)))
+    if not found and CENTER_FRAMES and (scores > 0.8).any():
+        found = Candidate(scores.max())
+    # only the last frame is shown
+    return found,frame,boxes[-1:],scores[-1:],classes[-1:],num[-1:]
+
+def Confirm_Object(cell,frame,found):
+    # runs on the scan engine's spectrum stage with the mount back at the cell,
+    # an off center object is steered to the center in a few frames and checked
+    # again, the detection is then saved at the centered position
+    if not isinstance(found,Candidate):
+        return cell,frame,found
+    if not controller.Center(Locate_Candidate,MODEL_SIZE,MODEL_SIZE,tolerance=CENTER_TOL,max_frames=CENTER_FRAMES):
+        return None
+    frames = Grab_Frames(NUM_FRAMES)
+    found,frame,boxes,scores,classes,num = Detect_Object(frames)
+    if not found or isinstance(found,Candidate):
+        return None
+    return (mount.vert_pos,mount.horz_pos),frames[-1],found
+
+batch = None
+detector_lock = threading.Lock()
+
+def Acquire_Spectrum(cell,frame):
+    global spectrum_stream
+    global exposure
+    # read in spectroscopy data, the stream keeps acquiring in the background
+    # (sleeping on the ready pin, so the detector keeps the CPU) and the exposure
+    # controller picks the integration time, starting from the one that worked
+    # last time for this cell and lighting
+    if not spectrum_stream.IsRunning():
+        spectrum_stream.Start(exposure.default_time,exposure.frame_avg,False)
+    # lighting condition from the brightness of the camera frame
+    lighting = int(frame.mean()//32)
+    samples = exposure.Acquire(cell,lighting)
+    # the full resolution image is taken while the mount is still at the cell
+    return samples,cap.still()
+
+def Save_Detection(frame_orig,reading,horz_pos,vert_pos,score=float('nan')):
+    samples,jpeg = reading
+    # objects found in earlier scans get the new spectrum added to their time series
+    # in the future I will add the label the detected object was given as well
+    object_id,is_new = store.Add_Detection(vert_pos,horz_pos,samples.spectra[-1],
+        int(samples.integrationTimes[-1]))
+    if is_new:
+        object_list[object_id] = detection(object_id,horz_pos,vert_pos)
+        print('New object: ',object_id)
+    else:
+        print('Object seen again: ',object_id)
+    # picture, spectrum and position go into the scan archive as one row
+    if jpeg is None:
+        # no full resolution still, fall back to the model resolution frame
+        ret,encoded = cv2.imencode('.jpg',cv2.cvtColor(frame_orig,cv2.COLOR_RGB2BGR))
+        jpeg = encoded.tobytes() if ret else None
+    archive.Append(samples.spectra[-1],vert_pos,horz_pos,score,int(samples.integrationTimes[-1]),
+        object_id,jpeg,samples.timestamps[-1])
 
 def draw_boxes(frame,objects):
     for (x,y,w,h) in objects:
         cv2.rectangle(frame,(x,y),(x+w,y+h),(255,0,0),2)
     return frame
 
+def Show_Frame(frame,boxes,scores,classes,num):
+    global category_index
+    # converting makes the display copy, the boxes are drawn straight into it with OpenCV
+    display = cv2.cvtColor(frame,cv2.COLOR_RGB2BGR)
+    vis_util.visualize_boxes_and_labels_on_image_array_cv2(
+    display,
+    np.squeeze(boxes),
+    np.squeeze(classes).astype(np.int32),
+    np.squeeze(scores),
+    category_index,
+    use_normalized_coordinates=True,
+    line_thickness=8,
+    min_score_thresh=0.85,
+    bgr=True)
+    cv2.imshow("Scan_Window", display)
+    keyCode = cv2.waitKey(5) &  0xFFF
+    # returning False aborts the scan
+    return keyCode != 27
+
+def Coarse_Scan(vStart = 0, hStart = 0, vEnd = 1, hEnd = 1):
+    # sweep a coarse grid with one frame per cell and return the fine grid
+    # cells around the cells that had a candidate, None if the scan was aborted
+    coarse = ScanEngine.Raster_Cells(mount,vStart,hStart,vEnd,hEnd,v_steps=COARSE_STEP,h_steps=3*COARSE_STEP)
+    engine = ScanEngine.ScanEngine(mount, Grab_Frames, Detect_Candidate, None, None, frames_per_cell=1)
+    aborted = []
+    def on_frame(*shown):
+        keep_going = Show_Frame(*shown)
+        if keep_going is False:
+            aborted.append(True)
+        return keep_going
+    engine.Run(PanTilt.Plan_Visits(mount,coarse),on_frame=on_frame)
+    print(engine.Report())
+    if aborted:
+        return None
+    cells = ScanEngine.Refine_Cells(mount,engine.hits,vStart,hStart,vEnd,hEnd,v_steps=1,h_steps=3,
+        coarse_v_steps=COARSE_STEP,coarse_h_steps=3*COARSE_STEP)
+    print('Coarse cells: %d  candidates: %d  cells to refine: %d' % (len(coarse),len(engine.hits),len(cells)))
+    return cells
+
 def Scan(vStart = 0, hStart = 0, vEnd = 1, hEnd = 1):
-    start_time = time.time()
+    global cap
+    if not(cap.isOpened()):
+        print('Camera stream is not Open!')
+        return
     cv2.namedWindow('Scan_Window', cv2.WINDOW_AUTOSIZE)
-    mount.MOVE2D(vStart,hStart)
-    go = 1
-    num_v = 1
-    while go == 1:
-        #check view
-        frame,boxes,scores,classes,num = Check4Object()
-        # annotated_frame = draw_boxes(frame,objects)
-        global category_index
-        vis_util.visualize_boxes_and_labels_on_image_array(
-        frame,
-        np.squeeze(boxes),
-        np.squeeze(classes).astype(np.int32),
-        np.squeeze(scores),
-        category_index,
-        use_normalized_coordinates=True,
-        line_thickness=8,
-        min_score_thresh=0.85)
-        cv2.imshow("Scan_Window", frame)
-        keyCode = cv2.waitKey(5) &  0xFFF
-        if keyCode == 27:
-            break
-        #display to viewer
-        #progress
-        go = mount.V_STEP(num_v,lower_bound=vStart,upper_bound=vEnd)
-        time.sleep(0.2)
-        if go == 0:
-            go = mount.H_STEP(3,lower_bound=hStart,upper_bound=hEnd)
-            num_v = -num_v
-    mount.MOVE2D(0.5,0.5)
-    end_time = time.time()
-    print(end_time-start_time)
-# def load_from_save(dir_name):
+    # the mount moves on to the next cell while the frames of the last one
+    # are still in inference, see ScanEngine for how the stages hand off
+    if ADAPTIVE:
+        cells = Coarse_Scan(vStart,hStart,vEnd,hEnd)
+        if cells is None:
+            return
+    else:
+        cells = ScanEngine.Raster_Cells(mount,vStart,hStart,vEnd,hEnd,v_steps=1,h_steps=3)
+    # visit order with the least estimated move and settle time from where the mount is now
+    cells = PanTilt.Plan_Visits(mount,cells)
+    # settle_time=None waits per move as the mount's settle model says instead of a fixed sleep
+    # off center objects are centered before their spectrum is taken, see Confirm_Object
+    engine = ScanEngine.ScanEngine(mount, Grab_Frames, Detect_Object, Acquire_Spectrum,
+        lambda cell,frame,reading,score: Save_Detection(frame,reading,cell[1],cell[0],score),
+        frames_per_cell=NUM_FRAMES, settle_time=None, confirm=Confirm_Object)
+    spectrum_stream.Start(exposure.default_time,exposure.frame_avg,False)
+    try:
+        # Run raises the first error of any of its stages once they all stopped
+        engine.Run(cells,on_frame=Show_Frame)
+    finally:
+        spectrum_stream.Stop()
+        mount.RAMP2D(0.5,0.5)
+    print(engine.Report())
+    for cell,error in engine.failures:
+        print('Spectrum acquisition failed at',cell,error)
+    print(exposure.Report())
+def Open_Store(path):
+    # open the object map and list the objects it already holds
+    global store
+    global object_list
+    store = ObjectStore(path)
+    object_list = {}
+    for object_id,vert,horz,label,sightings,first_seen,last_seen,image in store.Objects():
+        object_list[object_id] = detection(object_id,horz,vert)
+    return store
+
+def Open_Archive(path):
+    # scan archive, this run is one session in it
+    global archive
+    archive = ScanArchive(path,wavelengths=wavelength_info.Wavelength)
+    archive.Begin_Session(os.path.basename(SAVE_DIR))
+    return archive
+
+def load_from_save(dir_name):
+    # continue from the object map and archive in dir_name, scans saved before
+    # those existed (one folder of <id>.jpg/<id>.csv per scan) are imported
+    global store
+    global archive
+    if os.path.exists(dir_name+'/'+STORE_FILE):
+        store.Close()
+        Open_Store(dir_name+'/'+STORE_FILE)
+        if os.path.exists(dir_name+'/'+ARCHIVE_DIR):
+            archive.Close()
+            Open_Archive(dir_name+'/'+ARCHIVE_DIR)
+        print('Loaded %d objects' % len(object_list))
+        return
+    imported = 0
+    for name in sorted(os.listdir(dir_name)):
+        base,ext = os.path.splitext(name)
+        if ext != '.csv' or not base.isdigit():
+            continue
+        with open(dir_name+'/'+name) as f:
+            rows = [row for row in reader(f)]
+        # a position row followed by a spectrum row for every reading
+        for position,spectrum in zip(rows[0::2],rows[1::2]):
+            integration_time = int(float(position[2])) if len(position) > 2 else None
+            object_id,is_new = store.Add_Detection(float(position[1]),float(position[0]),
+                np.array(spectrum,dtype=np.float32),integration_time,image=dir_name+'/'+base+'.jpg',
+                timestamp=os.path.getmtime(dir_name+'/'+name))
+            if is_new:
+                object_list[object_id] = detection(object_id,float(position[0]),float(position[1]))
+            imported += 1
+    Import_CSV_Scan(archive,dir_name)
+    # back to this run's session for the next scan
+    archive.Begin_Session(os.path.basename(SAVE_DIR))
+    print('Imported %d detections, %d objects known' % (imported,len(object_list)))
 
 
 def Console_Loop():
@@ -241,9 +455,10 @@ def Console_Loop():
             if(len(usr_in) > 0):
                 if usr_in == 'exit':
                     return
-                # elif usr_in == 'load':
-                #     dir_name = input('What directory should be used to load? ')
-                #     load_from_save(dir_name)
+                elif usr_in == 'load':
+                    dir_name = input('What directory should be used to load? ')
+                    load_from_save(dir_name)
+                    continue
                 else:
                     print('Command not recognized')
                     break
@@ -259,14 +474,14 @@ def Console_Loop():
                     if(len(object_list)==0):
                         print('No detections to show!')
                         break
-                    print(range(len(object_list)))
+                    print(sorted(object_list))
                     number = input("What ID would you like to plot? ")
                     object_list[int(number)].show_spectrum()
                 elif usr_in == 'show_image':
                     if(len(object_list)==0):
                         print('No detections to show!')
                         break
-                    print(range(len(object_list)))
+                    print(sorted(object_list))
                     number = input("What ID would you like to show? ")
                     object_list[int(number)].show_image()
                 else:
@@ -294,7 +509,19 @@ def main():
     Cam_init()
     # initialize Pan-Tilt mount
     global mount
-    mount = PanTilt.PT_Mount()
+    settle_model = None
+    if os.path.exists(SETTLE_FILE):
+        settle_model = PanTilt.Settle_Model.Load(SETTLE_FILE)
+    mount = PanTilt.PT_Mount(settle_model=settle_model)
+    if CALIBRATE_SETTLE:
+        Calibrate_Mount()
+    global controller
+    pixel_model = PanTilt.Pixel_Model.From_FOV(MODEL_SIZE,MODEL_SIZE)
+    if os.path.exists(PIXEL_FILE):
+        pixel_model = PanTilt.Pixel_Model.Load(PIXEL_FILE)
+    controller = PanTilt.Center_Controller(mount,pixel_model)
+    if CALIBRATE_PIXELS:
+        Calibrate_Centering()
     # initialize spectrometer
     PinRst = 13 # pin Reset (the number is based on GPIO.BOARD)
     PinReady = 15 # pin Ready (the number is based on GPIO.BOARD)
@@ -303,21 +530,21 @@ def main():
     nsp32 = NSP32(PinRst, PinReady, DataChannelEnum.Uart, uartPotName = '/dev/ttyTHS1')	# use UART channel
     global wavelength_info
     id, wavelength_info = nsp32_init()
-    global object_list
-    object_list = []
-    os.mkdir(SAVE_DIR)
-
-    with open(SAVE_DIR+'/wavelengths.csv','a+',newline='') as f_object:
-        writer_obj = writer(f_object)
-        writer_obj.writerow(wavelength_info.Wavelength)
-        f_object.close()
+    global nsp32_client
+    nsp32_client = NSP32Client(nsp32)
+    global spectrum_stream
+    spectrum_stream = SpectrumStream(nsp32_client,wavelength_info.NumOfPoints)
+    global exposure
+    exposure = ExposureController(spectrum_stream,integration_time=32,frame_avg=3,timeout=SPECTRUM_TIMEOUT)
+    # SAVE_DIR names this run's session, everything is saved next to it
+    Open_Store(os.path.dirname(SAVE_DIR)+'/'+STORE_FILE)
+    store.Set_Wavelengths(wavelength_info.Wavelength)
+    Open_Archive(os.path.dirname(SAVE_DIR)+'/'+ARCHIVE_DIR)
 
     global model
     # model = cv2.CascadeClassifier(MODEL_PATH)
     LABEL_FILENAME = 'annotations/labelmap.pbtxt'
 
-    MODEL_FILENAME = 'Models/ssd_mobilenet_v2_graph/frozen_inference_graph.pb'
-    
     NUM_CLASSES= 4 # WHITE, YELLOW, BUD, POD
     cv2.CAP_PROP_FRAME_WIDTH
 
@@ -326,40 +553,11 @@ def main():
     global category_index
     category_index = label_map_util.create_category_index(categories)
 
-    config = tf.ConfigProto()
-    config.gpu_options.allow_growth = True
-
-
-    detection_graph = tf.Graph()
-    with detection_graph.as_default():
-        od_graph_def = tf.GraphDef()
-        with tf.gfile.GFile(MODEL_FILENAME,'rb') as fid:
-            serialized_graph = fid.read()
-            od_graph_def.ParseFromString(serialized_graph)
-            tf.import_graph_def(od_graph_def, name='')
-        
-        model = tf.Session(graph=detection_graph, config=config)
-
-    # Input tensor is the image
-    global image_tensor
-    image_tensor = detection_graph.get_tensor_by_name('image_tensor:0')
-
-    # Output tensors are the detection boxes, scores, and classes
-    # Each box represents a part of the image where a particular object was detected
-    global detection_boxes
-    detection_boxes = detection_graph.get_tensor_by_name('detection_boxes:0')
-
-    # Each score represents level of confidence for each of the objects.
-    # The score is shown on the result image, together with the class label.
-    global detection_scores
-    detection_scores = detection_graph.get_tensor_by_name('detection_scores:0')
-    global detection_classes
-    detection_classes = detection_graph.get_tensor_by_name('detection_classes:0')
-
-    # Number of objects detected
-    global num_detections
-    num_detections = detection_graph.get_tensor_by_name('num_detections:0')
-    
+    # same outputs whichever backend runs the model, see Detector
+    # a running DetectorServer already has the model loaded, otherwise it is loaded here
+    model = DetectorServer.Connect(MODEL_PATH,BACKEND,num_threads=NUM_THREADS)
+    print('Loaded %s model in %.1f s' % (model.backend,model.load_time))
+
     Console_Loop()
     #if SCAN_MODE == 0:
      #   Console_Loop()
@@ -376,7 +574,14 @@ if __name__ == "__main__":
     ap.add_argument('-hs', '--horizontal_start', type=float, help = 'horizontal start position for scans')
     ap.add_argument('-ve','--vertical_end',type=float, help = 'vertical end position for scans')
     ap.add_argument('-he', '--horizontal_end', type=float, help='Horizontal end position for scan')
-    ap.add_argument('-md', '--model', type = str, help = 'path to object detection model')
+    ap.add_argument('-md', '--model', type = str, help = 'path to object detection model (.pb, .tflite or .onnx)')
+    ap.add_argument('-bk', '--backend', type = str, choices = sorted(Detector.BACKENDS), help = 'detector backend, picked from the model extension by default')
+    ap.add_argument('-nt', '--num_threads', type = int, help = 'CPU threads the detector runs on')
+    ap.add_argument('-nf', '--num_frames', type = int, help = 'number of frames inferred as one batch per position')
+    ap.add_argument('-ad', '--adaptive', action = 'store_true', help = 'sweep a coarse grid first and only fully check around candidates')
+    ap.add_argument('-cs', '--calibrate_settle', action = 'store_true', help = 'measure how long the mount takes to settle after moves')
+    ap.add_argument('-cp', '--calibrate_pixels', action = 'store_true', help = 'measure how far the image moves per duty cycle step for centering')
+    ap.add_argument('-cf', '--center_frames', type = int, help = 'most frames spent centering a candidate, 0 turns centering off')
 
     # ... add more as needed
     ap.add_argument('arg', nargs='*')
@@ -0,0 +1,115 @@
+# Integration time control for the NSP32 spectrum readings taken by the scanner.
+# A fixed integration time either saturates on bright objects (the reading is
+# useless and the object has to be rescanned) or wastes dynamic range on dark
+# ones. ExposureController picks the integration time per reading:
+#   - it starts from the last good integration time cached for the same pan-tilt
+#     cell and lighting condition, so repeat scans usually need one acquisition
+#   - while the reading is saturated it binary searches between the longest
+#     unsaturated and the shortest saturated integration time seen
+#   - when the reading is unsaturated but far below the saturation level it
+#     predicts the integration time from the peak, since the sensor response is
+#     linear in integration time
+# The saturation level itself is learned from pairs of saturated/unsaturated
+# readings, until then any unsaturated reading is accepted.
+
+import time
+
+
+class ExposureController:
+
+    def __init__(self, stream, integration_time=32, frame_avg=3, min_time=1, max_time=500,
+                 target_fill=0.7, min_fill=0.25, max_tries=6, timeout=5):
+        # stream: NSP32Client.SpectrumStream the readings are taken from
+        # target_fill: fraction of the saturation level the peak should reach
+        # min_fill: readings with a peak below this fraction are retaken longer
+        self.stream = stream
+        self.default_time = integration_time
+        self.frame_avg = frame_avg
+        self.min_time = min_time
+        self.max_time = max_time
+        self.target_fill = target_fill
+        self.min_fill = min_fill
+        self.max_tries = max_tries
+        self.timeout = timeout
+        self.saturation_level = None # peak value where the sensor saturates (learned)
+        self.cache = {} # (cell, lighting) -> last good integration time
+        self.acquisitions = 0
+        self.readings = 0
+
+    def Cell_Key(self, cell):
+        # pan-tilt positions are floats, cells closer than the step size share an entry
+        return (round(cell[0], 2), round(cell[1], 2))
+
+    def Start_Time(self, cell, lighting):
+        key = (self.Cell_Key(cell), lighting)
+        if key in self.cache:
+            return self.cache[key]
+        # a different cell under the same lighting is the next best guess
+        same_light = [t for (c, l), t in self.cache.items() if l == lighting]
+        if same_light:
+            return same_light[-1]
+        return self.default_time
+
+    def Acquire(self, cell, lighting=None):
+        # returns the SpectrumSamples of the best reading for the cell
+        integration_time = self.Start_Time(cell, lighting)
+        lo, hi = None, None # longest unsaturated / shortest saturated integration time
+        best = None
+        for attempt in range(self.max_tries):
+            samples = self._Read(integration_time)
+            peak = float(samples.spectra[-1].max())
+            if samples.saturated[-1]:
+                hi = integration_time
+                if lo is not None and best is not None:
+                    self._Learn_Saturation(best, integration_time)
+                if integration_time <= self.min_time:
+                    break # nothing shorter to try
+                low = lo if lo is not None else self.min_time - 1
+                integration_time = max(self.min_time, (low + hi) // 2)
+                if integration_time == lo:
+                    break # the search converged, keep the best unsaturated reading
+                continue
+            lo = integration_time
+            best = samples
+            if hi is not None:
+                self._Learn_Saturation(best, hi)
+            if self.saturation_level is None or peak >= self.min_fill * self.saturation_level:
+                break # usable and not too dark
+            if integration_time >= self.max_time or peak <= 0:
+                break
+            # linear response: scale the integration time to reach the target fill
+            predicted = int(integration_time * self.target_fill * self.saturation_level / peak)
+            ceiling = self.max_time if hi is None else hi - 1
+            predicted = min(predicted, ceiling)
+            if predicted <= integration_time:
+                break
+            integration_time = predicted
+        self.readings += 1
+        # if even the shortest integration time saturates, return what we have
+        result = best if best is not None else samples
+        self.cache[(self.Cell_Key(cell), lighting)] = int(result.integrationTimes[-1])
+        return result
+
+    def Report(self):
+        if self.readings == 0:
+            return 'no spectrum readings'
+        return 'spectrum readings: %d  acquisitions: %d  (%.2f per reading)' % (
+            self.readings, self.acquisitions, self.acquisitions / self.readings)
+
+    def _Read(self, integration_time):
+        self.stream.SetSettings(integration_time, self.frame_avg, False)
+        # the acquisition running right now still uses the old settings, so
+        # wait for one that started after the change
+        samples = self.stream.WaitNewerThan(time.time(), timeout=self.timeout)
+        if samples is None:
+            raise TimeoutError('No spectrum within %d s' % self.timeout)
+        self.acquisitions += 1
+        return samples
+
+    def _Learn_Saturation(self, unsaturated, saturated_time):
+        # the peak of an unsaturated reading scaled to the saturating integration
+        # time is an upper bound on the saturation level, keep the tightest one
+        peak = float(unsaturated.spectra[-1].max())
+        bound = peak * saturated_time / float(unsaturated.integrationTimes[-1])
+        if self.saturation_level is None or bound < self.saturation_level:
+            self.saturation_level = bound
@@ -29,6 +29,7 @@ from matplotlib import style
 style.use("ggplot")
 import matplotlib.animation as animation
 from NanoLambdaNSP32 import *
+from NSP32Client import NSP32Client, SpectrumStream
 
 """A GUI program to visualize the spectrum measured by NSP32"""
 
@@ -72,6 +73,9 @@ class SpectrumMeter:
 		self._lblCieY = None
 		self._lblCieZ = None
 
+		self._client = None					# event driven client, created once NSP32 is initialized
+		self._stream = None					# spectrum acquisition stream (shared by everything reading spectra)
+
 		self._wavelength = None				# wavelength data
 		self._stopSpectrum = False			# stop spectrum acquisition and discard return packets
 		self._curAppMode = SpectrumMeter._AppRunModeEnum.Disconnected	# current app mode
@@ -138,7 +142,12 @@ class SpectrumMeter:
 
 		# get wavelength
 		self._nsp32.GetWavelength(0)
-		self._wavelength = self._nsp32.GetReturnPacket().ExtractWavelengthInfo().Wavelength
+		wavelengthInfo = self._nsp32.GetReturnPacket().ExtractWavelengthInfo()
+		self._wavelength = wavelengthInfo.Wavelength
+
+		# acquisitions go through the client and its stream from now on
+		self._client = NSP32Client(self._nsp32)
+		self._stream = SpectrumStream(self._client, wavelengthInfo.NumOfPoints)
 				
 		# set GUI
 		self._SetGuiByAppMode(SpectrumMeter._AppRunModeEnum.Connected)
@@ -197,44 +206,50 @@ class SpectrumMeter:
 
 		self._lblIntegrationTime.configure(style = 'Red.TLabel' if isSaturated else 'TLabel')
 
+	def _GetAcqSettings(self):
+		"""get the acquisition settings selected on the UI
+
+		Returns:
+			tuple: integration time, frame avg num, AE enabled
+
+		"""
+
+		return int(self._varSelectedIntegrationTime.get()), int(self._varSelectedFrameAvgNum.get()), self._varEnableAEChecked.get() == 1
+
 	def _AcqSpectrum(self):
-		"""start spectrum acquisition"""
+		"""show the spectra coming from the acquisition stream"""
+
+		lastTimestamp = time.time()
 
 		while(not self._stopSpectrum) :
-			# record the single command round trip start time
-			roundTripTimeStart = time.time()
+			# apply the settings selected on the UI from the next acquisition on
+			self._stream.SetSettings(*self._GetAcqSettings())
 
-			# start acquisition
-			self._nsp32.AcqSpectrum(0, int(self._varSelectedIntegrationTime.get()), int(self._varSelectedFrameAvgNum.get()), self._varEnableAEChecked.get() == 1)
+			# wait for the next spectrum (the stream keeps acquiring in the background)
+			samples = self._stream.WaitNewerThan(lastTimestamp, timeout = 0.5)
 
-			# wait for acquisition done
-			while self._nsp32.GetReturnPacketSize() <= 0 :
-				if self._stopSpectrum :
-					return
-			
-				self._nsp32.UpdateStatus()	# call UpdateStatus() to check async result
+			if samples is None or self._stopSpectrum :
+				continue
 
-			# calculate the round trip time and display
-			elapsedTime = time.time() - roundTripTimeStart
-			self._lblRoundTripTime['text'] = int(elapsedTime * 1000)
+			# calculate the round trip time (time between two spectra) and display
+			self._lblRoundTripTime['text'] = int((samples.timestamps[-1] - lastTimestamp) * 1000)
+			lastTimestamp = samples.timestamps[-1]
 			
 			# update spectrum data to plot data series
-			info = self._nsp32.GetReturnPacket().ExtractSpectrumInfo()
-
 			self._plotDataX = self._wavelength
-			self._plotDataY = info.Spectrum
+			self._plotDataY = samples.spectra[-1]
 			
 			# if AE is enabled, let the OptionMenu auto select the found integration time
 			if self._varEnableAEChecked.get() == 1 :
-				self._varSelectedIntegrationTime.set(str(info.IntegrationTime))
+				self._varSelectedIntegrationTime.set(str(samples.integrationTimes[-1]))
 
 			# update saturation status
-			self._UpdateSaturationStatus(info.IsSaturated)
+			self._UpdateSaturationStatus(bool(samples.saturated[-1]))
 
 			# display XYZ
-			self._lblCieX['text'] = round(info.X, 2)
-			self._lblCieY['text'] = round(info.Y, 2)
-			self._lblCieZ['text'] = round(info.Z, 2)
+			self._lblCieX['text'] = round(float(samples.xyz[-1][0]), 2)
+			self._lblCieY['text'] = round(float(samples.xyz[-1][1]), 2)
+			self._lblCieZ['text'] = round(float(samples.xyz[-1][2]), 2)
 
 	def _BtnCmdSpectrumClicked(self):
 		"""'Start/Stop Spectrum' button click event handler"""
@@ -242,13 +257,16 @@ class SpectrumMeter:
 		if self._curAppMode == SpectrumMeter._AppRunModeEnum.Spectrum :
 			# stop spectrum acquisition
 			self._stopSpectrum = True
+			self._stream.Stop()
 			self._SetGuiByAppMode(SpectrumMeter._AppRunModeEnum.Connected)
 		else :
 			# start spectrum acquisition
 			self._SetGuiByAppMode(SpectrumMeter._AppRunModeEnum.Spectrum)
 			self._stopSpectrum = False
 
-			# start spectrum acquisition thread
+			# start the acquisition stream and the thread showing its spectra
+			self._stream.Start(*self._GetAcqSettings())
+
 			thread = threading.Thread(target = self._AcqSpectrum)
 			thread.daemon = True
 			thread.start()
@@ -0,0 +1,172 @@
+# Tracking by detection. The detector only runs every detect_every frames (or
+# sooner when the followed target loses its features), in between the boxes are moved with
+# pyramidal Lucas-Kanade optical flow on a few corner points per box, which
+# costs a fraction of a detection. Detections are matched to the tracks by IoU
+# so a target keeps its id from one detection to the next, and Target() keeps
+# returning the same track for the controller to follow until it is lost.
+# LK flow is in every OpenCV build, KCF would need opencv-contrib.
+# Boxes are (x, y, w, h) in pixels, like detectMultiScale returns them.
+
+import cv2
+import numpy as np
+
+LK_PARAMS = dict(winSize=(15, 15), maxLevel=2,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+FB_THRESH = 1.0 # pixels a point may miss its start when tracked forward and back
+MIN_POINTS = 4 # fewer good points and the track needs a detection
+
+
+def IoU(a, b):
+    # [N, 4] and [M, 4] (x, y, w, h) boxes -> [N, M] intersection over union
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(1, -1, 4)
+    w = np.clip(np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    h = np.clip(np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = w * h
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+class Track:
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = np.array(box, dtype=np.float32)[:4] # x, y, w, h
+        self.points = None # [P, 1, 2] float32 corners followed by the flow
+        self.seeded = 0 # number of points the last detection gave it
+        self.confidence = 0.0 # fraction of those points still tracked
+        self.hits = 1 # detections matched to the track
+        self.misses = 0 # detections in a row that missed it
+
+    def Center(self):
+        return self.box[0] + self.box[2] / 2, self.box[1] + self.box[3] / 2
+
+
+class Tracker:
+
+    def __init__(self, detect, detect_every=5, min_confidence=0.5, iou_thresh=0.3, max_misses=2, max_points=30):
+        # detect(frame) returns the (x, y, w, h) boxes of the targets in frame
+        self.detect = detect
+        self.detect_every = max(1, detect_every)
+        self.min_confidence = min_confidence
+        self.iou_thresh = iou_thresh
+        self.max_misses = max_misses
+        self.max_points = max_points
+        self.tracks = []
+        self.target_id = None
+        self.next_id = 0
+        self.prev_gray = None
+        self.frames = 0
+        self.detections = 0
+
+    def Update(self, frame):
+        # moves the tracks to frame, running the detector when it is due, returns the tracks
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if self.prev_gray is not None and self.tracks:
+            self._Flow(gray)
+        due = self.frames % self.detect_every == 0
+        # only the followed target losing its points forces an early detection,
+        # a track that never had enough corners (seeded == 0, e.g. a low texture
+        # face) waits for the next scheduled one instead of forcing one per frame
+        lost = any(track.id == self.target_id and track.seeded > 0 and track.confidence < self.min_confidence
+                   for track in self.tracks)
+        if due or lost or not self.tracks:
+            self._Detect(frame, gray)
+        self.prev_gray = gray
+        self.frames += 1
+        return self.tracks
+
+    def Target(self):
+        # the track being followed, the largest one when the last target got lost
+        for track in self.tracks:
+            if track.id == self.target_id:
+                return track
+        if not self.tracks:
+            self.target_id = None
+            return None
+        track = max(self.tracks, key=lambda t: t.box[2] * t.box[3])
+        self.target_id = track.id
+        return track
+
+    def _Seed(self, track, gray):
+        # corners inside the middle of the box, the edges are mostly background
+        x, y, w, h = track.box
+        mask = np.zeros_like(gray)
+        x0, y0 = int(max(0, x + 0.1 * w)), int(max(0, y + 0.1 * h))
+        x1, y1 = int(min(gray.shape[1], x + 0.9 * w)), int(min(gray.shape[0], y + 0.9 * h))
+        mask[y0:y1, x0:x1] = 255
+        points = None
+        if x1 > x0 and y1 > y0:
+            points = cv2.goodFeaturesToTrack(gray, maxCorners=self.max_points, qualityLevel=0.01, minDistance=3, mask=mask)
+        if points is None or len(points) < MIN_POINTS:
+            track.points, track.seeded, track.confidence = None, 0, 0.0
+        else:
+            track.points, track.seeded, track.confidence = points.astype(np.float32), len(points), 1.0
+
+    def _Flow(self, gray):
+        # all tracks' points in one LK call forward and one back, points that
+        # do not come back to where they started are dropped
+        tracked = [track for track in self.tracks if track.points is not None]
+        if not tracked:
+            return
+        points = np.concatenate([track.points for track in tracked])
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, points, None, **LK_PARAMS)
+        back, status_back, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, moved, None, **LK_PARAMS)
+        error = np.abs(points - back).reshape(-1, 2).max(axis=1)
+        good = (status.ravel() == 1) & (status_back.ravel() == 1) & (error < FB_THRESH)
+        start = 0
+        for track in tracked:
+            end = start + len(track.points)
+            keep = good[start:end]
+            old = points[start:end][keep].reshape(-1, 2)
+            new = moved[start:end][keep].reshape(-1, 2)
+            start = end
+            track.confidence = len(new) / float(track.seeded)
+            if len(new) < MIN_POINTS:
+                track.points, track.confidence = None, 0.0
+                continue
+            # median shift, and scale from how far the points spread around their median
+            shift = np.median(new - old, axis=0)
+            spread_old = np.median(np.abs(old - np.median(old, axis=0)))
+            spread_new = np.median(np.abs(new - np.median(new, axis=0)))
+            scale = spread_new / spread_old if spread_old > 1e-3 else 1.0
+            scale = float(np.clip(scale, 0.8, 1.25))
+            cx, cy = track.Center()
+            w, h = track.box[2] * scale, track.box[3] * scale
+            track.box = np.array([cx + shift[0] - w / 2, cy + shift[1] - h / 2, w, h], dtype=np.float32)
+            track.points = new.reshape(-1, 1, 2)
+
+    def _Detect(self, frame, gray):
+        # greedy IoU matching of the detections to the tracks, best pairs first
+        self.detections += 1
+        boxes = np.asarray(self.detect(frame), dtype=np.float32).reshape(-1, 4)
+        matched_tracks, matched_boxes = set(), set()
+        if self.tracks and len(boxes):
+            overlap = IoU([track.box for track in self.tracks], boxes)
+            for index in np.argsort(-overlap, axis=None):
+                i, j = np.unravel_index(index, overlap.shape)
+                if overlap[i, j] < self.iou_thresh:
+                    break
+                if i in matched_tracks or j in matched_boxes:
+                    continue
+                matched_tracks.add(i)
+                matched_boxes.add(j)
+                track = self.tracks[i]
+                track.box = boxes[j].copy()
+                track.hits += 1
+                track.misses = 0
+                self._Seed(track, gray)
+        kept = []
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            kept.append(track)
+        for j, box in enumerate(boxes):
+            if j not in matched_boxes:
+                track = Track(self.next_id, box)
+                self.next_id += 1
+                self._Seed(track, gray)
+                kept.append(track)
+        self.tracks = kept
@@ -22,10 +22,13 @@ Detection configuration framework, they should define their own builder function
 that wraps the build function.
 """
 import functools
+import numpy as np
 import tensorflow as tf
 
+from object_detection.core import standard_fields as fields
 from object_detection.data_decoders import tf_example_decoder
 from object_detection.protos import input_reader_pb2
+from object_detection.utils import training_cache
 
 
 def make_initializable_iterator(dataset):
@@ -83,12 +86,86 @@ def read_dataset(file_read_func, input_files, config):
   return records_dataset
 
 
+def read_cached_dataset(cache_dirs, config):
+  """Reads training caches, and handles repetition and shuffling.
+
+  The images in a training cache are already decoded and resized, reading an
+  example is a copy out of the memory mapped cache instead of a JPEG decode.
+  Only the example indices go through the shuffle buffer, so the whole cache
+  is shuffled whatever `shuffle_buffer_size` is.
+
+  Args:
+    cache_dirs: A list of training cache directories, see
+      utils/training_cache.py.
+    config: A input_reader_builder.InputReader object.
+
+  Returns:
+    A tuple (dataset, decode_fn). dataset is a tf.data.Dataset of int64
+    example indices, and decode_fn maps an index to a tensor dictionary with
+    the fields TfExampleDecoder.decode returns for boxes and classes.
+
+  Raises:
+    ValueError: If instance masks or additional channels are requested, a
+      training cache holds neither.
+    ValueError: If the caches hold no examples.
+  """
+  if config.load_instance_masks or config.num_additional_channels:
+    raise ValueError('Training caches hold no instance masks or additional '
+                     'channels.')
+  caches = [training_cache.TrainingCache(cache_dir)
+            for cache_dir in cache_dirs]
+  offsets = np.cumsum([0] + [len(cache) for cache in caches])
+  num_examples = int(offsets[-1])
+  if not num_examples:
+    raise ValueError('The training caches %s hold no examples.' % cache_dirs)
+
+  def load_example(index):
+    cache_index = np.searchsorted(offsets, index, side='right') - 1
+    return caches[cache_index].get(index - offsets[cache_index])
+
+  def decode_fn(index):
+    """Looks up an example in the caches."""
+    (image, boxes, classes, weights, difficult, source_id,
+     filename) = tf.py_func(
+         load_example, [index],
+         [tf.uint8, tf.float32, tf.int64, tf.float32, tf.bool, tf.string,
+          tf.string],
+         stateful=False)
+    image.set_shape([None, None, 3])
+    boxes.set_shape([None, 4])
+    for tensor in (classes, weights, difficult):
+      tensor.set_shape([None])
+    source_id.set_shape([])
+    filename.set_shape([])
+    return {
+        fields.InputDataFields.image: image,
+        fields.InputDataFields.original_image_spatial_shape:
+            tf.shape(image)[:2],
+        fields.InputDataFields.source_id: source_id,
+        fields.InputDataFields.filename: filename,
+        fields.InputDataFields.groundtruth_boxes: boxes,
+        fields.InputDataFields.groundtruth_classes: classes,
+        fields.InputDataFields.groundtruth_weights: weights,
+        fields.InputDataFields.groundtruth_difficult: difficult,
+    }
+
+  dataset = tf.data.Dataset.range(num_examples)
+  if config.shuffle:
+    dataset = dataset.shuffle(num_examples)
+  dataset = dataset.repeat(config.num_epochs or None)
+  return dataset, decode_fn
+
+
 def build(input_reader_config, batch_size=None, transform_input_data_fn=None):
   """Builds a tf.data.Dataset.
 
   Builds a tf.data.Dataset by applying the `transform_input_data_fn` on all
   records. Applies a padded batch to the resulting dataset.
 
+  When every `input_path` of the tf_record_input_reader is a training cache
+  directory (see dataset_tools/create_training_cache.py) the examples are read
+  from the memory mapped caches instead of decoded from TFRecords.
+
   Args:
     input_reader_config: A input_reader_pb2.InputReader object.
     batch_size: Batch size. If batch size is None, no batching is performed.
@@ -112,26 +189,34 @@ def build(input_reader_config, batch_size=None, transform_input_data_fn=None):
       raise ValueError('At least one input path must be specified in '
                        '`input_reader_config`.')
 
-    label_map_proto_file = None
-    if input_reader_config.HasField('label_map_path'):
-      label_map_proto_file = input_reader_config.label_map_path
-    decoder = tf_example_decoder.TfExampleDecoder(
-        load_instance_masks=input_reader_config.load_instance_masks,
-        instance_mask_type=input_reader_config.mask_type,
-        label_map_proto_file=label_map_proto_file,
-        use_display_name=input_reader_config.use_display_name,
-        num_additional_channels=input_reader_config.num_additional_channels)
+    if all(training_cache.is_training_cache(path)
+           for path in config.input_path):
+      # The cache holds the class ids, the label map was applied building it.
+      dataset, decode_fn = read_cached_dataset(config.input_path[:],
+                                               input_reader_config)
+    else:
+      label_map_proto_file = None
+      if input_reader_config.HasField('label_map_path'):
+        label_map_proto_file = input_reader_config.label_map_path
+      decoder = tf_example_decoder.TfExampleDecoder(
+          load_instance_masks=input_reader_config.load_instance_masks,
+          instance_mask_type=input_reader_config.mask_type,
+          label_map_proto_file=label_map_proto_file,
+          use_display_name=input_reader_config.use_display_name,
+          num_additional_channels=input_reader_config.num_additional_channels)
+      decode_fn = decoder.decode
+      dataset = read_dataset(
+          functools.partial(tf.data.TFRecordDataset,
+                            buffer_size=8 * 1000 * 1000),
+          config.input_path[:], input_reader_config)
 
     def process_fn(value):
       """Sets up tf graph that decodes, transforms and pads input data."""
-      processed_tensors = decoder.decode(value)
+      processed_tensors = decode_fn(value)
       if transform_input_data_fn is not None:
         processed_tensors = transform_input_data_fn(processed_tensors)
       return processed_tensors
 
-    dataset = read_dataset(
-        functools.partial(tf.data.TFRecordDataset, buffer_size=8 * 1000 * 1000),
-        config.input_path[:], input_reader_config)
     if input_reader_config.sample_1_of_n_examples > 1:
       dataset = dataset.shard(input_reader_config.sample_1_of_n_examples, 0)
     # TODO(rathodv): make batch size a required argument once the old binaries
@@ -24,6 +24,7 @@ from object_detection.builders import dataset_builder
 from object_detection.core import standard_fields as fields
 from object_detection.protos import input_reader_pb2
 from object_detection.utils import dataset_util
+from object_detection.utils import training_cache
 
 
 class DatasetBuilderTest(tf.test.TestCase):
@@ -240,6 +241,63 @@ class DatasetBuilderTest(tf.test.TestCase):
       output_dict = sess.run(tensor_dict)
       self.assertEquals(['2'], output_dict[fields.InputDataFields.source_id])
 
+  def create_training_cache(self, num_examples=2):
+    cache_dir = os.path.join(self.get_temp_dir(), 'cache')
+    writer = training_cache.TrainingCacheWriter(cache_dir, image_size=(4, 5))
+    for i in range(num_examples):
+      writer.add(np.full((4, 5, 3), i, dtype=np.uint8),
+                 boxes=[[0.0, 0.0, 1.0, 1.0], [0.25, 0.25, 0.5, 0.5]][:i + 1],
+                 classes=[2, 1][:i + 1], source_id=str(i))
+    writer.close()
+    return cache_dir
+
+  def test_build_cached_input_reader(self):
+    cache_dir = self.create_training_cache()
+
+    input_reader_text_proto = """
+      shuffle: false
+      num_readers: 1
+      tf_record_input_reader {{
+        input_path: '{0}'
+      }}
+    """.format(cache_dir)
+    input_reader_proto = input_reader_pb2.InputReader()
+    text_format.Merge(input_reader_text_proto, input_reader_proto)
+    tensor_dict = dataset_builder.make_initializable_iterator(
+        dataset_builder.build(input_reader_proto, batch_size=1)).get_next()
+
+    with tf.train.MonitoredSession() as sess:
+      output_dict = sess.run(tensor_dict)
+      self.assertAllEqual(np.zeros((1, 4, 5, 3), dtype=np.uint8),
+                          output_dict[fields.InputDataFields.image])
+      self.assertAllEqual([[2]], output_dict[
+          fields.InputDataFields.groundtruth_classes])
+      self.assertAllEqual([[[0.0, 0.0, 1.0, 1.0]]], output_dict[
+          fields.InputDataFields.groundtruth_boxes])
+      self.assertAllEqual([[1.0]], output_dict[
+          fields.InputDataFields.groundtruth_weights])
+      self.assertAllEqual(['0'], output_dict[fields.InputDataFields.source_id])
+      output_dict = sess.run(tensor_dict)
+      self.assertAllEqual([1, 2], output_dict[
+          fields.InputDataFields.groundtruth_classes].shape)
+      self.assertAllEqual(['1'], output_dict[fields.InputDataFields.source_id])
+
+  def test_cached_input_reader_raises_error_with_instance_masks(self):
+    cache_dir = self.create_training_cache()
+
+    input_reader_text_proto = """
+      shuffle: false
+      num_readers: 1
+      load_instance_masks: true
+      tf_record_input_reader {{
+        input_path: '{0}'
+      }}
+    """.format(cache_dir)
+    input_reader_proto = input_reader_pb2.InputReader()
+    text_format.Merge(input_reader_text_proto, input_reader_proto)
+    with self.assertRaises(ValueError):
+      dataset_builder.build(input_reader_proto, batch_size=1)
+
 
 class ReadDatasetTest(tf.test.TestCase):
 
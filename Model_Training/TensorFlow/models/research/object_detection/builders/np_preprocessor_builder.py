@@ -0,0 +1,66 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Builder for the batched NumPy preprocessing steps of np_preprocessor."""
+
+import functools
+
+from object_detection.builders import preprocessor_builder
+from object_detection.core import np_preprocessor
+
+
+def build(preprocessor_step_config):
+  """Builds a NumPy preprocessing step based on the configuration.
+
+  The arguments are the ones preprocessor_builder builds for the TF step, so a
+  data_augmentation_options entry means the same thing in both.
+
+  Args:
+    preprocessor_step_config: PreprocessingStep configuration proto.
+
+  Returns:
+    function, argmap: A np_preprocessor function and an argument map to call
+                      it with.
+
+  Raises:
+    ValueError: If the step has no NumPy implementation.
+  """
+  step_type = preprocessor_step_config.WhichOneof('preprocessing_step')
+  if step_type not in np_preprocessor.PREPROCESSING_FUNCTION_MAP:
+    raise ValueError('Preprocessing step %s has no NumPy implementation.' %
+                     step_type)
+  _, function_args = preprocessor_builder.build(preprocessor_step_config)
+  return (np_preprocessor.PREPROCESSING_FUNCTION_MAP[step_type],
+          function_args)
+
+
+def build_preprocess_fn(preprocessor_step_configs, seed=None):
+  """Builds a function augmenting batches with a list of steps.
+
+  Args:
+    preprocessor_step_configs: list of PreprocessingStep configuration protos,
+      e.g. train_config.data_augmentation_options.
+    seed: optional int. With a seed the sequence of augmented batches is the
+      same on every run.
+
+  Returns:
+    A function taking a batch dictionary (see np_preprocessor) and returning
+    the augmented batch.
+  """
+  preprocess_options = [build(step) for step in preprocessor_step_configs]
+  return functools.partial(
+      np_preprocessor.preprocess,
+      preprocess_options=preprocess_options,
+      seed=np_preprocessor.get_random_state(seed))
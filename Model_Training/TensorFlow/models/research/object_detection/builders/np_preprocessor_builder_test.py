@@ -0,0 +1,79 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for np_preprocessor_builder."""
+
+import numpy as np
+import tensorflow as tf
+
+from google.protobuf import text_format
+
+from object_detection.builders import np_preprocessor_builder
+from object_detection.core import np_preprocessor
+from object_detection.core import standard_fields as fields
+from object_detection.protos import preprocessor_pb2
+
+
+def _step(text_proto):
+  step = preprocessor_pb2.PreprocessingStep()
+  text_format.Merge(text_proto, step)
+  return step
+
+
+class NpPreprocessorBuilderTest(tf.test.TestCase):
+
+  def test_build_random_adjust_brightness(self):
+    function, args = np_preprocessor_builder.build(_step("""
+    random_adjust_brightness {
+      max_delta: 0.2
+    }
+    """))
+    self.assertEqual(function, np_preprocessor.random_adjust_brightness)
+    self.assertEqual(list(args.keys()), ['max_delta'])
+    self.assertAlmostEqual(args['max_delta'], 0.2)
+
+  def test_build_ssd_random_crop(self):
+    function, _ = np_preprocessor_builder.build(_step("""
+    ssd_random_crop {
+    }
+    """))
+    self.assertEqual(function, np_preprocessor.ssd_random_crop)
+
+  def test_build_unsupported_step(self):
+    with self.assertRaises(ValueError):
+      np_preprocessor_builder.build(_step("""
+      random_pad_image {
+      }
+      """))
+
+  def test_build_preprocess_fn(self):
+    steps = [_step('random_horizontal_flip {}'),
+             _step('ssd_random_crop {}')]
+    batch = {
+        fields.InputDataFields.image: np.random.uniform(
+            0, 255, size=(2, 8, 8, 3)).astype(np.float32),
+        fields.InputDataFields.groundtruth_boxes: np.array(
+            [[[0.2, 0.2, 0.8, 0.8]]] * 2, dtype=np.float32),
+    }
+    first = np_preprocessor_builder.build_preprocess_fn(steps, seed=3)(batch)
+    second = np_preprocessor_builder.build_preprocess_fn(steps, seed=3)(batch)
+    self.assertAllEqual(first[fields.InputDataFields.image],
+                        second[fields.InputDataFields.image])
+    self.assertAllEqual([2, 8, 8, 3],
+                        first[fields.InputDataFields.image].shape)
+
+
+if __name__ == '__main__':
+  tf.test.main()
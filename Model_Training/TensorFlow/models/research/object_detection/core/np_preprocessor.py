@@ -0,0 +1,594 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Batched NumPy implementation of the data augmentation options.
+
+core/preprocessor.py augments one image at a time in the TF graph. The
+functions here apply the same options to a whole batch at once with NumPy: the
+random values of all the examples are drawn in one call and the images and
+boxes of the batch are transformed together.
+
+A batch is a dictionary keyed by fields.InputDataFields with
+  image: float32 [batch_size, height, width, 3] with values in [0, 255].
+  groundtruth_boxes: float32 [batch_size, max_num_boxes, 4] normalized
+    [ymin, xmin, ymax, xmax] boxes, padded with zeros.
+  num_groundtruth_boxes: int32 [batch_size] number of boxes of each example.
+  groundtruth_classes, groundtruth_weights, ... (optional): [batch_size,
+    max_num_boxes, ...] per box fields, kept in step with the boxes.
+All the images of a batch have the same size, crops are resized back to it.
+
+Every function takes the batch, a np.random.RandomState and the arguments
+preprocessor_builder builds for the option, and returns the batch. Passing
+preprocess a seed (or the same RandomState) makes it deterministic.
+Keypoints and instance masks are not supported.
+"""
+
+import numpy as np
+
+from object_detection.core import standard_fields as fields
+
+# Per box fields, reordered and truncated together with the boxes.
+BOX_FIELDS = (
+    fields.InputDataFields.groundtruth_boxes,
+    fields.InputDataFields.groundtruth_classes,
+    fields.InputDataFields.groundtruth_weights,
+    fields.InputDataFields.groundtruth_confidences,
+    fields.InputDataFields.groundtruth_difficult,
+    fields.InputDataFields.groundtruth_group_of,
+    fields.InputDataFields.groundtruth_is_crowd,
+    fields.InputDataFields.groundtruth_area,
+)
+
+_GRAY_WEIGHTS = np.array([0.2989, 0.5870, 0.1140], dtype=np.float32)
+
+
+def get_random_state(seed=None):
+  """Returns a np.random.RandomState for seed.
+
+  Args:
+    seed: an int seed, a np.random.RandomState (returned as is) or None for a
+      randomly seeded one.
+  """
+  if isinstance(seed, np.random.RandomState):
+    return seed
+  return np.random.RandomState(seed)
+
+
+def _num_boxes(batch):
+  return batch[fields.InputDataFields.num_groundtruth_boxes]
+
+
+def _valid_boxes(batch):
+  """Returns a bool [batch_size, max_num_boxes] mask of the real boxes."""
+  boxes = batch[fields.InputDataFields.groundtruth_boxes]
+  return np.arange(boxes.shape[1])[np.newaxis, :] < _num_boxes(batch)[:, None]
+
+
+def _update_boxes(batch, rows, new_boxes):
+  """Sets the boxes of the examples in rows, leaving the padding untouched."""
+  boxes = batch[fields.InputDataFields.groundtruth_boxes]
+  valid = _valid_boxes(batch)[rows]
+  boxes[rows] = np.where(valid[..., np.newaxis], new_boxes, boxes[rows])
+
+
+def _keep_boxes(batch, keep):
+  """Keeps the boxes where keep is True, moved to the front of each example.
+
+  Args:
+    batch: the batch dictionary.
+    keep: bool [batch_size, max_num_boxes] array.
+  """
+  keep = keep & _valid_boxes(batch)
+  # A stable sort puts the kept boxes first, in their original order.
+  order = np.argsort(~keep, axis=1, kind='mergesort')
+  num_kept = keep.sum(axis=1)
+  tail = np.arange(keep.shape[1])[np.newaxis, :] >= num_kept[:, np.newaxis]
+  for key in BOX_FIELDS:
+    if key not in batch:
+      continue
+    values = batch[key]
+    index = order.reshape(order.shape + (1,) * (values.ndim - 2))
+    values = np.take_along_axis(values, index, axis=1)
+    values[tail] = 0
+    batch[key] = values
+  batch[fields.InputDataFields.num_groundtruth_boxes] = num_kept.astype(
+      np.int32)
+
+
+def _rgb_to_hsv(rgb):
+  r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+  maxc = rgb.max(axis=-1)
+  delta = maxc - rgb.min(axis=-1)
+  s = np.where(maxc > 0, delta / np.maximum(maxc, 1e-12), 0.0)
+  safe_delta = np.maximum(delta, 1e-12)
+  rc = (maxc - r) / safe_delta
+  gc = (maxc - g) / safe_delta
+  bc = (maxc - b) / safe_delta
+  h = np.where(r == maxc, bc - gc,
+               np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+  h = np.where(delta > 0, (h / 6.0) % 1.0, 0.0)
+  return h, s, maxc
+
+
+def _hsv_to_rgb(h, s, v):
+  i = np.floor(h * 6.0)
+  f = h * 6.0 - i
+  i = i.astype(np.int32) % 6
+  p = v * (1.0 - s)
+  q = v * (1.0 - s * f)
+  t = v * (1.0 - s * (1.0 - f))
+  r = np.choose(i, [v, q, p, p, t, v])
+  g = np.choose(i, [t, v, v, q, p, p])
+  b = np.choose(i, [p, p, t, v, v, q])
+  return np.stack([r, g, b], axis=-1).astype(np.float32)
+
+
+def _resample(images, windows, height, width):
+  """Crops windows out of images and resizes them bilinearly.
+
+  Args:
+    images: float32 [n, image_height, image_width, channels] array.
+    windows: [n, 4] normalized [ymin, xmin, ymax, xmax] windows.
+    height: output height.
+    width: output width.
+
+  Returns:
+    float32 [n, height, width, channels] array.
+  """
+  image_height, image_width = images.shape[1:3]
+
+  def sample_points(start, size, num_points, image_size):
+    # Pixel centers of the output in input pixel coordinates.
+    points = (start[:, np.newaxis] * image_size +
+              (np.arange(num_points)[np.newaxis, :] + 0.5) *
+              (size[:, np.newaxis] * image_size / num_points) - 0.5)
+    points = np.clip(points, 0, image_size - 1)
+    lower = np.floor(points).astype(np.int64)
+    upper = np.minimum(lower + 1, image_size - 1)
+    return lower, upper, (points - lower).astype(np.float32)
+
+  y0, y1, fy = sample_points(windows[:, 0], windows[:, 2] - windows[:, 0],
+                             height, image_height)
+  x0, x1, fx = sample_points(windows[:, 1], windows[:, 3] - windows[:, 1],
+                             width, image_width)
+  n = np.arange(len(images))[:, np.newaxis, np.newaxis]
+  y0, y1 = y0[:, :, np.newaxis], y1[:, :, np.newaxis]
+  x0, x1 = x0[:, np.newaxis, :], x1[:, np.newaxis, :]
+  fx = fx[:, np.newaxis, :, np.newaxis]
+  fy = fy[:, :, np.newaxis, np.newaxis]
+  top = images[n, y0, x0] * (1.0 - fx) + images[n, y0, x1] * fx
+  bottom = images[n, y1, x0] * (1.0 - fx) + images[n, y1, x1] * fx
+  return top * (1.0 - fy) + bottom * fy
+
+
+def normalize_image(batch, random_state, original_minval, original_maxval,
+                    target_minval, target_maxval):
+  """Moves the pixel values from the original range to the target range."""
+  del random_state  # Unused.
+  image = batch[fields.InputDataFields.image]
+  scale = ((float(target_maxval) - float(target_minval)) /
+           (float(original_maxval) - float(original_minval)))
+  image -= original_minval
+  image *= scale
+  image += target_minval
+  return batch
+
+
+def random_horizontal_flip(batch, random_state,
+                           keypoint_flip_permutation=None):
+  """Flips half of the images and their boxes left to right."""
+  del keypoint_flip_permutation  # Keypoints are not supported.
+  image = batch[fields.InputDataFields.image]
+  rows = np.flatnonzero(random_state.uniform(size=len(image)) > 0.5)
+  image[rows] = image[rows, :, ::-1]
+  boxes = batch[fields.InputDataFields.groundtruth_boxes][rows]
+  _update_boxes(batch, rows, np.stack(
+      [boxes[..., 0], 1.0 - boxes[..., 3], boxes[..., 2], 1.0 - boxes[..., 1]],
+      axis=-1))
+  return batch
+
+
+def random_vertical_flip(batch, random_state, keypoint_flip_permutation=None):
+  """Flips half of the images and their boxes upside down."""
+  del keypoint_flip_permutation  # Keypoints are not supported.
+  image = batch[fields.InputDataFields.image]
+  rows = np.flatnonzero(random_state.uniform(size=len(image)) > 0.5)
+  image[rows] = image[rows, ::-1]
+  boxes = batch[fields.InputDataFields.groundtruth_boxes][rows]
+  _update_boxes(batch, rows, np.stack(
+      [1.0 - boxes[..., 2], boxes[..., 1], 1.0 - boxes[..., 0], boxes[..., 3]],
+      axis=-1))
+  return batch
+
+
+def random_rotation90(batch, random_state):
+  """Rotates half of the images and their boxes 90 degrees counter-clockwise.
+
+  Raises:
+    ValueError: if the images are not square, a batch holds one image size.
+  """
+  image = batch[fields.InputDataFields.image]
+  if image.shape[1] != image.shape[2]:
+    raise ValueError('random_rotation90 needs square images in a batch, got '
+                     '%dx%d.' % image.shape[1:3])
+  rows = np.flatnonzero(random_state.uniform(size=len(image)) > 0.5)
+  image[rows] = np.rot90(image[rows], 1, axes=(1, 2))
+  boxes = batch[fields.InputDataFields.groundtruth_boxes][rows]
+  _update_boxes(batch, rows, np.stack(
+      [1.0 - boxes[..., 3], boxes[..., 0], 1.0 - boxes[..., 1], boxes[..., 2]],
+      axis=-1))
+  return batch
+
+
+def random_pixel_value_scale(batch, random_state, minval=0.9, maxval=1.1):
+  """Scales every pixel value by a random factor in [minval, maxval]."""
+  image = batch[fields.InputDataFields.image]
+  image *= random_state.uniform(minval, maxval, size=image.shape).astype(
+      np.float32)
+  np.clip(image, 0.0, 255.0, out=image)
+  return batch
+
+
+def random_rgb_to_gray(batch, random_state, probability=0.1):
+  """Turns images gray (kept as 3 channels) with the given probability."""
+  image = batch[fields.InputDataFields.image]
+  rows = np.flatnonzero(random_state.uniform(size=len(image)) <= probability)
+  gray = np.dot(image[rows], _GRAY_WEIGHTS)[..., np.newaxis]
+  image[rows] = gray
+  return batch
+
+
+def random_adjust_brightness(batch, random_state, max_delta=0.2):
+  """Adds a random delta in [-max_delta, max_delta] (times 255) per image."""
+  image = batch[fields.InputDataFields.image]
+  delta = random_state.uniform(-max_delta, max_delta, size=len(image))
+  image += (255.0 * delta).astype(np.float32)[:, None, None, None]
+  np.clip(image, 0.0, 255.0, out=image)
+  return batch
+
+
+def random_adjust_contrast(batch, random_state, min_delta=0.8, max_delta=1.25):
+  """Scales the distance of the pixels to their channel mean per image."""
+  image = batch[fields.InputDataFields.image]
+  factor = random_state.uniform(min_delta, max_delta, size=len(image)).astype(
+      np.float32)[:, None, None, None]
+  mean = image.mean(axis=(1, 2), keepdims=True)
+  image -= mean
+  image *= factor
+  image += mean
+  np.clip(image, 0.0, 255.0, out=image)
+  return batch
+
+
+def random_adjust_hue(batch, random_state, max_delta=0.02):
+  """Shifts the hue by a random delta in [-max_delta, max_delta] per image."""
+  image = batch[fields.InputDataFields.image]
+  delta = random_state.uniform(-max_delta, max_delta, size=len(image))
+  h, s, v = _rgb_to_hsv(image / 255.0)
+  h = (h + delta[:, None, None]) % 1.0
+  image[...] = _hsv_to_rgb(h, s, v) * 255.0
+  np.clip(image, 0.0, 255.0, out=image)
+  return batch
+
+
+def random_adjust_saturation(batch, random_state, min_delta=0.8,
+                             max_delta=1.25):
+  """Scales the saturation by a random factor per image."""
+  image = batch[fields.InputDataFields.image]
+  factor = random_state.uniform(min_delta, max_delta, size=len(image))
+  h, s, v = _rgb_to_hsv(image / 255.0)
+  s = np.clip(s * factor[:, None, None], 0.0, 1.0)
+  image[...] = _hsv_to_rgb(h, s, v) * 255.0
+  np.clip(image, 0.0, 255.0, out=image)
+  return batch
+
+
+def random_distort_color(batch, random_state, color_ordering=0):
+  """Brightness, saturation, hue and contrast changes in a fixed order.
+
+  Raises:
+    ValueError: if color_ordering is not in {0, 1}.
+  """
+  if color_ordering == 0:
+    batch = random_adjust_brightness(batch, random_state, max_delta=32. / 255.)
+    batch = random_adjust_saturation(batch, random_state, 0.5, 1.5)
+    batch = random_adjust_hue(batch, random_state, max_delta=0.2)
+    batch = random_adjust_contrast(batch, random_state, 0.5, 1.5)
+  elif color_ordering == 1:
+    batch = random_adjust_brightness(batch, random_state, max_delta=32. / 255.)
+    batch = random_adjust_contrast(batch, random_state, 0.5, 1.5)
+    batch = random_adjust_saturation(batch, random_state, 0.5, 1.5)
+    batch = random_adjust_hue(batch, random_state, max_delta=0.2)
+  else:
+    raise ValueError('color_ordering must be in {0, 1}')
+  return batch
+
+
+def random_jitter_boxes(batch, random_state, ratio=0.05):
+  """Moves every box corner by up to ratio times the box height or width."""
+  boxes = batch[fields.InputDataFields.groundtruth_boxes]
+  height = boxes[..., 2] - boxes[..., 0]
+  width = boxes[..., 3] - boxes[..., 1]
+  jitter = random_state.uniform(-ratio, ratio, size=boxes.shape) * np.stack(
+      [height, width, height, width], axis=-1)
+  rows = np.arange(len(boxes))
+  _update_boxes(batch, rows, np.clip(boxes + jitter, 0.0, 1.0))
+  return batch
+
+
+def random_black_patches(batch, random_state, max_black_patches=10,
+                         probability=0.5, size_to_image_ratio=0.1,
+                         random_seed=None):
+  """Blacks out up to max_black_patches square patches per image.
+
+  Each patch is added with the given probability, its side is
+  size_to_image_ratio times the smaller image side.
+  """
+  del random_seed  # random_state sets the randomness.
+  image = batch[fields.InputDataFields.image]
+  batch_size, height, width = image.shape[:3]
+  box_size = int(min(height, width) * size_to_image_ratio)
+  shape = (batch_size, max_black_patches)
+  added = random_state.uniform(size=shape) <= probability
+  y_min = (random_state.uniform(0.0, 1.0 - size_to_image_ratio, size=shape) *
+           height).astype(np.int64)
+  x_min = (random_state.uniform(0.0, 1.0 - size_to_image_ratio, size=shape) *
+           width).astype(np.int64)
+  rows = np.arange(height)[np.newaxis, np.newaxis, :]
+  cols = np.arange(width)[np.newaxis, np.newaxis, :]
+  in_rows = ((rows >= y_min[..., None]) & (rows < y_min[..., None] + box_size) &
+             added[..., None])
+  in_cols = (cols >= x_min[..., None]) & (cols < x_min[..., None] + box_size)
+  black = np.zeros((batch_size, height, width), dtype=bool)
+  for patch in range(max_black_patches):
+    black |= in_rows[:, patch, :, None] & in_cols[:, patch, None, :]
+  image[black] = 0.0
+  return batch
+
+
+def _sample_crop_windows(batch, random_state, min_object_covered,
+                         aspect_ratio_range, area_range, max_attempts=100):
+  """Samples crop windows like tf.image.sample_distorted_bounding_box.
+
+  A window has an aspect ratio (width / height in pixels) and an area
+  fraction drawn from the example's ranges and must cover at least
+  min_object_covered of one of the boxes (of the whole image when there are
+  none). The first of max_attempts windows that fits is used, the whole image
+  if none does.
+
+  Args:
+    batch: the batch dictionary.
+    random_state: a np.random.RandomState.
+    min_object_covered: [batch_size] array.
+    aspect_ratio_range: [batch_size, 2] array.
+    area_range: [batch_size, 2] array.
+    max_attempts: number of windows tried per image.
+
+  Returns:
+    float32 [batch_size, 4] normalized [ymin, xmin, ymax, xmax] windows.
+  """
+  batch_size, height, width = batch[fields.InputDataFields.image].shape[:3]
+  shape = (batch_size, max_attempts)
+  aspect_ratio = random_state.uniform(size=shape) * (
+      aspect_ratio_range[:, 1:] - aspect_ratio_range[:, :1]) + (
+          aspect_ratio_range[:, :1])
+  area = random_state.uniform(size=shape) * (
+      area_range[:, 1:] - area_range[:, :1]) + area_range[:, :1]
+  crop_height = np.maximum(
+      np.round(np.sqrt(area * height * width / aspect_ratio)), 1)
+  crop_width = np.maximum(np.round(crop_height * aspect_ratio), 1)
+  fits = (crop_height <= height) & (crop_width <= width)
+  crop_height = np.minimum(crop_height, height)
+  crop_width = np.minimum(crop_width, width)
+  top = np.floor(random_state.uniform(size=shape) *
+                 (height - crop_height + 1))
+  left = np.floor(random_state.uniform(size=shape) * (width - crop_width + 1))
+  windows = np.stack([top / height, left / width,
+                      (top + crop_height) / height,
+                      (left + crop_width) / width], axis=-1)
+
+  boxes = np.clip(batch[fields.InputDataFields.groundtruth_boxes], 0.0, 1.0)
+  valid = _valid_boxes(batch)
+  # No boxes, the whole image stands for one.
+  empty = ~valid.any(axis=1)
+  boxes = boxes.copy()
+  boxes[empty, 0] = [0.0, 0.0, 1.0, 1.0]
+  valid[empty, 0] = True
+  boxes = boxes[:, np.newaxis]
+  windows_ = windows[:, :, np.newaxis]
+  intersection = (
+      np.clip(np.minimum(boxes[..., 2], windows_[..., 2]) -
+              np.maximum(boxes[..., 0], windows_[..., 0]), 0.0, None) *
+      np.clip(np.minimum(boxes[..., 3], windows_[..., 3]) -
+              np.maximum(boxes[..., 1], windows_[..., 1]), 0.0, None))
+  box_area = ((boxes[..., 2] - boxes[..., 0]) *
+              (boxes[..., 3] - boxes[..., 1]))
+  covered = intersection / np.maximum(box_area, 1e-12)
+  covers = ((covered >= min_object_covered[:, None, None]) &
+            valid[:, np.newaxis]).any(axis=2)
+  accepted = fits & covers
+  first = np.argmax(accepted, axis=1)
+  result = windows[np.arange(batch_size), first]
+  result[~accepted.any(axis=1)] = [0.0, 0.0, 1.0, 1.0]
+  return result.astype(np.float32)
+
+
+def _random_crop(batch, random_state, min_object_covered, aspect_ratio_range,
+                 area_range, overlap_thresh, clip_boxes, random_coef):
+  """Crops every image with its own crop parameters, see random_crop_image.
+
+  All the arguments are arrays with one entry per example.
+  """
+  image = batch[fields.InputDataFields.image]
+  batch_size, height, width = image.shape[:3]
+  windows = _sample_crop_windows(batch, random_state, min_object_covered,
+                                 aspect_ratio_range, area_range)
+  do_crop = random_state.uniform(size=batch_size) > random_coef
+  # A crop with random_coef 0 always happens, like in random_crop_image.
+  do_crop |= random_coef < np.finfo(np.float32).tiny
+  rows = np.flatnonzero(do_crop)
+  if not len(rows):
+    return batch
+  image[rows] = _resample(image[rows], windows[rows], height, width)
+
+  boxes = batch[fields.InputDataFields.groundtruth_boxes]
+  window = windows[:, np.newaxis]
+  outside = ((boxes[..., 0] >= window[..., 2]) |
+             (boxes[..., 1] >= window[..., 3]) |
+             (boxes[..., 2] <= window[..., 0]) |
+             (boxes[..., 3] <= window[..., 1]))
+  intersection = (
+      np.clip(np.minimum(boxes[..., 2], window[..., 2]) -
+              np.maximum(boxes[..., 0], window[..., 0]), 0.0, None) *
+      np.clip(np.minimum(boxes[..., 3], window[..., 3]) -
+              np.maximum(boxes[..., 1], window[..., 1]), 0.0, None))
+  box_area = (boxes[..., 2] - boxes[..., 0]) * (boxes[..., 3] - boxes[..., 1])
+  # Boxes without area are dropped, like their NaN overlap drops them in TF.
+  overlap = np.where(box_area > 0, intersection / np.maximum(box_area, 1e-12),
+                     -1.0)
+  keep = ~outside & (overlap >= overlap_thresh[:, np.newaxis])
+  size = window[..., 2:] - window[..., :2]
+  new_boxes = (boxes - np.tile(window[..., :2], 2)) / np.tile(size, 2)
+  new_boxes = np.where(clip_boxes[:, None, None],
+                       np.clip(new_boxes, 0.0, 1.0), new_boxes)
+  _update_boxes(batch, rows, new_boxes[rows].astype(boxes.dtype))
+  keep[~do_crop] = True
+  _keep_boxes(batch, keep)
+  return batch
+
+
+def random_crop_image(batch, random_state, min_object_covered=1.0,
+                      aspect_ratio_range=(0.75, 1.33), area_range=(0.1, 1.0),
+                      overlap_thresh=0.3, clip_boxes=True, random_coef=0.0):
+  """Randomly crops the images, see preprocessor.random_crop_image.
+
+  Boxes less than overlap_thresh inside the crop are dropped, the others are
+  moved into the crop's frame (and clipped to it with clip_boxes). An image is
+  left as it is with probability random_coef.
+  """
+  batch_size = len(batch[fields.InputDataFields.image])
+  return _random_crop(
+      batch, random_state,
+      min_object_covered=np.full(batch_size, min_object_covered),
+      aspect_ratio_range=np.tile(aspect_ratio_range, (batch_size, 1)),
+      area_range=np.tile(area_range, (batch_size, 1)),
+      overlap_thresh=np.full(batch_size, overlap_thresh),
+      clip_boxes=np.full(batch_size, clip_boxes, dtype=bool),
+      random_coef=np.full(batch_size, random_coef))
+
+
+def ssd_random_crop(batch, random_state,
+                    min_object_covered=(0.0, 0.1, 0.3, 0.5, 0.7, 0.9, 1.0),
+                    aspect_ratio_range=((0.5, 2.0),) * 7,
+                    area_range=((0.1, 1.0),) * 7,
+                    overlap_thresh=(0.0, 0.1, 0.3, 0.5, 0.7, 0.9, 1.0),
+                    clip_boxes=(True,) * 7,
+                    random_coef=(0.15,) * 7):
+  """SSD crop, random_crop_image with one of the operations per image."""
+  batch_size = len(batch[fields.InputDataFields.image])
+  operation = random_state.randint(len(min_object_covered), size=batch_size)
+  return _random_crop(
+      batch, random_state,
+      min_object_covered=np.asarray(min_object_covered,
+                                    dtype=np.float64)[operation],
+      aspect_ratio_range=np.asarray(aspect_ratio_range,
+                                    dtype=np.float64)[operation],
+      area_range=np.asarray(area_range, dtype=np.float64)[operation],
+      overlap_thresh=np.asarray(overlap_thresh, dtype=np.float64)[operation],
+      clip_boxes=np.asarray(clip_boxes, dtype=bool)[operation],
+      random_coef=np.asarray(random_coef, dtype=np.float64)[operation])
+
+
+def rgb_to_gray(batch, random_state):
+  """Converts the images to single channel grayscale."""
+  del random_state  # Unused.
+  image = batch[fields.InputDataFields.image]
+  batch[fields.InputDataFields.image] = np.dot(
+      image, _GRAY_WEIGHTS)[..., np.newaxis]
+  return batch
+
+
+def subtract_channel_mean(batch, random_state, means=None):
+  """Subtracts the given mean from each channel."""
+  del random_state  # Unused.
+  if not means:
+    raise ValueError('means must be set to subtract channel means.')
+  batch[fields.InputDataFields.image] -= np.asarray(means, dtype=np.float32)
+  return batch
+
+
+# The options with a NumPy implementation, keyed by preprocessing_step name.
+PREPROCESSING_FUNCTION_MAP = {
+    'normalize_image': normalize_image,
+    'random_horizontal_flip': random_horizontal_flip,
+    'random_vertical_flip': random_vertical_flip,
+    'random_rotation90': random_rotation90,
+    'random_pixel_value_scale': random_pixel_value_scale,
+    'random_rgb_to_gray': random_rgb_to_gray,
+    'random_adjust_brightness': random_adjust_brightness,
+    'random_adjust_contrast': random_adjust_contrast,
+    'random_adjust_hue': random_adjust_hue,
+    'random_adjust_saturation': random_adjust_saturation,
+    'random_distort_color': random_distort_color,
+    'random_jitter_boxes': random_jitter_boxes,
+    'random_black_patches': random_black_patches,
+    'random_crop_image': random_crop_image,
+    'ssd_random_crop': ssd_random_crop,
+    'rgb_to_gray': rgb_to_gray,
+    'subtract_channel_mean': subtract_channel_mean,
+}
+
+
+def preprocess(batch, preprocess_options, seed=None):
+  """Applies the preprocess options to a batch.
+
+  Args:
+    batch: dictionary of numpy arrays keyed by fields.InputDataFields, see the
+      module docstring. num_groundtruth_boxes defaults to all boxes being
+      real. The arrays are not modified.
+    preprocess_options: list of (function, kwargs) tuples of functions of this
+      module, usually from builders/np_preprocessor_builder.py.
+    seed: an int for a deterministic result, a np.random.RandomState to draw
+      from (keep passing the same one for a reproducible sequence of batches)
+      or None.
+
+  Returns:
+    The preprocessed batch, a new dictionary.
+
+  Raises:
+    ValueError: if the batch has no image or no boxes.
+  """
+  if (fields.InputDataFields.image not in batch or
+      fields.InputDataFields.groundtruth_boxes not in batch):
+    raise ValueError('A batch needs an image and groundtruth_boxes.')
+  random_state = get_random_state(seed)
+  batch = dict(batch)
+  batch[fields.InputDataFields.image] = np.array(
+      batch[fields.InputDataFields.image], dtype=np.float32)
+  for key in BOX_FIELDS:
+    if key in batch:
+      batch[key] = np.array(batch[key])
+  batch[fields.InputDataFields.groundtruth_boxes] = batch[
+      fields.InputDataFields.groundtruth_boxes].astype(np.float32)
+  boxes = batch[fields.InputDataFields.groundtruth_boxes]
+  if fields.InputDataFields.num_groundtruth_boxes in batch:
+    batch[fields.InputDataFields.num_groundtruth_boxes] = np.array(
+        batch[fields.InputDataFields.num_groundtruth_boxes], dtype=np.int32)
+  else:
+    batch[fields.InputDataFields.num_groundtruth_boxes] = np.full(
+        len(boxes), boxes.shape[1], dtype=np.int32)
+  for function, kwargs in preprocess_options:
+    batch = function(batch, random_state, **kwargs)
+  return batch
@@ -0,0 +1,178 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.core.np_preprocessor."""
+
+import numpy as np
+import tensorflow as tf
+
+from object_detection.core import np_preprocessor
+from object_detection.core import standard_fields as fields
+
+
+class NpPreprocessorTest(tf.test.TestCase):
+
+  def create_batch(self, batch_size=4):
+    images = np.random.RandomState(0).uniform(
+        0, 255, size=(batch_size, 8, 8, 3)).astype(np.float32)
+    boxes = np.zeros((batch_size, 3, 4), dtype=np.float32)
+    boxes[:, 0] = [0.0, 0.0, 0.1, 0.1]
+    boxes[:, 1] = [0.4, 0.4, 0.6, 0.6]
+    classes = np.zeros((batch_size, 3), dtype=np.int64)
+    classes[:, :2] = [1, 2]
+    return {
+        fields.InputDataFields.image: images,
+        fields.InputDataFields.groundtruth_boxes: boxes,
+        fields.InputDataFields.groundtruth_classes: classes,
+        fields.InputDataFields.num_groundtruth_boxes: np.full(batch_size, 2),
+    }
+
+  def test_horizontal_flip_flips_images_and_boxes(self):
+    batch = self.create_batch(batch_size=16)
+    result = np_preprocessor.preprocess(
+        batch, [(np_preprocessor.random_horizontal_flip, {})], seed=1)
+    images = result[fields.InputDataFields.image]
+    boxes = result[fields.InputDataFields.groundtruth_boxes]
+    flipped = [i for i in range(16) if not np.array_equal(
+        images[i], batch[fields.InputDataFields.image][i])]
+    self.assertTrue(0 < len(flipped) < 16)
+    for i in range(16):
+      if i in flipped:
+        self.assertAllEqual(
+            batch[fields.InputDataFields.image][i, :, ::-1], images[i])
+        self.assertAllClose([0.0, 0.9, 0.1, 1.0], boxes[i, 0])
+      else:
+        self.assertAllClose([0.0, 0.0, 0.1, 0.1], boxes[i, 0])
+      # The padding is left alone.
+      self.assertAllEqual([0.0, 0.0, 0.0, 0.0], boxes[i, 2])
+
+  def test_preprocess_with_seed_is_deterministic(self):
+    batch = self.create_batch()
+    options = [(np_preprocessor.random_horizontal_flip, {}),
+               (np_preprocessor.random_distort_color, {}),
+               (np_preprocessor.random_black_patches, {}),
+               (np_preprocessor.ssd_random_crop, {})]
+    first = np_preprocessor.preprocess(batch, options, seed=7)
+    second = np_preprocessor.preprocess(batch, options, seed=7)
+    other = np_preprocessor.preprocess(batch, options, seed=8)
+    for key in first:
+      self.assertAllEqual(first[key], second[key])
+    self.assertFalse(np.array_equal(first[fields.InputDataFields.image],
+                                    other[fields.InputDataFields.image]))
+
+  def test_preprocess_leaves_input_untouched(self):
+    batch = self.create_batch()
+    images = batch[fields.InputDataFields.image].copy()
+    boxes = batch[fields.InputDataFields.groundtruth_boxes].copy()
+    np_preprocessor.preprocess(
+        batch, [(np_preprocessor.random_vertical_flip, {}),
+                (np_preprocessor.random_jitter_boxes, {})], seed=3)
+    self.assertAllEqual(images, batch[fields.InputDataFields.image])
+    self.assertAllEqual(boxes, batch[fields.InputDataFields.groundtruth_boxes])
+
+  def test_adjust_brightness_shifts_each_image_uniformly(self):
+    batch = self.create_batch()
+    batch[fields.InputDataFields.image][:] = 100.0
+    result = np_preprocessor.preprocess(
+        batch, [(np_preprocessor.random_adjust_brightness,
+                 {'max_delta': 0.2})], seed=0)
+    for image in result[fields.InputDataFields.image]:
+      self.assertEqual(1, len(np.unique(image)))
+      self.assertLessEqual(abs(image[0, 0, 0] - 100.0), 0.2 * 255 + 1e-3)
+
+  def test_zero_hue_and_unit_saturation_change_keep_the_image(self):
+    batch = self.create_batch()
+    result = np_preprocessor.preprocess(
+        batch, [(np_preprocessor.random_adjust_hue, {'max_delta': 0.0}),
+                (np_preprocessor.random_adjust_saturation,
+                 {'min_delta': 1.0, 'max_delta': 1.0})], seed=0)
+    self.assertAllClose(batch[fields.InputDataFields.image],
+                        result[fields.InputDataFields.image], atol=1e-3)
+
+  def test_black_patches(self):
+    batch = self.create_batch()
+    result = np_preprocessor.preprocess(
+        batch, [(np_preprocessor.random_black_patches,
+                 {'probability': 1.0, 'size_to_image_ratio': 0.25})], seed=0)
+    for image in result[fields.InputDataFields.image]:
+      self.assertGreaterEqual(np.sum(np.all(image == 0.0, axis=-1)), 4)
+    result = np_preprocessor.preprocess(
+        batch, [(np_preprocessor.random_black_patches,
+                 {'probability': 0.0})], seed=0)
+    self.assertAllEqual(batch[fields.InputDataFields.image],
+                        result[fields.InputDataFields.image])
+
+  def test_random_crop_moves_and_drops_boxes(self):
+    batch = self.create_batch()
+    result = np_preprocessor.preprocess(
+        batch, [(np_preprocessor.random_crop_image, {
+            'min_object_covered': 1.0,
+            'aspect_ratio_range': (1.0, 1.0),
+            'area_range': (0.25, 0.25),
+            'overlap_thresh': 0.3,
+        })], seed=0)
+    images = result[fields.InputDataFields.image]
+    boxes = result[fields.InputDataFields.groundtruth_boxes]
+    classes = result[fields.InputDataFields.groundtruth_classes]
+    self.assertEqual((4, 8, 8, 3), images.shape)
+    # The 4x4 crops hold the center box, the corner box is outside them.
+    self.assertAllEqual(
+        [1, 1, 1, 1], result[fields.InputDataFields.num_groundtruth_boxes])
+    self.assertAllEqual([[2, 0, 0]] * 4, classes)
+    self.assertAllClose([0.4] * 4, boxes[:, 0, 2] - boxes[:, 0, 0])
+    self.assertAllClose([0.4] * 4, boxes[:, 0, 3] - boxes[:, 0, 1])
+    self.assertTrue(np.all((boxes[:, 0] >= 0.0) & (boxes[:, 0] <= 1.0)))
+    self.assertAllEqual(np.zeros((4, 2, 4)), boxes[:, 1:])
+
+  def test_random_crop_keeps_image_without_valid_window(self):
+    batch = self.create_batch()
+    batch[fields.InputDataFields.groundtruth_boxes][:, 1] = [0.0, 0.0, 1.0, 1.0]
+    result = np_preprocessor.preprocess(
+        batch, [(np_preprocessor.random_crop_image, {
+            'min_object_covered': 1.0,
+            'area_range': (0.1, 0.5),
+        })], seed=0)
+    self.assertAllClose(batch[fields.InputDataFields.image],
+                        result[fields.InputDataFields.image])
+    self.assertAllClose(batch[fields.InputDataFields.groundtruth_boxes],
+                        result[fields.InputDataFields.groundtruth_boxes])
+
+  def test_ssd_random_crop_keeps_boxes_normalized(self):
+    batch = self.create_batch(batch_size=32)
+    result = np_preprocessor.preprocess(
+        batch, [(np_preprocessor.ssd_random_crop, {})], seed=0)
+    boxes = result[fields.InputDataFields.groundtruth_boxes]
+    num_boxes = result[fields.InputDataFields.num_groundtruth_boxes]
+    self.assertTrue(np.all(num_boxes <= 2))
+    self.assertTrue(np.all((boxes >= 0.0) & (boxes <= 1.0)))
+    for i, count in enumerate(num_boxes):
+      self.assertAllEqual(np.zeros((3 - count, 4)), boxes[i, count:])
+
+  def test_rotation90_needs_square_images(self):
+    batch = self.create_batch()
+    batch[fields.InputDataFields.image] = np.zeros((4, 8, 6, 3))
+    with self.assertRaises(ValueError):
+      np_preprocessor.preprocess(
+          batch, [(np_preprocessor.random_rotation90, {})], seed=0)
+
+  def test_rgb_to_gray(self):
+    batch = self.create_batch()
+    result = np_preprocessor.preprocess(
+        batch, [(np_preprocessor.rgb_to_gray, {})], seed=0)
+    self.assertEqual((4, 8, 8, 1), result[fields.InputDataFields.image].shape)
+
+
+if __name__ == '__main__':
+  tf.test.main()
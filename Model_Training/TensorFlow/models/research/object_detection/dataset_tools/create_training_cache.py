@@ -0,0 +1,181 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+r"""Builds a pre-decoded, pre-resized training cache from TFRecords.
+
+Decodes every example once, resizes the image and writes it with its boxes to
+a training cache directory (see utils/training_cache.py). Point the
+tf_record_input_reader input_path of the train_input_reader at the cache
+directory to train from it instead of the TFRecords.
+
+The images are resized either to a fixed --image_height x --image_width, or
+down to at most --max_dimension on their larger side keeping the aspect ratio
+(smaller images are stored as they are). With --pipeline_config_path the
+input paths and label map default to the train_input_reader ones and the size
+to the model's image resizer. Caching at exactly the model input size is the
+cheapest to read, but crop augmentations like ssd_random_crop then work on
+the small image, a larger --max_dimension keeps some detail for them.
+
+Example usage:
+    python object_detection/dataset_tools/create_training_cache.py \
+        --pipeline_config_path=training/pipeline.config \
+        --output_dir=annotations/train_cache
+"""
+
+import tensorflow as tf
+
+from object_detection.core import standard_fields as fields
+from object_detection.data_decoders import tf_example_decoder
+from object_detection.utils import config_util
+from object_detection.utils import training_cache
+
+flags = tf.app.flags
+flags.DEFINE_string('input_path', '', 'Comma separated TFRecord file patterns '
+                    'to read, the train_input_reader ones by default.')
+flags.DEFINE_string('output_dir', '', 'Directory to write the cache to.')
+flags.DEFINE_string('label_map_path', '', 'Label map to look up class text '
+                    'with, the train_input_reader one by default.')
+flags.DEFINE_string('pipeline_config_path', '', 'Optional pipeline config to '
+                    'take the input, label map and image size from.')
+flags.DEFINE_integer('image_height', 0, 'Height to resize the images to.')
+flags.DEFINE_integer('image_width', 0, 'Width to resize the images to.')
+flags.DEFINE_integer('max_dimension', 0, 'Largest side to shrink the images '
+                     'to, keeping their aspect ratio.')
+flags.DEFINE_integer('num_parallel_calls', 4, 'Examples decoded in parallel.')
+
+FLAGS = flags.FLAGS
+
+
+def resize_image(image, image_size=None, max_dimension=None):
+  """Resizes a decoded image for the cache.
+
+  Args:
+    image: uint8 tensor of shape [height, width, 3].
+    image_size: (height, width) to resize to, or None.
+    max_dimension: largest side to shrink the image to, or None. Ignored when
+      image_size is given.
+
+  Returns:
+    A uint8 tensor of shape [new_height, new_width, 3].
+  """
+  if image_size:
+    new_size = tf.constant(image_size, dtype=tf.int32)
+  elif max_dimension:
+    size = tf.cast(tf.shape(image)[:2], tf.float32)
+    scale = tf.minimum(max_dimension / tf.reduce_max(size), 1.0)
+    new_size = tf.maximum(tf.cast(tf.round(size * scale), tf.int32), 1)
+  else:
+    return image
+
+  def resize():
+    resized = tf.image.resize_images(tf.cast(image, tf.float32), new_size)
+    return tf.cast(tf.clip_by_value(tf.round(resized), 0, 255), tf.uint8)
+
+  return tf.cond(
+      tf.reduce_all(tf.equal(tf.shape(image)[:2], new_size)),
+      lambda: image, resize)
+
+
+def create_training_cache(input_files, output_dir, label_map_path=None,
+                          image_size=None, max_dimension=None,
+                          num_parallel_calls=4):
+  """Decodes and resizes TFRecord examples into a training cache.
+
+  Args:
+    input_files: A list of TFRecord file patterns.
+    output_dir: Directory to write the cache to.
+    label_map_path: Optional label map to look up class text with.
+    image_size: (height, width) to resize the images to, or None.
+    max_dimension: Largest side to shrink the images to, or None.
+    num_parallel_calls: Number of examples decoded in parallel.
+
+  Returns:
+    The number of examples written.
+
+  Raises:
+    ValueError: If input_files match no file.
+  """
+  filenames = []
+  for pattern in input_files:
+    filenames.extend(tf.gfile.Glob(pattern))
+  if not filenames:
+    raise ValueError('No TFRecord files match %s.' % input_files)
+  decoder = tf_example_decoder.TfExampleDecoder(
+      label_map_proto_file=label_map_path or None)
+
+  def decode_fn(value):
+    tensor_dict = decoder.decode(value)
+    return (resize_image(tensor_dict[fields.InputDataFields.image],
+                         image_size, max_dimension),
+            tensor_dict[fields.InputDataFields.groundtruth_boxes],
+            tensor_dict[fields.InputDataFields.groundtruth_classes],
+            tensor_dict[fields.InputDataFields.groundtruth_weights],
+            tensor_dict[fields.InputDataFields.groundtruth_difficult],
+            tensor_dict[fields.InputDataFields.source_id],
+            tensor_dict[fields.InputDataFields.filename])
+
+  with tf.Graph().as_default():
+    dataset = tf.data.TFRecordDataset(filenames).map(
+        decode_fn, num_parallel_calls=num_parallel_calls).prefetch(
+            num_parallel_calls)
+    next_example = dataset.make_one_shot_iterator().get_next()
+    writer = training_cache.TrainingCacheWriter(
+        output_dir, image_size=image_size, max_dimension=max_dimension)
+    with tf.Session() as sess:
+      sess.run(tf.tables_initializer())
+      while True:
+        try:
+          (image, boxes, classes, weights, difficult, source_id,
+           filename) = sess.run(next_example)
+        except tf.errors.OutOfRangeError:
+          break
+        writer.add(image, boxes, classes, source_id=source_id,
+                   filename=filename, weights=weights,
+                   difficult=difficult.astype(bool))
+    return writer.close()
+
+
+def main(_):
+  input_files = [path for path in FLAGS.input_path.split(',') if path]
+  label_map_path = FLAGS.label_map_path
+  image_size = None
+  if FLAGS.image_height and FLAGS.image_width:
+    image_size = (FLAGS.image_height, FLAGS.image_width)
+  max_dimension = FLAGS.max_dimension or None
+  if FLAGS.pipeline_config_path:
+    configs = config_util.get_configs_from_pipeline_file(
+        FLAGS.pipeline_config_path)
+    input_config = configs['train_input_config']
+    if not input_files:
+      input_files = input_config.tf_record_input_reader.input_path[:]
+    if not label_map_path and input_config.HasField('label_map_path'):
+      label_map_path = input_config.label_map_path
+    if not image_size and not max_dimension:
+      image_resizer_config = config_util.get_image_resizer_config(
+          configs['model'])
+      if image_resizer_config.HasField('fixed_shape_resizer'):
+        image_size = tuple(
+            config_util.get_spatial_image_size(image_resizer_config))
+      elif image_resizer_config.HasField('keep_aspect_ratio_resizer'):
+        max_dimension = (
+            image_resizer_config.keep_aspect_ratio_resizer.max_dimension)
+  num_examples = create_training_cache(
+      input_files, FLAGS.output_dir, label_map_path, image_size,
+      max_dimension, FLAGS.num_parallel_calls)
+  tf.logging.info('Wrote %d examples to %s', num_examples, FLAGS.output_dir)
+
+
+if __name__ == '__main__':
+  tf.app.run()
@@ -0,0 +1,353 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Exports an SSD checkpoint as a post-training int8 quantized TFLite model.
+
+The checkpoint is first exported with export_tflite_ssd_graph_lib, the
+resulting tflite_graph.pb is then converted twice: once as a float TFLite model
+and once fully int8 quantized, calibrated on images from TFRecords. Both models
+(and optionally the float frozen inference graph) are evaluated on an eval
+TFRecord and the accuracy/latency comparison is written as JSON.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from object_detection import export_tflite_ssd_graph_lib
+from object_detection.core import standard_fields as fields
+from object_detection.data_decoders import tf_example_decoder
+from object_detection.utils import object_detection_evaluation
+
+INPUT_ARRAY = 'normalized_input_image_tensor'
+OUTPUT_ARRAYS = [
+    'TFLite_Detection_PostProcess', 'TFLite_Detection_PostProcess:1',
+    'TFLite_Detection_PostProcess:2', 'TFLite_Detection_PostProcess:3'
+]
+
+
+def read_examples(tfrecord_paths, height, width, max_examples=None):
+  """Decodes tf.Examples into resized images and groundtruth.
+
+  Args:
+    tfrecord_paths: list of TFRecord files with tf.Examples in the format
+      written by generate_tfrecord.py.
+    height: height the images are resized to.
+    width: width the images are resized to.
+    max_examples: stop after this many examples, all of them if None.
+
+  Yields:
+    (image, groundtruth_boxes, groundtruth_classes) with image a uint8 numpy
+    array of shape [height, width, 3], normalized [N, 4] boxes and [N] int
+    classes.
+  """
+  graph = tf.Graph()
+  with graph.as_default():
+    serialized = tf.placeholder(tf.string, shape=[])
+    tensors = tf_example_decoder.TfExampleDecoder().decode(serialized)
+    image = tf.image.resize_images(
+        tensors[fields.InputDataFields.image], [height, width])
+    image = tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+    outputs = [
+        image, tensors[fields.InputDataFields.groundtruth_boxes],
+        tensors[fields.InputDataFields.groundtruth_classes]
+    ]
+  count = 0
+  with tf.Session(graph=graph) as sess:
+    for path in tfrecord_paths:
+      for record in tf.python_io.tf_record_iterator(path):
+        if max_examples is not None and count >= max_examples:
+          return
+        yield tuple(sess.run(outputs, feed_dict={serialized: record}))
+        count += 1
+
+
+def normalize_image(image):
+  """Maps uint8 pixels to the [-1, 1) input range of SSD MobileNet."""
+  return image.astype(np.float32) / 128.0 - 1.0
+
+
+def representative_dataset(tfrecord_paths, height, width, num_examples):
+  """Returns a representative dataset generator for the TFLite converter.
+
+  Args:
+    tfrecord_paths: list of TFRecord files to calibrate on.
+    height: model input height.
+    width: model input width.
+    num_examples: number of images used for calibration.
+
+  Returns:
+    A function yielding [normalized image batch of 1] lists.
+  """
+
+  def generator():
+    for image, _, _ in read_examples(tfrecord_paths, height, width,
+                                     num_examples):
+      yield [normalize_image(image)[np.newaxis]]
+
+  return generator
+
+
+def convert_tflite_graph(tflite_graph_path, input_shape, output_path,
+                         representative_data=None):
+  """Converts a tflite_graph.pb into a TFLite model.
+
+  Args:
+    tflite_graph_path: graph written by export_tflite_ssd_graph_lib.
+    input_shape: [1, height, width, channels] model input shape.
+    output_path: where the .tflite model is written.
+    representative_data: representative dataset generator. When given the
+      model is fully int8 quantized with uint8 input, otherwise it stays float.
+
+  Returns:
+    Size of the written model in bytes.
+  """
+  converter = tf.lite.TFLiteConverter.from_frozen_graph(
+      tflite_graph_path, [INPUT_ARRAY], OUTPUT_ARRAYS,
+      {INPUT_ARRAY: input_shape})
+  # TFLite_Detection_PostProcess is a custom op and stays float
+  converter.allow_custom_ops = True
+  if representative_data is not None:
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_data
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+  model = converter.convert()
+  with tf.gfile.GFile(output_path, 'wb') as f:
+    f.write(model)
+  return len(model)
+
+
+def prepare_input(image, input_detail):
+  """Converts a uint8 image to what a TFLite model input expects.
+
+  Args:
+    image: uint8 numpy array of shape [height, width, 3].
+    input_detail: entry of Interpreter.get_input_details().
+
+  Returns:
+    Batch of 1 in the input dtype.
+  """
+  dtype = input_detail['dtype']
+  scale, zero_point = input_detail['quantization']
+  if dtype == np.uint8 and not scale:
+    # Without quantization parameters the model takes the raw pixels.
+    return image[np.newaxis]
+  normalized = normalize_image(image)
+  if dtype in (np.uint8, np.int8):
+    # The calibrated scale and zero point map the normalized image to the
+    # input, they need not be the 1/128 and 128 that raw pixels would match.
+    quantized = np.round(normalized / scale + zero_point)
+    limits = np.iinfo(dtype)
+    return np.clip(quantized, limits.min, limits.max).astype(dtype)[np.newaxis]
+  return normalized[np.newaxis].astype(dtype)
+
+
+def tflite_detect_fn(model_path, num_threads=1):
+  """Returns a function running a TFLite SSD model on one uint8 image.
+
+  The function returns (boxes, scores, classes) with 1-indexed classes, like
+  the frozen inference graph.
+  """
+  interpreter = tf.lite.Interpreter(model_path=model_path)
+  if hasattr(interpreter, 'set_num_threads'):
+    interpreter.set_num_threads(num_threads)
+  interpreter.allocate_tensors()
+  input_detail = interpreter.get_input_details()[0]
+  output_index = [detail['index'] for detail in interpreter.get_output_details()]
+
+  def detect(image):
+    interpreter.set_tensor(input_detail['index'],
+                           prepare_input(image, input_detail))
+    interpreter.invoke()
+    boxes, classes, scores, num = [
+        interpreter.get_tensor(index) for index in output_index
+    ]
+    num = int(num[0])
+    return boxes[0][:num], scores[0][:num], classes[0][:num] + 1
+
+  return detect
+
+
+def frozen_graph_detect_fn(frozen_graph_path):
+  """Returns a function running a frozen inference graph on one uint8 image."""
+  graph = tf.Graph()
+  with graph.as_default():
+    graph_def = tf.GraphDef()
+    with tf.gfile.GFile(frozen_graph_path, 'rb') as f:
+      graph_def.ParseFromString(f.read())
+    tf.import_graph_def(graph_def, name='')
+  sess = tf.Session(graph=graph)
+  image_tensor = graph.get_tensor_by_name('image_tensor:0')
+  outputs = [
+      graph.get_tensor_by_name(name + ':0') for name in
+      ['detection_boxes', 'detection_scores', 'detection_classes',
+       'num_detections']
+  ]
+
+  def detect(image):
+    boxes, scores, classes, num = sess.run(
+        outputs, feed_dict={image_tensor: image[np.newaxis]})
+    num = int(num[0])
+    return boxes[0][:num], scores[0][:num], classes[0][:num]
+
+  return detect
+
+
+def latency_summary(latencies):
+  """Mean and percentiles (milliseconds) of a list of latencies in seconds."""
+  latencies_ms = 1000.0 * np.asarray(latencies, dtype=np.float64)
+  if not latencies_ms.size:
+    return {}
+  return {
+      'mean_ms': float(latencies_ms.mean()),
+      'p50_ms': float(np.percentile(latencies_ms, 50)),
+      'p95_ms': float(np.percentile(latencies_ms, 95)),
+      'p99_ms': float(np.percentile(latencies_ms, 99)),
+  }
+
+
+def evaluate(detect_fn, examples, categories, warmup=1):
+  """Runs a detector over examples and measures accuracy and latency.
+
+  Args:
+    detect_fn: function taking a uint8 image and returning normalized boxes,
+      scores and 1-indexed classes.
+    examples: list of (image, groundtruth_boxes, groundtruth_classes).
+    categories: list of category dicts ({'id': ..., 'name': ...}).
+    warmup: number of untimed runs before the first timed one.
+
+  Returns:
+    Dict with the Pascal VOC mAP@0.5IOU metrics and the latency summary.
+  """
+  evaluator = object_detection_evaluation.PascalDetectionEvaluator(categories)
+  for i in range(min(warmup, len(examples))):
+    detect_fn(examples[i][0])
+  latencies = []
+  for image_id, (image, groundtruth_boxes,
+                 groundtruth_classes) in enumerate(examples):
+    start = time.time()
+    boxes, scores, classes = detect_fn(image)
+    latencies.append(time.time() - start)
+    evaluator.add_single_ground_truth_image_info(
+        image_id, {
+            fields.InputDataFields.groundtruth_boxes:
+                np.asarray(groundtruth_boxes, dtype=np.float32),
+            fields.InputDataFields.groundtruth_classes:
+                np.asarray(groundtruth_classes, dtype=np.int32),
+        })
+    evaluator.add_single_detected_image_info(
+        image_id, {
+            fields.DetectionResultFields.detection_boxes:
+                np.asarray(boxes, dtype=np.float32),
+            fields.DetectionResultFields.detection_scores:
+                np.asarray(scores, dtype=np.float32),
+            fields.DetectionResultFields.detection_classes:
+                np.asarray(classes, dtype=np.int32),
+        })
+  metrics = {key: float(value) for key, value in evaluator.evaluate().items()}
+  metrics['latency'] = latency_summary(latencies)
+  metrics['num_examples'] = len(examples)
+  return metrics
+
+
+def export_int8_tflite(pipeline_config,
+                       trained_checkpoint_prefix,
+                       output_dir,
+                       calibration_tfrecords,
+                       eval_tfrecords=None,
+                       frozen_graph_path=None,
+                       num_calibration_examples=100,
+                       num_eval_examples=None,
+                       max_detections=10,
+                       num_threads=1):
+  """Exports, quantizes and evaluates an SSD model.
+
+  Writes to output_dir:
+    tflite_graph.pb/.pbtxt  graph from export_tflite_ssd_graph_lib
+    model_float.tflite      float TFLite model
+    model_int8.tflite       int8 TFLite model with uint8 input
+    quantization_report.json  sizes, mAP and latency of every model
+
+  Args:
+    pipeline_config: pipeline_pb2.TrainEvalPipelineConfig of the SSD model.
+    trained_checkpoint_prefix: checkpoint with the trained weights.
+    output_dir: directory the models and report are written to.
+    calibration_tfrecords: list of TFRecords to calibrate the quantization on.
+    eval_tfrecords: list of TFRecords to evaluate on, no evaluation if None.
+    frozen_graph_path: optional frozen_inference_graph.pb (from
+      export_inference_graph) evaluated as the float baseline as well.
+    num_calibration_examples: number of images used for calibration.
+    num_eval_examples: number of eval images, all of them if None.
+    max_detections: maximum number of detections of the post processing op.
+    num_threads: interpreter threads used when measuring latency.
+
+  Returns:
+    The report dict.
+  """
+  export_tflite_ssd_graph_lib.export_tflite_graph(
+      pipeline_config, trained_checkpoint_prefix, output_dir,
+      add_postprocessing_op=True, max_detections=max_detections,
+      max_classes_per_detection=1)
+  tflite_graph_path = os.path.join(output_dir, 'tflite_graph.pb')
+  resizer = pipeline_config.model.ssd.image_resizer.fixed_shape_resizer
+  height, width = resizer.height, resizer.width
+  input_shape = [1, height, width, 3]
+
+  float_path = os.path.join(output_dir, 'model_float.tflite')
+  int8_path = os.path.join(output_dir, 'model_int8.tflite')
+  report = {'input_shape': input_shape, 'models': {}}
+  report['models']['tflite_float'] = {
+      'path': float_path,
+      'size_bytes': convert_tflite_graph(tflite_graph_path, input_shape,
+                                         float_path)
+  }
+  report['models']['tflite_int8'] = {
+      'path': int8_path,
+      'size_bytes': convert_tflite_graph(
+          tflite_graph_path, input_shape, int8_path,
+          representative_dataset(calibration_tfrecords, height, width,
+                                 num_calibration_examples))
+  }
+  report['num_calibration_examples'] = num_calibration_examples
+
+  if eval_tfrecords:
+    examples = list(
+        read_examples(eval_tfrecords, height, width, num_eval_examples))
+    num_classes = pipeline_config.model.ssd.num_classes
+    categories = [{'id': i + 1, 'name': str(i + 1)} for i in range(num_classes)]
+    detect_fns = {
+        'tflite_float': tflite_detect_fn(float_path, num_threads),
+        'tflite_int8': tflite_detect_fn(int8_path, num_threads),
+    }
+    if frozen_graph_path:
+      report['models']['frozen_graph'] = {
+          'path': frozen_graph_path,
+          'size_bytes': tf.gfile.Stat(frozen_graph_path).length
+      }
+      detect_fns['frozen_graph'] = frozen_graph_detect_fn(frozen_graph_path)
+    for name, detect_fn in detect_fns.items():
+      report['models'][name]['eval'] = evaluate(detect_fn, examples,
+                                                categories)
+
+  with tf.gfile.GFile(os.path.join(output_dir, 'quantization_report.json'),
+                      'w') as f:
+    f.write(json.dumps(report, indent=2, sort_keys=True))
+  return report
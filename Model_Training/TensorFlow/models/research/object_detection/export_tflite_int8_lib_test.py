@@ -0,0 +1,123 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.export_tflite_int8_lib."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import os
+import numpy as np
+import tensorflow as tf
+from object_detection import export_tflite_int8_lib
+from object_detection.utils import dataset_util
+
+
+class ExportTfliteInt8Test(tf.test.TestCase):
+
+  def _write_tfrecord(self, num_examples):
+    path = os.path.join(self.get_temp_dir(), 'examples.record')
+    with self.test_session() as sess:
+      image = tf.placeholder(tf.uint8, shape=[20, 40, 3])
+      encode = tf.image.encode_jpeg(image)
+      with tf.python_io.TFRecordWriter(path) as writer:
+        for i in range(num_examples):
+          encoded = sess.run(
+              encode,
+              feed_dict={image: np.full((20, 40, 3), 10 * i, dtype=np.uint8)})
+          example = tf.train.Example(features=tf.train.Features(feature={
+              'image/encoded': dataset_util.bytes_feature(encoded),
+              'image/format': dataset_util.bytes_feature(b'jpeg'),
+              'image/height': dataset_util.int64_feature(20),
+              'image/width': dataset_util.int64_feature(40),
+              'image/object/bbox/ymin': dataset_util.float_list_feature([0.1]),
+              'image/object/bbox/xmin': dataset_util.float_list_feature([0.2]),
+              'image/object/bbox/ymax': dataset_util.float_list_feature([0.5]),
+              'image/object/bbox/xmax': dataset_util.float_list_feature([0.6]),
+              'image/object/class/label': dataset_util.int64_list_feature([2]),
+          }))
+          writer.write(example.SerializeToString())
+    return path
+
+  def test_read_examples_resizes_and_decodes_groundtruth(self):
+    path = self._write_tfrecord(3)
+    examples = list(export_tflite_int8_lib.read_examples([path], 10, 10, 2))
+    self.assertEqual(len(examples), 2)
+    image, boxes, classes = examples[1]
+    self.assertEqual(image.shape, (10, 10, 3))
+    self.assertEqual(image.dtype, np.uint8)
+    self.assertAllClose(boxes, [[0.1, 0.2, 0.5, 0.6]])
+    self.assertAllEqual(classes, [2])
+
+  def test_representative_dataset_yields_normalized_batches(self):
+    path = self._write_tfrecord(3)
+    generator = export_tflite_int8_lib.representative_dataset([path], 10, 10,
+                                                              3)
+    batches = list(generator())
+    self.assertEqual(len(batches), 3)
+    self.assertEqual(batches[0][0].shape, (1, 10, 10, 3))
+    self.assertEqual(batches[0][0].dtype, np.float32)
+    self.assertAllClose(batches[0][0], -np.ones((1, 10, 10, 3)), atol=0.05)
+
+  def test_prepare_input(self):
+    image = np.array([[[0, 128, 255]]], dtype=np.uint8)
+    raw_input = export_tflite_int8_lib.prepare_input(
+        image, {'dtype': np.uint8, 'quantization': (0.0, 0)})
+    self.assertAllEqual(raw_input, image[np.newaxis])
+    uint8_input = export_tflite_int8_lib.prepare_input(
+        image, {'dtype': np.uint8, 'quantization': (1.0 / 128, 128)})
+    self.assertEqual(uint8_input.dtype, np.uint8)
+    self.assertAllEqual(uint8_input, [[[[0, 128, 255]]]])
+    # Any other calibration rescales the pixels, clipped to the uint8 range.
+    uint8_input = export_tflite_int8_lib.prepare_input(
+        image, {'dtype': np.uint8, 'quantization': (1.0 / 64, 100)})
+    self.assertAllEqual(uint8_input, [[[[36, 100, 164]]]])
+    uint8_input = export_tflite_int8_lib.prepare_input(
+        image, {'dtype': np.uint8, 'quantization': (1.0 / 256, 128)})
+    self.assertAllEqual(uint8_input, [[[[0, 128, 255]]]])
+    float_input = export_tflite_int8_lib.prepare_input(
+        image, {'dtype': np.float32, 'quantization': (0.0, 0)})
+    self.assertAllClose(float_input, [[[[-1.0, 0.0, 255 / 128.0 - 1.0]]]])
+    int8_input = export_tflite_int8_lib.prepare_input(
+        image, {'dtype': np.int8, 'quantization': (1.0 / 128, 0)})
+    self.assertEqual(int8_input.dtype, np.int8)
+    self.assertAllEqual(int8_input, [[[[-128, 0, 127]]]])
+
+  def test_latency_summary(self):
+    summary = export_tflite_int8_lib.latency_summary(
+        [0.001 * i for i in range(1, 101)])
+    self.assertAlmostEqual(summary['mean_ms'], 50.5)
+    self.assertAlmostEqual(summary['p50_ms'], 50.5)
+    self.assertGreater(summary['p99_ms'], summary['p95_ms'])
+    self.assertEqual(export_tflite_int8_lib.latency_summary([]), {})
+
+  def test_evaluate_perfect_detector(self):
+    examples = [(np.zeros((10, 10, 3), dtype=np.uint8),
+                 np.array([[0.1, 0.1, 0.5, 0.5]], dtype=np.float32),
+                 np.array([1]))] * 3
+
+    def detect_fn(image):
+      del image
+      return (np.array([[0.1, 0.1, 0.5, 0.5]]), np.array([0.9]),
+              np.array([1.0]))
+
+    metrics = export_tflite_int8_lib.evaluate(
+        detect_fn, examples, [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}])
+    self.assertAlmostEqual(metrics['PascalBoxes_Precision/mAP@0.5IOU'], 1.0)
+    self.assertEqual(metrics['num_examples'], 3)
+    self.assertIn('p95_ms', metrics['latency'])
+
+
+if __name__ == '__main__':
+  tf.test.main()
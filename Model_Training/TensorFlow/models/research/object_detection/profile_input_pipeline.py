@@ -0,0 +1,83 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+r"""Profiles the training input pipeline of a pipeline config.
+
+Builds the train input pipeline of the config without the model and reports
+the cost of every stage (read, decode, each augmentation option, transform,
+pad), the examples/sec and CPU utilization of the pipeline as configured, and
+what changing num_readers, num_parallel_batches and num_prefetch_batches would
+give, with recommendations. Run it on the machine that trains.
+
+Example Usage:
+--------------
+python object_detection/profile_input_pipeline.py \
+    --pipeline_config_path path/to/ssd_mobilenet.config \
+    --output_path path/to/input_profile.json
+"""
+
+import json
+
+import tensorflow as tf
+from google.protobuf import text_format
+from object_detection import profile_input_pipeline_lib
+from object_detection.protos import pipeline_pb2
+from object_detection.utils import config_util
+
+flags = tf.app.flags
+flags.DEFINE_string(
+    'pipeline_config_path', None,
+    'Path to a pipeline_pb2.TrainEvalPipelineConfig config '
+    'file.')
+flags.DEFINE_string(
+    'config_override', '', 'pipeline_pb2.TrainEvalPipelineConfig '
+    'text proto to override pipeline_config_path.')
+flags.DEFINE_string('output_path', '',
+                    'Optional path to write the report to as JSON.')
+flags.DEFINE_integer('num_examples', 32,
+                     'Number of examples each stage is timed on.')
+flags.DEFINE_integer('num_batches', 20,
+                     'Number of batches each pipeline setting is timed on.')
+flags.DEFINE_integer('batch_size', 0,
+                     'Batch size, the train_config one if 0.')
+flags.DEFINE_boolean('sweep', True,
+                     'Whether to time other num_readers, num_parallel_batches '
+                     'and num_prefetch_batches settings.')
+
+FLAGS = flags.FLAGS
+
+
+def main(argv):
+  del argv  # Unused.
+  flags.mark_flag_as_required('pipeline_config_path')
+
+  pipeline_config = pipeline_pb2.TrainEvalPipelineConfig()
+  with tf.gfile.GFile(FLAGS.pipeline_config_path, 'r') as f:
+    text_format.Merge(f.read(), pipeline_config)
+  text_format.Merge(FLAGS.config_override, pipeline_config)
+  configs = config_util.create_configs_from_pipeline_proto(pipeline_config)
+  report = profile_input_pipeline_lib.profile(
+      configs,
+      num_examples=FLAGS.num_examples,
+      num_batches=FLAGS.num_batches,
+      batch_size=FLAGS.batch_size or None,
+      sweep=FLAGS.sweep)
+  print(profile_input_pipeline_lib.format_report(report))
+  if FLAGS.output_path:
+    with tf.gfile.GFile(FLAGS.output_path, 'w') as f:
+      json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+  tf.app.run(main)
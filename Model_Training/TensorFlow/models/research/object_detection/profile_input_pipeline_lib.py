@@ -0,0 +1,390 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Profiles the training input pipeline of a pipeline config without a model.
+
+The training input pipeline is read_dataset, TfExampleDecoder.decode, the
+data augmentation options, transform_input_data (resize, model preprocess, one
+hot classes) and pad_input_data_to_static_shapes, batched and prefetched. Each
+stage is timed on its own, single threaded, by running the pipeline cut after
+that stage and subtracting the time of the pipeline cut before it. Stages after
+decoding run on a few decoded examples cached in memory so that reading and
+decoding do not count towards them. Each augmentation option is timed the same
+way on its own.
+
+The exact pipeline inputs.create_train_input_fn builds is then timed as
+configured, and again with num_readers, num_parallel_batches and
+num_prefetch_batches changed one at a time, which shows what each knob buys.
+Only the dataset runs, no model graph is built past model.preprocess.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import functools
+import multiprocessing
+import resource
+import time
+
+import tensorflow as tf
+
+from object_detection import inputs
+from object_detection.builders import dataset_builder
+from object_detection.builders import image_resizer_builder
+from object_detection.builders import model_builder
+from object_detection.builders import preprocessor_builder
+from object_detection.protos import input_reader_pb2
+from object_detection.utils import config_util
+from object_detection.utils import training_cache
+
+# Values tried for each knob, besides the configured one.
+KNOB_VALUES = {
+    'num_readers': [1, 2, 4, 8],
+    'num_parallel_batches': [1, 2, 4, 8],
+    'num_prefetch_batches': [1, 2, 4],
+}
+
+
+def flatten_tensors(structure):
+  """Returns the tensors of a nested dict/tuple/list structure as a list."""
+  if isinstance(structure, dict):
+    return [t for key in sorted(structure)
+            for t in flatten_tensors(structure[key])]
+  if isinstance(structure, (list, tuple)):
+    return [t for item in structure for t in flatten_tensors(item)]
+  return [structure]
+
+
+def _cpu_seconds():
+  usage = resource.getrusage(resource.RUSAGE_SELF)
+  return usage.ru_utime + usage.ru_stime
+
+
+def time_dataset(dataset_fn, num_elements, num_warmup=1,
+                 examples_per_element=1):
+  """Times iterating over a dataset.
+
+  The elements are computed but not fetched, copying them out of the session
+  would add to every stage.
+
+  Args:
+    dataset_fn: Function returning the tf.data.Dataset, called in a new graph.
+    num_elements: Number of elements to time.
+    num_warmup: Number of elements to skip before timing.
+    examples_per_element: Number of examples in an element, the batch size of
+      a batched dataset.
+
+  Returns:
+    A dictionary with the examples_per_sec, ms_per_example and the
+    cpu_utilization (fraction of all cores busy) while timing.
+  """
+  with tf.Graph().as_default():
+    element = dataset_builder.make_initializable_iterator(
+        dataset_fn()).get_next()
+    run_op = tf.group(*flatten_tensors(element))
+    with tf.Session() as sess:
+      sess.run(tf.tables_initializer())
+      for _ in range(num_warmup):
+        sess.run(run_op)
+      start_cpu = _cpu_seconds()
+      start = time.time()
+      for _ in range(num_elements):
+        sess.run(run_op)
+      wall = max(time.time() - start, 1e-9)
+      cpu = _cpu_seconds() - start_cpu
+  num_examples = num_elements * examples_per_element
+  return {
+      'examples_per_sec': num_examples / wall,
+      'ms_per_example': 1000.0 * wall / num_examples,
+      'cpu_utilization': cpu / (wall * multiprocessing.cpu_count()),
+  }
+
+
+def _single_threaded_config(input_config):
+  """Copy of input_config reading one file at a time, decoding in order."""
+  config = input_reader_pb2.InputReader()
+  config.CopyFrom(input_config)
+  config.shuffle = False
+  config.num_epochs = 0
+  config.num_readers = 1
+  config.num_parallel_map_calls = 1
+  config.num_prefetch_batches = 1
+  return config
+
+
+def _is_cached_input(input_config):
+  return all(training_cache.is_training_cache(path)
+             for path in input_config.tf_record_input_reader.input_path)
+
+
+def _stage_fns(configs, augmentation_steps):
+  """Returns the augment, transform and pad functions of the train pipeline.
+
+  Mirrors the transform_and_pad_input_data_fn of create_train_input_fn, split
+  into its stages.
+
+  Args:
+    configs: Dictionary of configs, see config_util.
+    augmentation_steps: List of preprocessor_pb2.PreprocessingStep to augment
+      with.
+
+  Returns:
+    A tuple (augment_fn, transform_fn, pad_fn) of tensor_dict functions.
+  """
+  train_config = configs['train_config']
+  input_config = configs['train_input_config']
+  model_config = configs['model']
+  image_resizer_config = config_util.get_image_resizer_config(model_config)
+  num_classes = config_util.get_number_of_classes(model_config)
+
+  def augment_fn(tensor_dict):
+    return inputs.augment_input_data(
+        tensor_dict,
+        [preprocessor_builder.build(step) for step in augmentation_steps])
+
+  def transform_fn(tensor_dict):
+    model = model_builder.build(model_config, is_training=True)
+    return inputs.transform_input_data(
+        tensor_dict, model_preprocess_fn=model.preprocess,
+        image_resizer_fn=image_resizer_builder.build(image_resizer_config),
+        num_classes=num_classes,
+        merge_multiple_boxes=train_config.merge_multiple_label_boxes,
+        retain_original_image=train_config.retain_original_images,
+        use_bfloat16=train_config.use_bfloat16)
+
+  pad_fn = functools.partial(
+      inputs.pad_input_data_to_static_shapes,
+      max_num_boxes=input_config.max_number_of_boxes,
+      num_classes=num_classes,
+      spatial_image_shape=config_util.get_spatial_image_size(
+          image_resizer_config))
+  return augment_fn, transform_fn, pad_fn
+
+
+def profile_stages(configs, num_examples=32):
+  """Times every stage of the train input pipeline, single threaded.
+
+  Args:
+    configs: Dictionary of configs, see config_util.
+    num_examples: Number of examples each stage is timed on.
+
+  Returns:
+    A tuple (stages, augmentations) of lists of (name, ms_per_example). The
+    read stage is None for training caches, reading them is part of decode.
+  """
+  input_config = _single_threaded_config(configs['train_input_config'])
+  steps = list(configs['train_config'].data_augmentation_options)
+
+  def decoded_dataset():
+    return dataset_builder.build(input_config)
+
+  def cached_dataset():
+    return decoded_dataset().take(num_examples).cache().repeat()
+
+  def time_cut(*fns):
+    def dataset_fn():
+      dataset = cached_dataset()
+      for fn in fns:
+        dataset = dataset.map(fn)
+      return dataset
+    # The first pass fills the cache.
+    return time_dataset(dataset_fn, num_examples,
+                        num_warmup=num_examples)['ms_per_example']
+
+  if _is_cached_input(input_config):
+    read_ms = None
+  else:
+    def read_dataset():
+      return dataset_builder.read_dataset(
+          functools.partial(tf.data.TFRecordDataset,
+                            buffer_size=8 * 1000 * 1000),
+          input_config.tf_record_input_reader.input_path[:], input_config)
+    read_ms = time_dataset(read_dataset, num_examples)['ms_per_example']
+  decode_ms = time_dataset(decoded_dataset, num_examples)['ms_per_example']
+  augment_fn, transform_fn, pad_fn = _stage_fns(configs, steps)
+  cached_ms = time_cut()
+  augment_ms = time_cut(augment_fn)
+  transform_ms = time_cut(augment_fn, transform_fn)
+  pad_ms = time_cut(augment_fn, transform_fn, pad_fn)
+
+  stages = [
+      ('read', read_ms),
+      ('decode', decode_ms - (read_ms or 0.0)),
+      ('augment', augment_ms - cached_ms),
+      ('transform', transform_ms - augment_ms),
+      ('pad', pad_ms - transform_ms),
+  ]
+  # Timing noise can make a cheap stage come out slightly negative.
+  stages = [(name, None if ms is None else max(ms, 0.0))
+            for name, ms in stages]
+
+  augmentations = []
+  no_op_ms = time_cut(_stage_fns(configs, [])[0])
+  for step in steps:
+    step_fn = _stage_fns(configs, [step])[0]
+    augmentations.append((step.WhichOneof('preprocessing_step'),
+                          max(time_cut(step_fn) - no_op_ms, 0.0)))
+  return stages, augmentations
+
+
+def profile_pipeline(configs, num_batches=20, num_warmup=5, batch_size=None,
+                     **knobs):
+  """Times the exact train input pipeline of create_train_input_fn.
+
+  Args:
+    configs: Dictionary of configs, see config_util.
+    num_batches: Number of batches to time.
+    num_warmup: Number of batches to skip before timing, filling the shuffle
+      buffer and the prefetch buffer.
+    batch_size: Batch size, the train_config one if None.
+    **knobs: InputReader fields to override, e.g. num_readers=4.
+
+  Returns:
+    The time_dataset dictionary of the pipeline.
+  """
+  input_config = input_reader_pb2.InputReader()
+  input_config.CopyFrom(configs['train_input_config'])
+  for name, value in knobs.items():
+    setattr(input_config, name, value)
+  batch_size = batch_size or configs['train_config'].batch_size
+  train_input_fn = inputs.create_train_input_fn(
+      configs['train_config'], input_config, configs['model'])
+  return time_dataset(
+      lambda: train_input_fn(params={'batch_size': batch_size}), num_batches,
+      num_warmup=num_warmup, examples_per_element=batch_size)
+
+
+def knob_values(knob, current):
+  """Returns the values of knob to try, the configured one included."""
+  return sorted(set(KNOB_VALUES[knob] + [current]))
+
+
+def recommend(report):
+  """Returns a list of tuning recommendations for a profile report."""
+  recommendations = []
+  current = report['pipeline']['examples_per_sec']
+  for knob, results in sorted(report['sweeps'].items()):
+    best = max(results, key=lambda result: result['examples_per_sec'])
+    better = best['examples_per_sec'] > 1.1 * current
+    if best['value'] != report['knobs'][knob] and better:
+      recommendations.append(
+          'Set %s to %d: %.1f examples/sec instead of %.1f.' %
+          (knob, best['value'], best['examples_per_sec'], current))
+  stages = [(ms, name) for name, ms in report['stages'] if ms is not None]
+  if stages:
+    heaviest_ms, heaviest = max(stages)
+    total_ms = sum(ms for ms, _ in stages)
+    if report['pipeline']['cpu_utilization'] > 0.85:
+      recommendations.append(
+          'The pipeline is CPU bound, more parallelism will not help. %s '
+          'takes %.0f%% of the work per example.' %
+          (heaviest, 100.0 * heaviest_ms / max(total_ms, 1e-9)))
+      if heaviest in ('decode', 'transform'):
+        recommendations.append(
+            'Decoding and resizing can be done once with '
+            'dataset_tools/create_training_cache.py.')
+    elif current < 0.5 * report['cpu_bound_examples_per_sec']:
+      recommendations.append(
+          'The pipeline keeps %.0f%% of the cores busy and reaches %.0f%% of '
+          'the %.1f examples/sec the cores could decode, it waits on I/O or '
+          'on too little parallelism.' %
+          (100.0 * report['pipeline']['cpu_utilization'],
+           100.0 * current / report['cpu_bound_examples_per_sec'],
+           report['cpu_bound_examples_per_sec']))
+  if not recommendations:
+    recommendations.append('The configured knobs are as good as the ones '
+                           'tried.')
+  return recommendations
+
+
+def profile(configs, num_examples=32, num_batches=20, batch_size=None,
+            sweep=True):
+  """Profiles the train input pipeline of configs.
+
+  Args:
+    configs: Dictionary of configs, see config_util.
+    num_examples: Number of examples each stage is timed on.
+    num_batches: Number of batches each full pipeline run is timed on.
+    batch_size: Batch size, the train_config one if None.
+    sweep: Whether to time the knob settings in KNOB_VALUES too.
+
+  Returns:
+    The report dictionary, see format_report.
+  """
+  input_config = configs['train_input_config']
+  batch_size = batch_size or configs['train_config'].batch_size
+  stages, augmentations = profile_stages(configs, num_examples)
+  total_ms = sum(ms for _, ms in stages if ms is not None)
+  num_cores = multiprocessing.cpu_count()
+  report = {
+      'input_path': list(input_config.tf_record_input_reader.input_path),
+      'batch_size': batch_size,
+      'num_cores': num_cores,
+      'knobs': {knob: getattr(input_config, knob) for knob in KNOB_VALUES},
+      'stages': stages,
+      'augmentations': augmentations,
+      'cpu_bound_examples_per_sec': num_cores * 1000.0 / max(total_ms, 1e-9),
+      'pipeline': profile_pipeline(configs, num_batches,
+                                   batch_size=batch_size),
+      'sweeps': {},
+  }
+  if sweep:
+    for knob in KNOB_VALUES:
+      results = []
+      for value in knob_values(knob, report['knobs'][knob]):
+        if value == report['knobs'][knob]:
+          result = dict(report['pipeline'])
+        else:
+          result = profile_pipeline(configs, num_batches,
+                                    batch_size=batch_size, **{knob: value})
+        result['value'] = value
+        results.append(result)
+      report['sweeps'][knob] = results
+  report['recommendations'] = recommend(report)
+  return report
+
+
+def format_report(report):
+  """Formats a profile report as text."""
+  lines = ['Input pipeline of %s' % ', '.join(report['input_path']),
+           'batch size %d, %d cores' % (report['batch_size'],
+                                        report['num_cores']),
+           '',
+           'Stage cost, single threaded (ms per example):']
+  for name, ms in report['stages']:
+    lines.append('  %-28s %s' % (name, 'n/a' if ms is None else '%8.2f' % ms))
+    if name == 'augment':
+      for op_name, op_ms in report['augmentations']:
+        lines.append('    %-26s %8.2f' % (op_name, op_ms))
+  lines.append('  at most %.1f examples/sec on all cores' %
+               report['cpu_bound_examples_per_sec'])
+  lines.append('')
+  knobs = ', '.join('%s %d' % item for item in sorted(report['knobs'].items()))
+  lines.append('Pipeline as configured (%s):' % knobs)
+  lines.append('  %.1f examples/sec, CPU %.0f%%' %
+               (report['pipeline']['examples_per_sec'],
+                100.0 * report['pipeline']['cpu_utilization']))
+  for knob, results in sorted(report['sweeps'].items()):
+    lines.append('')
+    lines.append('%s:' % knob)
+    for result in results:
+      configured = result['value'] == report['knobs'][knob]
+      marker = ' (configured)' if configured else ''
+      lines.append('  %-6d %8.1f examples/sec, CPU %3.0f%%%s' %
+                   (result['value'], result['examples_per_sec'],
+                    100.0 * result['cpu_utilization'], marker))
+  lines.append('')
+  lines.append('Recommendations:')
+  lines.extend('  ' + line for line in report['recommendations'])
+  return '\n'.join(lines)
@@ -0,0 +1,116 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.profile_input_pipeline_lib."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import os
+import tensorflow as tf
+from object_detection import profile_input_pipeline_lib
+from object_detection.utils import config_util
+
+
+def _get_configs_for_model(model_name):
+  """Returns configurations for model, reading the pets test record."""
+  fname = os.path.join(tf.resource_loader.get_data_files_path(),
+                       'samples/configs/' + model_name + '.config')
+  label_map_path = os.path.join(tf.resource_loader.get_data_files_path(),
+                                'data/pet_label_map.pbtxt')
+  data_path = os.path.join(tf.resource_loader.get_data_files_path(),
+                           'test_data/pets_examples.record')
+  configs = config_util.get_configs_from_pipeline_file(fname)
+  override_dict = {
+      'train_input_path': data_path,
+      'label_map_path': label_map_path
+  }
+  return config_util.merge_external_params_with_configs(
+      configs, kwargs_dict=override_dict)
+
+
+def _report(examples_per_sec, cpu_utilization, sweeps):
+  return {
+      'input_path': ['train.record'],
+      'batch_size': 8,
+      'num_cores': 4,
+      'knobs': {'num_readers': 1, 'num_parallel_batches': 8,
+                'num_prefetch_batches': 2},
+      'stages': [('read', 0.5), ('decode', 20.0), ('augment', 5.0),
+                 ('transform', 4.0), ('pad', 0.5)],
+      'augmentations': [('random_horizontal_flip', 1.0),
+                        ('ssd_random_crop', 4.0)],
+      'cpu_bound_examples_per_sec': 133.3,
+      'pipeline': {'examples_per_sec': examples_per_sec,
+                   'ms_per_example': 1000.0 / examples_per_sec,
+                   'cpu_utilization': cpu_utilization},
+      'sweeps': sweeps,
+  }
+
+
+class ProfileInputPipelineTest(tf.test.TestCase):
+
+  def test_flatten_tensors(self):
+    self.assertEqual(
+        [1, 2, 3, 4],
+        profile_input_pipeline_lib.flatten_tensors(
+            ({'b': 2, 'a': 1}, [3, (4,)])))
+
+  def test_knob_values_include_configured_value(self):
+    self.assertEqual([1, 2, 4, 8, 64],
+                     profile_input_pipeline_lib.knob_values('num_readers', 64))
+    self.assertEqual([1, 2, 4],
+                     profile_input_pipeline_lib.knob_values(
+                         'num_prefetch_batches', 2))
+
+  def test_recommends_faster_knob_setting(self):
+    sweeps = {'num_readers': [
+        {'value': 1, 'examples_per_sec': 40.0, 'cpu_utilization': 0.3},
+        {'value': 4, 'examples_per_sec': 90.0, 'cpu_utilization': 0.7}]}
+    recommendations = profile_input_pipeline_lib.recommend(
+        _report(40.0, 0.3, sweeps))
+    self.assertIn('Set num_readers to 4: 90.0 examples/sec instead of 40.0.',
+                  recommendations)
+
+  def test_recommends_training_cache_when_cpu_bound_on_decode(self):
+    recommendations = profile_input_pipeline_lib.recommend(
+        _report(120.0, 0.95, {}))
+    self.assertEqual(2, len(recommendations))
+    self.assertIn('decode takes 67%', recommendations[0])
+    self.assertIn('create_training_cache.py', recommendations[1])
+
+  def test_format_report(self):
+    report = _report(40.0, 0.3, {})
+    report['recommendations'] = ['Nothing to change.']
+    text = profile_input_pipeline_lib.format_report(report)
+    self.assertIn('ssd_random_crop', text)
+    self.assertIn('40.0 examples/sec, CPU 30%', text)
+    self.assertIn('Nothing to change.', text)
+
+  def test_profile_ssd_train_input(self):
+    configs = _get_configs_for_model('ssd_inception_v2_pets')
+    report = profile_input_pipeline_lib.profile(
+        configs, num_examples=2, num_batches=2, batch_size=2, sweep=False)
+    self.assertEqual(['read', 'decode', 'augment', 'transform', 'pad'],
+                     [name for name, _ in report['stages']])
+    self.assertEqual(['random_horizontal_flip', 'ssd_random_crop'],
+                     [name for name, _ in report['augmentations']])
+    for _, ms in report['stages'] + report['augmentations']:
+      self.assertGreaterEqual(ms, 0.0)
+    self.assertGreater(report['pipeline']['examples_per_sec'], 0.0)
+    self.assertTrue(report['recommendations'])
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,204 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Pre-decoded, pre-resized training cache.
+
+Decoding full size JPEGs and resizing them to the model input on every epoch
+keeps training CPU bound. A training cache stores the images once, already
+decoded and resized, as raw uint8 pixels in a single file that is memory
+mapped at training time, with the box annotations in small numpy arrays next
+to it. A cache is a directory:
+
+  cache_info.json  format version, sizes and the per example source ids
+  images.bin       the uint8 [height, width, 3] images back to back
+  index.npy        int64 [num_examples, 5]: byte offset of the image, height,
+                   width, first box and number of boxes of every example
+  boxes.npy        float32 [num_boxes, 4] normalized [ymin, xmin, ymax, xmax]
+  classes.npy      int64 [num_boxes]
+  weights.npy      float32 [num_boxes]
+  difficult.npy    bool [num_boxes]
+
+Boxes are normalized, so they do not change when the images are resized.
+See dataset_tools/create_training_cache.py to build one from TFRecords.
+"""
+
+import json
+import os
+
+import numpy as np
+
+CACHE_INFO_FILE = 'cache_info.json'
+CACHE_VERSION = 1
+
+
+def is_training_cache(path):
+  """Returns whether path is a training cache directory."""
+  return os.path.isfile(os.path.join(path, CACHE_INFO_FILE))
+
+
+class TrainingCacheWriter(object):
+  """Writes a training cache one example at a time."""
+
+  def __init__(self, cache_dir, image_size=None, max_dimension=None):
+    """Constructor.
+
+    Args:
+      cache_dir: directory to write the cache to, created if needed.
+      image_size: (height, width) the images were resized to, or None.
+      max_dimension: largest side the images were resized to, or None.
+    """
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    self._cache_dir = cache_dir
+    self._image_size = list(image_size) if image_size else None
+    self._max_dimension = max_dimension
+    self._images = open(os.path.join(cache_dir, 'images.bin'), 'wb')
+    self._offset = 0
+    self._index = []
+    self._source_ids = []
+    self._filenames = []
+    self._boxes = []
+    self._classes = []
+    self._weights = []
+    self._difficult = []
+    self._num_boxes = 0
+
+  def add(self, image, boxes, classes, source_id='', filename='',
+          weights=None, difficult=None):
+    """Appends an example.
+
+    Args:
+      image: uint8 numpy array of shape [height, width, 3].
+      boxes: float numpy array of shape [num_boxes, 4] with normalized
+        [ymin, xmin, ymax, xmax] corners.
+      classes: int numpy array of shape [num_boxes].
+      source_id: string id of the example.
+      filename: string filename of the example.
+      weights: optional float numpy array of shape [num_boxes], ones if None.
+      difficult: optional bool numpy array of shape [num_boxes], False if None.
+
+    Raises:
+      ValueError: if the image is not [height, width, 3] uint8.
+    """
+    image = np.ascontiguousarray(image)
+    if image.dtype != np.uint8 or image.ndim != 3 or image.shape[2] != 3:
+      raise ValueError('Expected a uint8 [height, width, 3] image, got %s %s' %
+                       (image.dtype, image.shape))
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    num_boxes = len(boxes)
+    if weights is None or len(weights) == 0:
+      weights = np.ones(num_boxes, dtype=np.float32)
+    if difficult is None or len(difficult) == 0:
+      difficult = np.zeros(num_boxes, dtype=bool)
+    self._images.write(image.tobytes())
+    self._index.append([self._offset, image.shape[0], image.shape[1],
+                        self._num_boxes, num_boxes])
+    self._offset += image.nbytes
+    self._num_boxes += num_boxes
+    self._boxes.append(boxes)
+    self._classes.append(np.asarray(classes, dtype=np.int64).reshape(-1))
+    self._weights.append(np.asarray(weights, dtype=np.float32).reshape(-1))
+    self._difficult.append(np.asarray(difficult, dtype=bool).reshape(-1))
+    self._source_ids.append(_to_str(source_id))
+    self._filenames.append(_to_str(filename))
+
+  def close(self):
+    """Writes the annotations and the cache info, returns the example count."""
+    self._images.close()
+    index = np.array(self._index, dtype=np.int64).reshape(-1, 5)
+    np.save(os.path.join(self._cache_dir, 'index.npy'), index)
+    arrays = [('boxes', self._boxes, np.float32, (0, 4)),
+              ('classes', self._classes, np.int64, (0,)),
+              ('weights', self._weights, np.float32, (0,)),
+              ('difficult', self._difficult, bool, (0,))]
+    for name, values, dtype, empty_shape in arrays:
+      array = (np.concatenate(values).astype(dtype) if values
+               else np.zeros(empty_shape, dtype=dtype))
+      np.save(os.path.join(self._cache_dir, name + '.npy'), array)
+    info = {
+        'version': CACHE_VERSION,
+        'num_examples': len(index),
+        'num_boxes': self._num_boxes,
+        'image_size': self._image_size,
+        'max_dimension': self._max_dimension,
+        'source_ids': self._source_ids,
+        'filenames': self._filenames,
+    }
+    # The info file goes last, a directory without it is not a cache.
+    with open(os.path.join(self._cache_dir, CACHE_INFO_FILE), 'w') as f:
+      json.dump(info, f)
+    return len(index)
+
+
+class TrainingCache(object):
+  """Memory mapped view of a training cache."""
+
+  def __init__(self, cache_dir):
+    """Constructor.
+
+    Args:
+      cache_dir: directory of a cache written by TrainingCacheWriter.
+
+    Raises:
+      ValueError: if cache_dir is not a training cache or has another version.
+    """
+    if not is_training_cache(cache_dir):
+      raise ValueError('%s is not a training cache.' % cache_dir)
+    with open(os.path.join(cache_dir, CACHE_INFO_FILE)) as f:
+      self.info = json.load(f)
+    if self.info['version'] != CACHE_VERSION:
+      raise ValueError('Training cache %s has version %d, expected %d.' %
+                       (cache_dir, self.info['version'], CACHE_VERSION))
+    self.cache_dir = cache_dir
+    self._index = np.load(os.path.join(cache_dir, 'index.npy'))
+    images_path = os.path.join(cache_dir, 'images.bin')
+    if os.path.getsize(images_path):
+      self._images = np.memmap(images_path, dtype=np.uint8, mode='r')
+    else:
+      self._images = np.zeros(0, dtype=np.uint8)
+    self._boxes = np.load(os.path.join(cache_dir, 'boxes.npy'))
+    self._classes = np.load(os.path.join(cache_dir, 'classes.npy'))
+    self._weights = np.load(os.path.join(cache_dir, 'weights.npy'))
+    self._difficult = np.load(os.path.join(cache_dir, 'difficult.npy'))
+    self._source_ids = [s.encode('utf8') for s in self.info['source_ids']]
+    self._filenames = [s.encode('utf8') for s in self.info['filenames']]
+
+  def __len__(self):
+    return len(self._index)
+
+  def get(self, i):
+    """Returns example i.
+
+    Args:
+      i: index of the example.
+
+    Returns:
+      A tuple (image, boxes, classes, weights, difficult, source_id, filename)
+      of numpy arrays and bytes. The image is a copy, the memory map stays
+      read only.
+    """
+    offset, height, width, first_box, num_boxes = self._index[i]
+    image = np.array(
+        self._images[offset:offset + height * width * 3]).reshape(
+            height, width, 3)
+    box_slice = slice(first_box, first_box + num_boxes)
+    return (image, self._boxes[box_slice], self._classes[box_slice],
+            self._weights[box_slice], self._difficult[box_slice],
+            self._source_ids[i], self._filenames[i])
+
+
+def _to_str(value):
+  if isinstance(value, bytes):
+    return value.decode('utf8')
+  return str(value)
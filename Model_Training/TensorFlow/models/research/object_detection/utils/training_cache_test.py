@@ -0,0 +1,82 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.utils.training_cache."""
+
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from object_detection.utils import training_cache
+
+
+class TrainingCacheTest(tf.test.TestCase):
+
+  def test_round_trip(self):
+    cache_dir = os.path.join(self.get_temp_dir(), 'round_trip')
+    images = [np.random.randint(255, size=(4, 5, 3)).astype(np.uint8),
+              np.random.randint(255, size=(6, 3, 3)).astype(np.uint8),
+              np.random.randint(255, size=(2, 2, 3)).astype(np.uint8)]
+    writer = training_cache.TrainingCacheWriter(cache_dir, max_dimension=6)
+    writer.add(images[0], [[0.0, 0.1, 0.5, 0.6]], [3], source_id=b'a',
+               filename='a.jpg', difficult=[True])
+    writer.add(images[1], [[0.0, 0.0, 1.0, 1.0], [0.2, 0.2, 0.4, 0.4]],
+               [1, 2], source_id='b', weights=[0.5, 1.0])
+    writer.add(images[2], np.zeros((0, 4)), [], source_id='c')
+    self.assertEqual(3, writer.close())
+
+    self.assertTrue(training_cache.is_training_cache(cache_dir))
+    cache = training_cache.TrainingCache(cache_dir)
+    self.assertEqual(3, len(cache))
+    self.assertEqual(6, cache.info['max_dimension'])
+
+    (image, boxes, classes, weights, difficult, source_id,
+     filename) = cache.get(0)
+    self.assertAllEqual(images[0], image)
+    self.assertAllClose([[0.0, 0.1, 0.5, 0.6]], boxes)
+    self.assertAllEqual([3], classes)
+    self.assertAllEqual([1.0], weights)
+    self.assertAllEqual([True], difficult)
+    self.assertEqual(b'a', source_id)
+    self.assertEqual(b'a.jpg', filename)
+
+    image, boxes, classes, weights, difficult, source_id, _ = cache.get(1)
+    self.assertAllEqual(images[1], image)
+    self.assertAllEqual([1, 2], classes)
+    self.assertAllClose([0.5, 1.0], weights)
+    self.assertAllEqual([False, False], difficult)
+    self.assertEqual(b'b', source_id)
+
+    image, boxes, classes, _, _, _, _ = cache.get(2)
+    self.assertAllEqual(images[2], image)
+    self.assertEqual((0, 4), boxes.shape)
+    self.assertEqual((0,), classes.shape)
+
+  def test_rejects_non_uint8_image(self):
+    writer = training_cache.TrainingCacheWriter(
+        os.path.join(self.get_temp_dir(), 'float_image'))
+    with self.assertRaises(ValueError):
+      writer.add(np.zeros((4, 5, 3), dtype=np.float32), [], [])
+
+  def test_missing_cache(self):
+    cache_dir = os.path.join(self.get_temp_dir(), 'missing')
+    self.assertFalse(training_cache.is_training_cache(cache_dir))
+    with self.assertRaises(ValueError):
+      training_cache.TrainingCache(cache_dir)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -1,6 +1,7 @@
 """ Sample TensorFlow XML-to-TFRecord converter
 
 usage: generate_tfrecord.py [-h] [-x XML_DIR] [-l LABELS_PATH] [-o OUTPUT_PATH] [-i IMAGE_DIR] [-c CSV_PATH]
+                            [-s NUM_SHARDS] [-w NUM_WORKERS] [-u] [--compact]
 
 optional arguments:
   -h, --help            show this help message and exit
@@ -14,112 +15,158 @@ optional arguments:
                         Path to the folder where the input image files are stored. Defaults to the same directory as XML_DIR.
   -c CSV_PATH, --csv_path CSV_PATH
                         Path of output .csv file. If none provided, then no file will be written.
+  -s NUM_SHARDS, --num_shards NUM_SHARDS
+                        Number of TFRecord shards to write. Defaults to 1.
+  -w NUM_WORKERS, --num_workers NUM_WORKERS
+                        Number of processes building examples. Defaults to the number of CPUs.
+  -u, --update          Only encode the examples whose .xml or image changed since the manifest
+                        was written, into a delta shard.
+  --compact             Merge the delta shards into the main shards.
+
+The XML files are read one at a time by a pool of worker processes and the image sizes are read
+from the JPEG (or PNG) header, so no image is decoded. With more than one shard the examples go
+round robin into OUTPUT_PATH-00000-of-0000N ... files, which the pipeline config reads with
+    input_path: "annotations/train.record-?????-of-0000N"
+and as many num_readers as there are shards. OUTPUT_PATH.manifest.json lists the shards, the
+number of examples and objects per class and which shard every example went into, along with
+the size, modification time and SHA-1 of its .xml and image.
+
+After a labeling pass, --update compares the files against the manifest (hashing only files whose
+size or modification time changed) and encodes just the new and changed examples into
+OUTPUT_PATH-delta-NNNNN. The old versions of changed or deleted examples are marked stale in the
+manifest; they stay in the main shards until --compact, which copies the records of the shards
+that have stale records or take delta examples into new files without decoding them. Train on
+the main shards after compacting, before that they still contain the stale examples.
 """
 
 import os
 import glob
-import pandas as pd
+import hashlib
 import io
+import csv
+import json
+import struct
+import time
+import contextlib
+import multiprocessing
 import xml.etree.ElementTree as ET
 import argparse
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'    # Suppress TensorFlow logging (1)
 import tensorflow.compat.v1 as tf
-from PIL import Image
 from object_detection.utils import dataset_util, label_map_util
-from collections import namedtuple
-
-# Initiate argument parser
-parser = argparse.ArgumentParser(
-    description="Sample TensorFlow XML-to-TFRecord converter")
-parser.add_argument("-x",
-                    "--xml_dir",
-                    help="Path to the folder where the input .xml files are stored.",
-                    type=str)
-parser.add_argument("-l",
-                    "--labels_path",
-                    help="Path to the labels (.pbtxt) file.", type=str)
-parser.add_argument("-o",
-                    "--output_path",
-                    help="Path of output TFRecord (.record) file.", type=str)
-parser.add_argument("-i",
-                    "--image_dir",
-                    help="Path to the folder where the input image files are stored. "
-                         "Defaults to the same directory as XML_DIR.",
-                    type=str, default=None)
-parser.add_argument("-c",
-                    "--csv_path",
-                    help="Path of output .csv file. If none provided, then no file will be "
-                         "written.",
-                    type=str, default=None)
-
-args = parser.parse_args()
-
-if args.image_dir is None:
-    args.image_dir = args.xml_dir
-
-# label_map = label_map_util.load_labelmap(args.labels_path)
-# label_map_dict = label_map_util.get_label_map_dict(label_map)
-label_map_dict = label_map_util.get_label_map_dict(args.labels_path)
-
-def xml_to_csv(path):
-    """Iterates through all .xml files (generated by labelImg) in a given directory and combines
-    them in a single Pandas dataframe.
+from object_detection.dataset_tools import tf_record_creation_util
+
+label_map_dict = {}
+
+
+def init_worker(labels):
+    """Sets the label map of a worker process."""
+    global label_map_dict
+    label_map_dict = labels
+
+
+def iter_annotations(xml_file):
+    """Streams the objects of a labelImg .xml file.
 
     Parameters:
     ----------
-    path : str
-        The path containing the .xml files
+    xml_file : str
+        Path of the .xml file
     Returns
     -------
-    Pandas DataFrame
-        The produced dataframe
+    tuple
+        The image filename and a list of (class, xmin, ymin, xmax, ymax) tuples
     """
 
-    xml_list = []
-    for xml_file in glob.glob(path + '/*.xml'):
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        filename = root.find('filename').text
-        width = int(root.find('size').find('width').text)
-        height = int(root.find('size').find('height').text)
-        for member in root.findall('object'):
-            bndbox = member.find('bndbox')
-            value = (filename,
-                     width,
-                     height,
-                     member.find('name').text,
-                     int(bndbox.find('xmin').text),
-                     int(bndbox.find('ymin').text),
-                     int(bndbox.find('xmax').text),
-                     int(bndbox.find('ymax').text),
-                     )
-            xml_list.append(value)
-    column_name = ['filename', 'width', 'height',
-                   'class', 'xmin', 'ymin', 'xmax', 'ymax']
-    xml_df = pd.DataFrame(xml_list, columns=column_name)
-    return xml_df
+    filename = None
+    objects = []
+    name = None
+    box = {}
+    for event, element in ET.iterparse(xml_file, events=('end',)):
+        if element.tag == 'filename' and filename is None:
+            filename = element.text
+        elif element.tag == 'name':
+            name = element.text
+        elif element.tag in ('xmin', 'ymin', 'xmax', 'ymax'):
+            box[element.tag] = int(float(element.text))
+        elif element.tag == 'object':
+            objects.append((name, box['xmin'], box['ymin'], box['xmax'], box['ymax']))
+            name = None
+            box = {}
+            element.clear()
+    return filename, objects
 
 
-def class_text_to_int(row_label):
-    return label_map_dict[row_label]
+def image_size(encoded):
+    """Reads the (width, height) of a JPEG or PNG image from its header without decoding it.
 
+    Parameters:
+    ----------
+    encoded : bytes
+        The encoded image
+    Returns
+    -------
+    tuple
+        (width, height), or None if the header could not be read
+    """
+
+    if encoded[:8] == b'\x89PNG\r\n\x1a\n':
+        width, height = struct.unpack('>II', encoded[16:24])
+        return width, height
+    if encoded[:2] != b'\xff\xd8':
+        return None
+    offset = 2
+    while offset + 4 <= len(encoded):
+        if encoded[offset] != 0xFF:
+            offset += 1
+            continue
+        marker = encoded[offset + 1]
+        if marker == 0xFF:
+            # fill byte
+            offset += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            # markers without a length
+            offset += 2
+            continue
+        length = struct.unpack('>H', encoded[offset + 2:offset + 4])[0]
+        # start of frame markers, except DHT (C4), JPG (C8) and DAC (CC), hold the size
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', encoded[offset + 5:offset + 9])
+            return width, height
+        if marker == 0xDA:
+            # start of scan, no frame header before it
+            return None
+        offset += 2 + length
+    return None
 
-def split(df, group):
-    data = namedtuple('data', ['filename', 'object'])
-    gb = df.groupby(group)
-    return [data(filename, gb.get_group(x)) for filename, x in zip(gb.groups.keys(), gb.groups)]
 
+def file_signature(path):
+    """(size, modification time in ns) of a file, a cheap check for whether it changed."""
+    stat = os.stat(path)
+    return [stat.st_size, int(stat.st_mtime * 1e9)]
 
-def create_tf_example(group, path):
-    with tf.gfile.GFile(os.path.join(path, '{}'.format(group.filename)), 'rb') as fid:
+
+def sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def class_text_to_int(row_label):
+    return label_map_dict[row_label]
+
+
+def create_tf_example(filename, objects, path):
+    with tf.gfile.GFile(os.path.join(path, '{}'.format(filename)), 'rb') as fid:
         encoded_jpg = fid.read()
-    encoded_jpg_io = io.BytesIO(encoded_jpg)
-    image = Image.open(encoded_jpg_io)
-    width, height = image.size
+    size = image_size(encoded_jpg)
+    if size is None:
+        # unusual header, fall back to decoding the image
+        from PIL import Image
+        size = Image.open(io.BytesIO(encoded_jpg)).size
+    width, height = size
 
-    filename = group.filename.encode('utf8')
-    image_format = b'jpg'
+    image_format = b'png' if encoded_jpg[:4] == b'\x89PNG' else b'jpg'
     xmins = []
     xmaxs = []
     ymins = []
@@ -127,19 +174,19 @@ def create_tf_example(group, path):
     classes_text = []
     classes = []
 
-    for index, row in group.object.iterrows():
-        xmins.append(row['xmin'] / width)
-        xmaxs.append(row['xmax'] / width)
-        ymins.append(row['ymin'] / height)
-        ymaxs.append(row['ymax'] / height)
-        classes_text.append(row['class'].encode('utf8'))
-        classes.append(class_text_to_int(row['class']))
+    for name, xmin, ymin, xmax, ymax in objects:
+        xmins.append(xmin / width)
+        xmaxs.append(xmax / width)
+        ymins.append(ymin / height)
+        ymaxs.append(ymax / height)
+        classes_text.append(name.encode('utf8'))
+        classes.append(class_text_to_int(name))
 
     tf_example = tf.train.Example(features=tf.train.Features(feature={
         'image/height': dataset_util.int64_feature(height),
         'image/width': dataset_util.int64_feature(width),
-        'image/filename': dataset_util.bytes_feature(filename),
-        'image/source_id': dataset_util.bytes_feature(filename),
+        'image/filename': dataset_util.bytes_feature(filename.encode('utf8')),
+        'image/source_id': dataset_util.bytes_feature(filename.encode('utf8')),
         'image/encoded': dataset_util.bytes_feature(encoded_jpg),
         'image/format': dataset_util.bytes_feature(image_format),
         'image/object/bbox/xmin': dataset_util.float_list_feature(xmins),
@@ -149,24 +196,388 @@ def create_tf_example(group, path):
         'image/object/class/text': dataset_util.bytes_list_feature(classes_text),
         'image/object/class/label': dataset_util.int64_list_feature(classes),
     }))
-    return tf_example
+    return tf_example, width, height, encoded_jpg
+
+
+def build_example(task):
+    """Worker: turns one .xml file into a serialized tf.Example.
+
+    Parameters:
+    ----------
+    task : tuple
+        (xml_file, image_dir)
+    Returns
+    -------
+    dict
+        The serialized example and what the manifest and csv need to know about it
+    """
+
+    xml_file, image_dir = task
+    filename, objects = iter_annotations(xml_file)
+    tf_example, width, height, encoded = create_tf_example(filename, objects, image_dir)
+    with open(xml_file, 'rb') as f:
+        xml_sha1 = sha1(f.read())
+    return {
+        'xml': os.path.basename(xml_file),
+        'filename': filename,
+        'width': width,
+        'height': height,
+        'objects': objects,
+        'serialized': tf_example.SerializeToString(),
+        'xml_stat': file_signature(xml_file),
+        'xml_sha1': xml_sha1,
+        'image_stat': file_signature(os.path.join(image_dir, filename)),
+        'image_sha1': sha1(encoded),
+    }
+
+
+def manifest_entry(example, location, index):
+    """What the manifest keeps about an example, location is {'shard': k} or {'delta': name}."""
+    entry = {
+        'xml': example['xml'],
+        'filename': example['filename'],
+        'classes': [obj[0] for obj in example['objects']],
+        'index': index,
+        'xml_stat': example['xml_stat'],
+        'xml_sha1': example['xml_sha1'],
+        'image_stat': example['image_stat'],
+        'image_sha1': example['image_sha1'],
+    }
+    entry.update(location)
+    return entry
+
+
+def shard_paths(output_path, num_shards):
+    """Paths of the shards open_sharded_output_tfrecords writes, just output_path for one shard."""
+    if num_shards == 1:
+        return [output_path]
+    return ['{}-{:05d}-of-{:05d}'.format(output_path, idx, num_shards) for idx in range(num_shards)]
+
+
+def manifest_path(output_path):
+    return output_path + '.manifest.json'
+
+
+def load_manifest(output_path):
+    with open(manifest_path(output_path)) as f:
+        return json.load(f)
+
+
+def save_manifest(output_path, manifest):
+    """Recomputes the counts of the manifest from its examples and writes it."""
+    class_counts = {}
+    shard_counts = [0] * manifest['num_shards']
+    delta_counts = dict((name, 0) for name in manifest['deltas'])
+    for example in manifest['examples']:
+        for name in example['classes']:
+            class_counts[name] = class_counts.get(name, 0) + 1
+        if 'shard' in example:
+            shard_counts[example['shard']] += 1
+        else:
+            delta_counts[example['delta']] += 1
+    manifest.update({
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'label_map': label_map_dict or manifest.get('label_map', {}),
+        'shards': [{'path': os.path.basename(path), 'num_examples': count}
+                   for path, count in zip(shard_paths(output_path, manifest['num_shards']), shard_counts)],
+        'delta_shards': [{'path': name, 'num_examples': delta_counts[name]} for name in manifest['deltas']],
+        'num_examples': len(manifest['examples']),
+        'num_objects': sum(class_counts.values()),
+        'class_counts': class_counts,
+    })
+    # written next to it and swapped in, so a failed write leaves the old manifest
+    temp_path = manifest_path(output_path) + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(temp_path, manifest_path(output_path))
+    return manifest
+
+
+def generate(xml_dir, image_dir, output_path, num_shards=1, num_workers=None, csv_path=None):
+    """Writes the examples of every .xml file in xml_dir into num_shards TFRecord shards.
+
+    Returns
+    -------
+    dict
+        The manifest
+    """
+
+    xml_files = sorted(glob.glob(os.path.join(xml_dir, '*.xml')))
+    tasks = [(xml_file, image_dir) for xml_file in xml_files]
+    examples = []
+    shard_counts = [0] * num_shards
+    csv_file = open(csv_path, 'w', newline='') if csv_path is not None else None
+    if csv_file is not None:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(['filename', 'width', 'height', 'class', 'xmin', 'ymin', 'xmax', 'ymax'])
+    pool = multiprocessing.Pool(num_workers or os.cpu_count(), initializer=init_worker,
+                                initargs=(label_map_dict,))
+    try:
+        with contextlib.ExitStack() as tf_record_close_stack:
+            if num_shards == 1:
+                writers = [tf_record_close_stack.enter_context(tf.python_io.TFRecordWriter(output_path))]
+            else:
+                writers = tf_record_creation_util.open_sharded_output_tfrecords(
+                    tf_record_close_stack, output_path, num_shards)
+            # imap keeps the order of the files, so the shard of every example is reproducible
+            for index, example in enumerate(pool.imap(build_example, tasks, chunksize=4)):
+                shard = index % num_shards
+                writers[shard].write(example['serialized'])
+                examples.append(manifest_entry(example, {'shard': shard}, shard_counts[shard]))
+                shard_counts[shard] += 1
+                if csv_file is not None:
+                    for obj in example['objects']:
+                        csv_writer.writerow([example['filename'], example['width'], example['height']] + list(obj))
+    finally:
+        pool.close()
+        pool.join()
+        if csv_file is not None:
+            csv_file.close()
+    manifest = {'num_shards': num_shards, 'examples': examples, 'deltas': [], 'stale': [], 'next_delta': 0}
+    return save_manifest(output_path, manifest)
+
+
+def changed_examples(xml_dir, image_dir, manifest):
+    """Compares the .xml files in xml_dir and their images with the manifest.
+
+    Returns
+    -------
+    tuple
+        The .xml files that are new or changed and the manifest entries that
+        are replaced or whose .xml or image was deleted
+    """
+
+    known = dict((example['xml'], example) for example in manifest['examples'])
+    changed = []
+    replaced = []
+    xml_files = sorted(glob.glob(os.path.join(xml_dir, '*.xml')))
+    for xml_file in xml_files:
+        example = known.pop(os.path.basename(xml_file), None)
+        if example is None:
+            changed.append(xml_file)
+            continue
+        image_file = os.path.join(image_dir, example['filename'])
+        if not os.path.exists(image_file):
+            # without its image the example is deleted, it comes back as new once the image does
+            replaced.append(example)
+            continue
+        xml_same = file_signature(xml_file) == example['xml_stat']
+        image_same = file_signature(image_file) == example['image_stat']
+        if xml_same and image_same:
+            continue
+        # touched, only a different content makes it a change
+        if not xml_same:
+            with open(xml_file, 'rb') as f:
+                xml_same = sha1(f.read()) == example['xml_sha1']
+        if xml_same and not image_same:
+            with open(image_file, 'rb') as f:
+                image_same = sha1(f.read()) == example['image_sha1']
+        if xml_same and image_same:
+            example['xml_stat'] = file_signature(xml_file)
+            example['image_stat'] = file_signature(image_file)
+        else:
+            changed.append(xml_file)
+            replaced.append(example)
+    # whatever is left had its .xml deleted
+    replaced.extend(known.values())
+    return changed, replaced
+
+
+def update(xml_dir, image_dir, output_path, num_workers=None):
+    """Encodes the new and changed examples since the manifest was written into a delta shard.
+
+    Returns
+    -------
+    dict
+        The manifest
+    """
+
+    manifest = load_manifest(output_path)
+    changed, replaced = changed_examples(xml_dir, image_dir, manifest)
+    for example in replaced:
+        location = {'shard': example['shard']} if 'shard' in example else {'delta': example['delta']}
+        location['index'] = example['index']
+        location['xml'] = example['xml']
+        manifest['stale'].append(location)
+    stale_xmls = set(example['xml'] for example in replaced)
+    manifest['examples'] = [example for example in manifest['examples'] if example['xml'] not in stale_xmls]
+    if changed:
+        delta_name = '{}-delta-{:05d}'.format(os.path.basename(output_path), manifest['next_delta'])
+        delta_path = os.path.join(os.path.dirname(output_path), delta_name)
+        manifest['next_delta'] += 1
+        manifest['deltas'].append(delta_name)
+        tasks = [(xml_file, image_dir) for xml_file in changed]
+        pool = multiprocessing.Pool(min(len(tasks), num_workers or os.cpu_count()), initializer=init_worker,
+                                    initargs=(label_map_dict,))
+        try:
+            with tf.python_io.TFRecordWriter(delta_path) as writer:
+                for index, example in enumerate(pool.imap(build_example, tasks, chunksize=4)):
+                    writer.write(example['serialized'])
+                    manifest['examples'].append(manifest_entry(example, {'delta': delta_name}, index))
+        finally:
+            pool.close()
+            pool.join()
+    manifest['last_update'] = {'encoded': len(changed), 'stale': len(replaced)}
+    return save_manifest(output_path, manifest)
+
+
+def compact(output_path):
+    """Moves the delta shard examples into the main shards and drops the stale records.
+
+    Only the shards with stale records or that take delta examples are rewritten, by copying
+    their serialized records. A delta example goes into the shard of the example it replaces,
+    a new one into the smallest shard. Every rewritten shard is written to a .tmp file first,
+    they are only swapped in, together with saving the manifest, once all of them are written.
+    The delta shards are deleted after the manifest is saved.
+
+    Returns
+    -------
+    dict
+        The manifest
+    """
+
+    manifest = load_manifest(output_path)
+    num_shards = manifest['num_shards']
+    paths = shard_paths(output_path, num_shards)
+    directory = os.path.dirname(output_path)
+    stale = [set() for _ in range(num_shards)]
+    stale_deltas = set()
+    for location in manifest['stale']:
+        if 'shard' in location:
+            stale[location['shard']].add(location['index'])
+        else:
+            stale_deltas.add((location['delta'], location['index']))
+    # shard of the stale record each replacement goes to
+    stale_shard = {}
+    for location in manifest['stale']:
+        if 'shard' in location:
+            stale_shard.setdefault(location.get('xml'), location['shard'])
+    sizes = [0] * num_shards
+    for example in manifest['examples']:
+        if 'shard' in example:
+            sizes[example['shard']] += 1
+    incoming = [[] for _ in range(num_shards)]
+    for example in manifest['examples']:
+        if 'delta' in example:
+            shard = stale_shard.get(example['xml'])
+            if shard is None:
+                shard = sizes.index(min(sizes))
+            sizes[shard] += 1
+            incoming[shard].append(example)
+    delta_records = {}
+    for name in manifest['deltas']:
+        for index, record in enumerate(tf.python_io.tf_record_iterator(os.path.join(directory, name))):
+            if (name, index) not in stale_deltas:
+                delta_records[(name, index)] = record
+    by_shard = [dict() for _ in range(num_shards)]
+    for example in manifest['examples']:
+        if 'shard' in example:
+            by_shard[example['shard']][example['index']] = example
+    rewritten = [shard for shard in range(num_shards) if stale[shard] or incoming[shard]]
+    try:
+        for shard in rewritten:
+            index = 0
+            with tf.python_io.TFRecordWriter(paths[shard] + '.tmp') as writer:
+                if os.path.exists(paths[shard]):
+                    for old_index, record in enumerate(tf.python_io.tf_record_iterator(paths[shard])):
+                        if old_index in stale[shard]:
+                            continue
+                        writer.write(record)
+                        by_shard[shard][old_index]['index'] = index
+                        index += 1
+                for example in incoming[shard]:
+                    writer.write(delta_records[(example['delta'], example['index'])])
+                    del example['delta']
+                    example['shard'] = shard
+                    example['index'] = index
+                    index += 1
+    except BaseException:
+        # nothing was swapped in yet, the shards and the manifest on disk still match
+        for shard in rewritten:
+            if os.path.exists(paths[shard] + '.tmp'):
+                os.remove(paths[shard] + '.tmp')
+        raise
+    for shard in rewritten:
+        os.replace(paths[shard] + '.tmp', paths[shard])
+    deltas = manifest['deltas']
+    manifest['deltas'] = []
+    manifest['stale'] = []
+    manifest.pop('last_update', None)
+    manifest = save_manifest(output_path, manifest)
+    for name in deltas:
+        os.remove(os.path.join(directory, name))
+    return manifest
 
 
 def main(_):
+    global label_map_dict
+    # label_map = label_map_util.load_labelmap(args.labels_path)
+    # label_map_dict = label_map_util.get_label_map_dict(label_map)
+    if args.labels_path is not None:
+        label_map_dict = label_map_util.get_label_map_dict(args.labels_path)
 
-    writer = tf.python_io.TFRecordWriter(args.output_path)
-    path = os.path.join(args.image_dir)
-    examples = xml_to_csv(args.xml_dir)
-    grouped = split(examples, 'filename')
-    for group in grouped:
-        tf_example = create_tf_example(group, path)
-        writer.write(tf_example.SerializeToString())
-    writer.close()
-    print('Successfully created the TFRecord file: {}'.format(args.output_path))
+    if args.compact:
+        manifest = compact(args.output_path)
+        print('Compacted the delta shards into {} ({} examples in {} shards)'.format(
+            args.output_path, manifest['num_examples'], manifest['num_shards']))
+        return
+    if args.update and os.path.exists(manifest_path(args.output_path)):
+        manifest = update(args.xml_dir, args.image_dir, args.output_path, args.num_workers)
+        print('Encoded {} new or changed examples into a delta shard, {} stale examples left to compact'.format(
+            manifest['last_update']['encoded'], len(manifest['stale'])))
+        return
+    manifest = generate(args.xml_dir, args.image_dir, args.output_path, args.num_shards,
+                        args.num_workers, args.csv_path)
+    print('Successfully created the TFRecord file: {} ({} examples in {} shards)'.format(
+        args.output_path, manifest['num_examples'], manifest['num_shards']))
     if args.csv_path is not None:
-        examples.to_csv(args.csv_path, index=None)
         print('Successfully created the CSV file: {}'.format(args.csv_path))
 
 
 if __name__ == '__main__':
+    # Initiate argument parser
+    parser = argparse.ArgumentParser(
+        description="Sample TensorFlow XML-to-TFRecord converter")
+    parser.add_argument("-x",
+                        "--xml_dir",
+                        help="Path to the folder where the input .xml files are stored.",
+                        type=str)
+    parser.add_argument("-l",
+                        "--labels_path",
+                        help="Path to the labels (.pbtxt) file.", type=str)
+    parser.add_argument("-o",
+                        "--output_path",
+                        help="Path of output TFRecord (.record) file.", type=str)
+    parser.add_argument("-i",
+                        "--image_dir",
+                        help="Path to the folder where the input image files are stored. "
+                             "Defaults to the same directory as XML_DIR.",
+                        type=str, default=None)
+    parser.add_argument("-c",
+                        "--csv_path",
+                        help="Path of output .csv file. If none provided, then no file will be "
+                             "written.",
+                        type=str, default=None)
+    parser.add_argument("-s",
+                        "--num_shards",
+                        help="Number of TFRecord shards to write.",
+                        type=int, default=1)
+    parser.add_argument("-w",
+                        "--num_workers",
+                        help="Number of processes building examples. Defaults to the number of CPUs.",
+                        type=int, default=None)
+    parser.add_argument("-u",
+                        "--update",
+                        help="Only encode the examples whose .xml or image changed since the manifest was "
+                             "written, into a delta shard.",
+                        action="store_true")
+    parser.add_argument("--compact",
+                        help="Merge the delta shards into the main shards.",
+                        action="store_true")
+
+    args = parser.parse_args()
+
+    if args.image_dir is None:
+        args.image_dir = args.xml_dir
+
     tf.app.run()
@@ -0,0 +1,104 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+r"""Exports an SSD checkpoint as a fully int8 quantized TFLite model.
+
+Runs export_tflite_ssd_graph on the checkpoint, converts the graph into a
+float and a post-training int8 quantized TFLite model (calibrated on images
+from TFRecords) and, when an eval TFRecord is given, writes an accuracy and
+latency comparison of the models.
+
+Outputs in $output_directory:
+ - tflite_graph.pb, tflite_graph.pbtxt
+ - model_float.tflite
+ - model_int8.tflite: int8 weights and activations, uint8 input taking the
+   image pixels as they are (no normalization), float post processing outputs
+ - quantization_report.json: size, Pascal VOC mAP@0.5IOU and latency
+   (mean, p50, p95, p99) of each model
+
+Example Usage:
+--------------
+python object_detection/export_tflite_int8 \
+    --pipeline_config_path path/to/ssd_mobilenet.config \
+    --trained_checkpoint_prefix path/to/model.ckpt \
+    --calibration_tfrecords annotations/train.record \
+    --eval_tfrecords annotations/test.record \
+    --frozen_graph_path path/to/frozen_inference_graph.pb \
+    --output_directory path/to/exported_model_directory
+"""
+
+import tensorflow as tf
+from google.protobuf import text_format
+from object_detection import export_tflite_int8_lib
+from object_detection.protos import pipeline_pb2
+
+flags = tf.app.flags
+flags.DEFINE_string('output_directory', None, 'Path to write outputs.')
+flags.DEFINE_string(
+    'pipeline_config_path', None,
+    'Path to a pipeline_pb2.TrainEvalPipelineConfig config '
+    'file.')
+flags.DEFINE_string('trained_checkpoint_prefix', None, 'Checkpoint prefix.')
+flags.DEFINE_string('calibration_tfrecords', None,
+                    'Comma separated TFRecords to calibrate the quantization '
+                    'on, usually the training set.')
+flags.DEFINE_string('eval_tfrecords', '',
+                    'Comma separated TFRecords the models are compared on.')
+flags.DEFINE_string('frozen_graph_path', '',
+                    'Float frozen_inference_graph.pb to include in the '
+                    'comparison.')
+flags.DEFINE_integer('num_calibration_examples', 100,
+                     'Number of images used for calibration.')
+flags.DEFINE_integer('num_eval_examples', 0,
+                     'Number of images to evaluate on, 0 for all of them.')
+flags.DEFINE_integer('max_detections', 10,
+                     'Maximum number of detections (boxes) to show.')
+flags.DEFINE_integer('num_threads', 1,
+                     'Interpreter threads used when measuring latency.')
+flags.DEFINE_string(
+    'config_override', '', 'pipeline_pb2.TrainEvalPipelineConfig '
+    'text proto to override pipeline_config_path.')
+
+FLAGS = flags.FLAGS
+
+
+def main(argv):
+  del argv  # Unused.
+  flags.mark_flag_as_required('output_directory')
+  flags.mark_flag_as_required('pipeline_config_path')
+  flags.mark_flag_as_required('trained_checkpoint_prefix')
+  flags.mark_flag_as_required('calibration_tfrecords')
+
+  pipeline_config = pipeline_pb2.TrainEvalPipelineConfig()
+  with tf.gfile.GFile(FLAGS.pipeline_config_path, 'r') as f:
+    text_format.Merge(f.read(), pipeline_config)
+  text_format.Merge(FLAGS.config_override, pipeline_config)
+  report = export_tflite_int8_lib.export_int8_tflite(
+      pipeline_config,
+      FLAGS.trained_checkpoint_prefix,
+      FLAGS.output_directory,
+      FLAGS.calibration_tfrecords.split(','),
+      eval_tfrecords=[p for p in FLAGS.eval_tfrecords.split(',') if p],
+      frozen_graph_path=FLAGS.frozen_graph_path or None,
+      num_calibration_examples=FLAGS.num_calibration_examples,
+      num_eval_examples=FLAGS.num_eval_examples or None,
+      max_detections=FLAGS.max_detections,
+      num_threads=FLAGS.num_threads)
+  for name, model in sorted(report['models'].items()):
+    tf.logging.info('%s: %d bytes %s', name, model['size_bytes'],
+                    model.get('eval', ''))
+
+
+if __name__ == '__main__':
+  tf.app.run(main)